@@ -25,6 +25,9 @@ class Testimonial(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='branding_testimonial_seek_idx'),
+        ]
     
     def __str__(self):
         return f"Testimonial by {self.student_name}"
@@ -58,6 +61,9 @@ class MediaResource(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='branding_media_seek_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -89,6 +95,9 @@ class Event(models.Model):
     
     class Meta:
         ordering = ['start_datetime']
+        indexes = [
+            models.Index(fields=['start_datetime', 'id'], name='branding_event_seek_idx'),
+        ]
     
     def __str__(self):
         return self.title
\ No newline at end of file
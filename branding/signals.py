@@ -0,0 +1,16 @@
+# branding/signals.py
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from courses.cache import bump_version
+from courses.feeds import EVENTS_VERSION_KEY
+from .models import Event
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_feeds(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, EVENTS_VERSION_KEY))
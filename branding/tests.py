@@ -1,5 +1,9 @@
+from datetime import timedelta
+
 from django.test import TestCase
-from .models import Testimonial
+from django.utils import timezone
+from ultima_training.pagination import KeysetPaginator
+from .models import Testimonial, Event
 # فرض کنید User و Course وجود دارند
 from accounts.models import User
 from courses.models import Course
@@ -11,4 +15,47 @@ class TestimonialModelTest(TestCase):
 
     def test_testimonial_creation(self):
         testimonial = Testimonial.objects.create(student=self.user, course=self.course, rating=5, content='Great!')
-        self.assertEqual(testimonial.student_name, self.user.get_full_name())
\ No newline at end of file
+        self.assertEqual(testimonial.student_name, self.user.get_full_name())
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        start = timezone.now()
+        # Pairs share a start time so the id tie-breaker is exercised
+        for i in range(30):
+            Event.objects.create(
+                title=f'Event {i}', description='...', event_type='webinar',
+                start_datetime=start + timedelta(days=i // 2),
+                end_datetime=start + timedelta(days=i // 2, hours=2),
+                registration_deadline=start,
+            )
+
+    def test_walks_every_event_once_without_count(self):
+        paginator = KeysetPaginator(Event.objects.all(), 12, '-start_datetime')
+        seen, cursor, pages = [], None, []
+        while True:
+            with self.assertNumQueries(1):
+                page = paginator.get_page(cursor)
+            pages.append(page)
+            seen.extend(event.pk for event in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(len(set(seen)), 30)
+        self.assertEqual([len(page) for page in pages], [12, 12, 6])
+
+        previous = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual([e.pk for e in previous], [e.pk for e in pages[1]])
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = KeysetPaginator(Event.objects.all(), 12, '-start_datetime')
+        self.assertEqual(
+            [e.pk for e in paginator.get_page('not-a-cursor')],
+            [e.pk for e in paginator.get_page()]
+        )
+
+    def test_listing_view_links_to_next_page(self):
+        response = self.client.get('/workshops-events/', {'type': 'webinar'})
+        self.assertEqual(len(response.context['events']), 12)
+        self.assertContains(response, 'type=webinar&amp;cursor=')
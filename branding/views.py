@@ -1,10 +1,10 @@
 # branding/views.py
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 
+from ultima_training.pagination import KeysetPaginator
 from .models import Testimonial, MediaResource, Event
 from .forms import ContactForm, SpeakingRequestForm
 
@@ -32,34 +32,32 @@ def about_view(request):
 
 def workshops_events(request):
     """Workshops and events listing"""
-    events = Event.objects.all().order_by('-start_datetime')
+    events = Event.objects.all()
     
     # Filter by type
     event_type = request.GET.get('type')
     if event_type:
         events = events.filter(event_type=event_type)
     
-    paginator = Paginator(events, 12)
-    page_number = request.GET.get('page')
-    events = paginator.get_page(page_number)
+    paginator = KeysetPaginator(events, 12, '-start_datetime')
+    events = paginator.get_page(request.GET.get('cursor'))
     
     context = {'events': events}
     return render(request, 'branding/workshops_events.html', context)
 
 def testimonials_view(request):
     """Testimonials page"""
-    testimonials = Testimonial.objects.filter(is_approved=True).order_by('-created_at').prefetch_related('student', 'course')
+    testimonials = Testimonial.objects.filter(is_approved=True).prefetch_related('student', 'course')
     
-    paginator = Paginator(testimonials, 12)
-    page_number = request.GET.get('page')
-    testimonials = paginator.get_page(page_number)
+    paginator = KeysetPaginator(testimonials, 12, '-created_at')
+    testimonials = paginator.get_page(request.GET.get('cursor'))
     
     context = {'testimonials': testimonials}
     return render(request, 'branding/testimonials.html', context)
 
 def media_resources(request):
     """Media and resources page"""
-    resources = MediaResource.objects.filter(is_public=True).order_by('-created_at')
+    resources = MediaResource.objects.filter(is_public=True)
     
     # Filter by type
     resource_type = request.GET.get('type')
@@ -71,6 +69,9 @@ def media_resources(request):
     if category:
         resources = resources.filter(category=category)
     
+    paginator = KeysetPaginator(resources, 12, '-created_at')
+    resources = paginator.get_page(request.GET.get('cursor'))
+    
     context = {'resources': resources}
     return render(request, 'branding/media_resources.html', context)
 
@@ -1,7 +1,12 @@
 from django.contrib import admin
-from .models import Certificate
+from .models import Certificate, CertificateBatch
 
 @admin.register(Certificate)
 class CertificateAdmin(admin.ModelAdmin):
     list_display = ('certificate_number', 'enrollment', 'issue_date', 'is_valid')
-    search_fields = ('certificate_number',)
\ No newline at end of file
+    search_fields = ('certificate_number',)
+
+@admin.register(CertificateBatch)
+class CertificateBatchAdmin(admin.ModelAdmin):
+    list_display = ('session', 'requested_by', 'status', 'completed', 'failed', 'total', 'created_at')
+    list_filter = ('status',)
@@ -0,0 +1,176 @@
+# certificates/bulk.py
+"""
+Bulk certificate generation for a course session.
+
+generate() runs one CertificateBatch in four stages:
+
+1. query: every eligible enrollment, with its student, course, instructor
+   and session, in one query, and a certificate number for each;
+2. render: QR codes and PDFs, CERTIFICATE_CHUNK_SIZE certificates at a
+   time, across a process pool;
+3. store: each chunk's files written to storage from a thread pool;
+4. insert: the chunk's Certificate rows with one bulk_create, after which
+   the batch's progress is updated.
+
+The seconds spent in each stage are kept on the batch. Rendering overlaps
+storing and inserting, so "render" is the time spent waiting on the pool.
+Celery's prefork workers are daemon processes, which may not start a pool
+of their own; there, and with CERTIFICATE_RENDER_PROCESSES = 1, chunks are
+rendered in the worker itself. The generate_session_certificates command
+runs a job with the full pool.
+"""
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from courses.cache import invalidate_student
+from courses.models import Enrollment
+from .models import Certificate, CertificateBatch
+from .rendering import CertificateText, render_files
+from .verification import qr_payload
+
+
+@contextmanager
+def timed(timings, stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] += time.perf_counter() - started
+
+
+def chunked(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def render_pool():
+    processes = settings.CERTIFICATE_RENDER_PROCESSES or os.cpu_count() or 1
+    if processes <= 1 or multiprocessing.current_process().daemon:
+        return None
+    return ProcessPoolExecutor(processes)
+
+
+def eligible_enrollments(session_id, enrollment_ids=None):
+    """The session's enrollments that still need a certificate: the given ones, or every completed one."""
+    enrollments = Enrollment.objects.filter(session_id=session_id, certificate__isnull=True)
+    if enrollment_ids is None:
+        enrollments = enrollments.filter(status='completed')
+    else:
+        enrollments = enrollments.filter(id__in=enrollment_ids)
+    return enrollments.select_related('student', 'course__instructor', 'session').order_by('created_at')
+
+
+def store(numbers, files, executor):
+    """Save each (QR PNG, PDF) pair; returns their storage names."""
+    qr_field = Certificate._meta.get_field('qr_code_image')
+    pdf_field = Certificate._meta.get_field('certificate_file')
+    uploads = []
+    for number, (qr, pdf) in zip(numbers, files):
+        uploads.append((qr_field, f'qr_{number}.png', qr))
+        uploads.append((pdf_field, f'certificate_{number}.pdf', pdf))
+
+    def save(upload):
+        field, filename, content = upload
+        return field.storage.save(field.generate_filename(None, filename), ContentFile(content))
+
+    names = list(executor.map(save, uploads))
+    return list(zip(names[::2], names[1::2]))
+
+
+def insert(enrollments, numbers, names):
+    """Create the chunk's Certificate rows; returns those created."""
+    taken = set(
+        Certificate.objects.filter(enrollment__in=enrollments).values_list('enrollment_id', flat=True)
+    )
+    certificates = [
+        Certificate(
+            enrollment=enrollment,
+            certificate_number=number,
+            qr_data=qr_payload(number),
+            qr_code_image=qr_name,
+            certificate_file=pdf_name,
+        )
+        for enrollment, number, (qr_name, pdf_name) in zip(enrollments, numbers, names)
+        # Issued by someone else while this chunk was rendering
+        if enrollment.id not in taken
+    ]
+
+    from dashboard.analytics import mark_stale_days
+    with transaction.atomic():
+        Certificate.objects.bulk_create(certificates)
+
+        # bulk_create skips the model signals, so refresh what they would have
+        today = timezone.localdate()
+        mark_stale_days({(today, certificate.enrollment.course_id) for certificate in certificates})
+        for student_id in {certificate.enrollment.student_id for certificate in certificates}:
+            transaction.on_commit(partial(invalidate_student, student_id))
+    return certificates
+
+
+def generate(batch, enrollment_ids=None):
+    """Run ``batch``; returns the ids of the certificates it created."""
+    batches = CertificateBatch.objects.filter(pk=batch.pk)
+    timings = Counter()
+
+    with timed(timings, 'query'):
+        enrollments = list(eligible_enrollments(batch.session_id, enrollment_ids))
+        numbers = [Certificate.generate_certificate_number() for _ in enrollments]
+
+    # Requested enrollments that already have a certificate count as done
+    total = len(enrollments) if enrollment_ids is None else len(enrollment_ids)
+    batches.update(
+        status='running', total=total, completed=total - len(enrollments), failed=0,
+        timings={stage: round(seconds, 3) for stage, seconds in timings.items()}
+    )
+
+    items = [
+        (CertificateText.for_enrollment(enrollment, number), qr_payload(number)['url'])
+        for enrollment, number in zip(enrollments, numbers)
+    ]
+    chunk_size = settings.CERTIFICATE_CHUNK_SIZE
+    chunks = list(zip(chunked(enrollments, chunk_size), chunked(numbers, chunk_size), chunked(items, chunk_size)))
+
+    certificate_ids = []
+    pool = render_pool()
+    with ThreadPoolExecutor(settings.CERTIFICATE_STORAGE_THREADS) as executor:
+        try:
+            # Every chunk is queued up front, so the pool renders ahead of storage
+            futures = [pool.submit(render_files, chunk[2]) for chunk in chunks] if pool else None
+            for index, (chunk_enrollments, chunk_numbers, chunk_items) in enumerate(chunks):
+                created = 0
+                try:
+                    with timed(timings, 'render'):
+                        files = futures[index].result() if futures else render_files(chunk_items)
+                    with timed(timings, 'store'):
+                        names = store(chunk_numbers, files, executor)
+                    with timed(timings, 'insert'):
+                        certificates = insert(chunk_enrollments, chunk_numbers, names)
+                    certificate_ids.extend(str(certificate.id) for certificate in certificates)
+                    # Enrollments certified elsewhere meanwhile are done too
+                    created = len(chunk_enrollments)
+                except Exception as e:
+                    print(f"Error generating certificates: {e}")
+
+                batches.update(
+                    completed=F('completed') + created,
+                    failed=F('failed') + len(chunk_enrollments) - created,
+                    timings={stage: round(seconds, 3) for stage, seconds in timings.items()}
+                )
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+    now = timezone.now()
+    batches.filter(failed=0).update(status='completed', finished_at=now)
+    batches.filter(failed__gt=0).update(status='failed', finished_at=now)
+    return certificate_ids
@@ -0,0 +1,161 @@
+# certificates/downloads.py
+"""
+Serving stored files (certificate PDFs) to the user who may see them.
+
+Django only decides who gets the file; sending the bytes is left to
+whatever does it cheapest:
+
+* storage without local files (S3 and the like): a redirect to a presigned
+  URL that lasts CERTIFICATE_DOWNLOAD_URL_EXPIRY seconds, so the object
+  store serves the download, Range and conditional requests included;
+* local files behind nginx (CERTIFICATE_DOWNLOAD_OFFLOAD = 'nginx'): an
+  empty response with X-Accel-Redirect to CERTIFICATE_DOWNLOAD_ACCEL_PREFIX
+  + the storage name, an internal location aliased to MEDIA_ROOT;
+* behind Apache or lighttpd ('sendfile'): X-Sendfile with the file's path;
+* otherwise a FileResponse. Whole files go through the server's
+  wsgi.file_wrapper, which under gunicorn is sendfile(2); nothing is read
+  into the worker's memory. ETag and Last-Modified come from the file, so
+  If-None-Match and If-Modified-Since get a 304, and a single byte range
+  (with If-Range honoured) gets a 206. Multi-range requests get the whole
+  file, which RFC 9110 allows.
+"""
+import inspect
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileRange:
+    """``length`` bytes of an open file from where it stands, read the way FileResponse reads"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        data = self.file.read(self.remaining if size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """
+    The inclusive (start, end) asked for by a single-range Range header, or
+    None to send the whole file. Raises RangeNotSatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def local_path(storage, name):
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def presigned_url(storage, name, filename, content_type):
+    # S3Storage and friends take these; plain remote storages only know the name
+    parameters = inspect.signature(storage.url).parameters
+    if 'expire' not in parameters or 'parameters' not in parameters:
+        return storage.url(name)
+    return storage.url(name, expire=settings.CERTIFICATE_DOWNLOAD_URL_EXPIRY, parameters={
+        'ResponseContentDisposition': content_disposition_header(True, filename),
+        'ResponseContentType': content_type,
+    })
+
+
+def offloaded(path, name, filename, content_type):
+    response = HttpResponse(content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    if settings.CERTIFICATE_DOWNLOAD_OFFLOAD == 'nginx':
+        response['X-Accel-Redirect'] = settings.CERTIFICATE_DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + quote(name)
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def streamed(request, path, filename, content_type):
+    try:
+        fh = open(path, 'rb')
+    except FileNotFoundError:
+        raise Http404('File not found')
+    stat = os.fstat(fh.fileno())
+    size, modified = stat.st_size, int(stat.st_mtime)
+    etag = f'"{modified:x}-{size:x}"'
+
+    # 304 for a cached copy that is still current, 412 for a failed If-Match
+    response = get_conditional_response(request, etag=etag, last_modified=modified)
+    if response is not None:
+        fh.close()
+        return response
+
+    span = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (not if_range or if_range in (etag, http_date(modified))):
+        try:
+            span = byte_range(request.headers['Range'], size)
+        except RangeNotSatisfiable:
+            fh.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if span is None:
+        response = FileResponse(fh, as_attachment=True, filename=filename, content_type=content_type)
+    else:
+        start, end = span
+        fh.seek(start)
+        response = FileResponse(
+            FileRange(fh, end - start + 1), as_attachment=True, filename=filename, content_type=content_type,
+            status=206
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    return response
+
+
+def serve_file(request, field_file, filename, content_type='application/octet-stream'):
+    """The response that gets ``field_file`` to the user as ``filename``."""
+    storage, name = field_file.storage, field_file.name
+    path = local_path(storage, name)
+    if path is None:
+        response = HttpResponseRedirect(presigned_url(storage, name, filename, content_type))
+    elif settings.CERTIFICATE_DOWNLOAD_OFFLOAD:
+        response = offloaded(path, name, filename, content_type)
+    else:
+        response = streamed(request, path, filename, content_type)
+    # Only for the signed-in user, and a presigned URL soon stops working
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,113 @@
+# certificates/management/commands/benchmark_certificate_rendering.py
+import time
+from io import BytesIO
+
+import qrcode
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from certificates.rendering import CertificateText, make_qr, qr_png, render, static_layer
+from certificates.verification import verification_url
+
+
+def legacy_qr(certificate):
+    # The old payload: the repr of a dict holding the student's details
+    data = str({
+        'student_name': certificate.student_name,
+        'course_name': certificate.course_name,
+        'completion_date': '2026-05-01',
+        'certificate_number': certificate.certificate_number,
+        'mobile': '+989121234567',
+    })
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def legacy_render(certificate):
+    # The old scheme: the whole page redrawn with reportlab for every student
+    pdf_buffer = BytesIO()
+    p = canvas.Canvas(pdf_buffer, pagesize=letter)
+    width, height = letter
+    p.setFont("Helvetica-Bold", 24)
+    p.drawCentredString(width/2, height-100, "CERTIFICATE OF COMPLETION")
+    p.setFont("Helvetica-Bold", 16)
+    p.drawCentredString(width/2, height-140, "ULTIMA TRAINING")
+    p.setFont("Helvetica-Bold", 18)
+    p.drawCentredString(width/2, height-200, "This certifies that")
+    p.setFont("Helvetica-Bold", 20)
+    p.drawCentredString(width/2, height-230, certificate.student_name)
+    p.setFont("Helvetica", 14)
+    p.drawCentredString(width/2, height-270, "has successfully completed the course")
+    p.setFont("Helvetica-Bold", 16)
+    p.drawCentredString(width/2, height-300, certificate.course_name)
+    p.setFont("Helvetica", 12)
+    p.drawCentredString(width/2, height-340, f"Completed on: {certificate.completion_date}")
+    p.drawCentredString(width/2, height-360, f"Location: {certificate.location}")
+    p.drawCentredString(width/2, height-400, f"Certificate Number: {certificate.certificate_number}")
+    p.setFont("Helvetica", 10)
+    p.drawString(100, 150, "Dr. Josef Balahan")
+    p.drawString(100, 130, "Founder & Lead Trainer")
+    p.drawString(400, 150, certificate.instructor_name)
+    p.drawString(400, 130, "Course Instructor")
+    p.drawString(width-150, 100, "QR Code")
+    p.rect(width-150, 120, 100, 100, stroke=1, fill=0)
+    p.save()
+    return pdf_buffer.getvalue()
+
+
+def legacy_files(certificate):
+    qr = legacy_qr(certificate)
+    return qr.version, qr_png(qr), legacy_render(certificate)
+
+
+def cached_layer_files(certificate):
+    # Without a QR code, as before it was embedded
+    return None, b'', render(certificate)
+
+
+def embedded_qr_files(certificate):
+    qr = make_qr(verification_url(certificate.certificate_number))
+    return qr.version, qr_png(qr), render(certificate, qr)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure certificate render time and file size: legacy reportlab drawing and JSON QR code, '
+        'the cached static layer alone, and the cached layer with the signed-link QR code embedded'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=2000)
+        parser.add_argument('--courses', type=int, default=5, help='Distinct courses the certificates spread over')
+
+    def handle(self, *args, **options):
+        count, courses = options['count'], options['courses']
+        certificates = [
+            CertificateText(
+                course_name=f'Negotiation Skills {number % courses}',
+                instructor_name='Sara Ahmadi',
+                student_name=f'Student Number {number}',
+                completion_date='May 01, 2026',
+                location='Tehran',
+                certificate_number=f'CERT-{number:06d}',
+            )
+            for number in range(count)
+        ]
+        static_layer.cache_clear()
+
+        modes = [('legacy', legacy_files), ('cached layer', cached_layer_files), ('embedded QR', embedded_qr_files)]
+        for label, func in modes:
+            started = time.perf_counter()
+            files = [func(certificate) for certificate in certificates]
+            elapsed = time.perf_counter() - started
+            versions = [version for version, _, _ in files if version]
+            self.stdout.write(
+                f'{label}: {count} certificates in {elapsed:.2f}s '
+                f'({elapsed * 1000 / count:.2f}ms each, {count / elapsed:,.0f}/s), '
+                f'PDF {sum(len(pdf) for _, _, pdf in files) / count:,.0f} bytes, '
+                f'PNG {sum(len(png) for _, png, _ in files) / count:,.0f} bytes, '
+                f'QR version {f"{min(versions)}-{max(versions)}" if versions else "none"}'
+            )
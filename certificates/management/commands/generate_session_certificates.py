@@ -0,0 +1,30 @@
+# certificates/management/commands/generate_session_certificates.py
+from django.core.management.base import BaseCommand, CommandError
+
+from certificates.bulk import generate
+from certificates.models import CertificateBatch
+from certificates.tasks import send_certificate_emails
+from courses.models import CourseSession
+
+
+class Command(BaseCommand):
+    help = "Issue certificates for every completed enrollment of a session, rendering across a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('session', type=int, help='Course session id')
+        parser.add_argument('--no-email', action='store_true', help="Don't queue the certificate emails")
+
+    def handle(self, *args, **options):
+        try:
+            session = CourseSession.objects.select_related('course').get(pk=options['session'])
+        except CourseSession.DoesNotExist:
+            raise CommandError(f"Course session {options['session']} does not exist")
+
+        batch = CertificateBatch.objects.create(session=session)
+        certificate_ids = generate(batch)
+        batch.refresh_from_db()
+
+        timings = ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in batch.timings.items())
+        self.stdout.write(f'{session}: {batch.completed}/{batch.total} issued, {batch.failed} failed ({timings})')
+        if certificate_ids and not options['no_email']:
+            send_certificate_emails.delay(certificate_ids)
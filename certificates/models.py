@@ -1,8 +1,11 @@
 # certificates/models.py
 from django.db import models
-from courses.models import Enrollment
+from django.contrib.auth import get_user_model
+from courses.models import CourseSession, Enrollment
 import uuid
 
+User = get_user_model()
+
 class Certificate(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='certificate')
@@ -22,12 +25,63 @@ class Certificate(models.Model):
     def __str__(self):
         return f"Certificate {self.certificate_number}"
     
-    def generate_certificate_number(self):
-        import random
-        import string
-        return 'CERT-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+    @staticmethod
+    def generate_certificate_number():
+        from courses.identifiers import CERTIFICATE_NUMBERS
+        return 'CERT-' + CERTIFICATE_NUMBERS.allocate()
     
     def save(self, *args, **kwargs):
         if not self.certificate_number:
             self.certificate_number = self.generate_certificate_number()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class CertificateBatch(models.Model):
+    """One worker pass that renders the certificates of a session"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Completed with errors'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session = models.ForeignKey(CourseSession, on_delete=models.CASCADE, related_name='certificate_batches')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='certificate_batches')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # Seconds spent per stage (query, render, store, insert), see certificates.bulk
+    timings = models.JSONField(default=dict, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Certificates for {self.session} ({self.completed}/{self.total})"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+    
+    @property
+    def progress_percent(self):
+        if not self.total:
+            return 100
+        return round((self.completed + self.failed) * 100 / self.total)
+    
+    def as_dict(self):
+        return {
+            'id': str(self.id),
+            'session': str(self.session),
+            'status': self.status,
+            'total': self.total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'progress': self.progress_percent,
+            'timings': self.timings,
+        }
@@ -0,0 +1,198 @@
+# certificates/rendering.py
+"""
+Certificate PDF rendering.
+
+Everything on a certificate that is the same for every student of a course
+(title, branding, course name and signature block) is drawn once into a PDF
+form XObject, compressed, and cached per course. Rendering a certificate
+then only writes the per-student text and places the cached form on the
+page, so a whole cohort costs one static layer plus a few hundred bytes
+each.
+
+The QR code goes into the PDF as a 1-bit image of its modules, one pixel a
+module, scaled up by the page and drawn with sharp edges. It is built from
+the same in-memory QRCode as the PNG kept on the certificate, so nothing
+is encoded twice or read back from storage.
+
+The PDF is written directly, much as dashboard.exports writes XLSX, and
+uses the standard Helvetica fonts that every PDF viewer supplies, so there
+is nothing to embed. Text widths for centering come from reportlab's font
+metrics.
+
+Nothing here touches Django, so render_files() can run in the worker
+processes of a bulk job (certificates.bulk).
+"""
+import zlib
+from functools import lru_cache
+from io import BytesIO
+from typing import NamedTuple
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_M
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+WIDTH, HEIGHT = letter
+
+FONTS = {'Helvetica': 'F1', 'Helvetica-Bold': 'F2'}
+
+FONT_OBJECTS = [
+    f'<< /Type /Font /Subtype /Type1 /BaseFont /{name} /Encoding /WinAnsiEncoding >>'.encode()
+    for name in FONTS
+]
+
+
+class CertificateText(NamedTuple):
+    """Everything a certificate shows, as plain values so it can cross process boundaries"""
+    course_name: str
+    instructor_name: str
+    student_name: str
+    completion_date: str
+    location: str
+    certificate_number: str
+
+    @classmethod
+    def for_enrollment(cls, enrollment, certificate_number):
+        completion_date = enrollment.completion_date
+        return cls(
+            course_name=enrollment.course.name,
+            instructor_name=enrollment.course.instructor.get_full_name(),
+            student_name=enrollment.student.get_full_name(),
+            completion_date=completion_date.strftime('%B %d, %Y') if completion_date else 'N/A',
+            location=enrollment.session.location,
+            certificate_number=certificate_number,
+        )
+
+
+def pdf_string(text):
+    # WinAnsi bytes, with anything outside printable ASCII octal-escaped
+    escaped = []
+    for byte in text.encode('cp1252', errors='replace'):
+        char = chr(byte)
+        if char in '\\()':
+            escaped.append('\\' + char)
+        elif 32 <= byte < 127:
+            escaped.append(char)
+        else:
+            escaped.append(f'\\{byte:03o}')
+    return '(' + ''.join(escaped) + ')'
+
+
+def text(x, y, value, font='Helvetica', size=12):
+    return f'BT /{FONTS[font]} {size} Tf {x:.2f} {y:.2f} Td {pdf_string(value)} Tj ET'
+
+
+def centred(y, value, font='Helvetica', size=12):
+    return text(WIDTH / 2 - stringWidth(value, font, size) / 2, y, value, font, size)
+
+
+def stream(data, extra=b''):
+    return b'<< /Length %d%s >>\nstream\n' % (len(data), extra) + data + b'\nendstream'
+
+
+@lru_cache(maxsize=256)
+def static_layer(course_name, instructor_name):
+    """The course's shared page content as a compressed form XObject."""
+    operations = [
+        centred(HEIGHT - 100, 'CERTIFICATE OF COMPLETION', 'Helvetica-Bold', 24),
+        centred(HEIGHT - 140, 'ULTIMA TRAINING', 'Helvetica-Bold', 16),
+        centred(HEIGHT - 200, 'This certifies that', 'Helvetica-Bold', 18),
+        centred(HEIGHT - 270, 'has successfully completed the course', 'Helvetica', 14),
+        centred(HEIGHT - 300, course_name, 'Helvetica-Bold', 16),
+        text(100, 150, 'Dr. Josef Balahan', size=10),
+        text(100, 130, 'Founder & Lead Trainer', size=10),
+        text(400, 150, instructor_name, size=10),
+        text(400, 130, 'Course Instructor', size=10),
+        text(WIDTH - 150, 100, 'Scan to verify', size=10),
+    ]
+    data = zlib.compress('\n'.join(operations).encode('ascii'))
+    return stream(
+        data,
+        b' /Type /XObject /Subtype /Form /BBox [0 0 %d %d] /Filter /FlateDecode'
+        b' /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >>' % (WIDTH, HEIGHT)
+    )
+
+
+def qr_image(qr):
+    """The QR code's modules, quiet zone included, as a 1-bit image XObject."""
+    rows = bytearray()
+    for row in qr.get_matrix():
+        # 1 is white; each row is padded out to a whole byte
+        bits = ''.join('0' if dark else '1' for dark in row)
+        bits += '1' * (-len(bits) % 8)
+        rows += int(bits, 2).to_bytes(len(bits) // 8, 'big')
+    size = len(qr.get_matrix())
+    return stream(
+        zlib.compress(bytes(rows)),
+        b' /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray'
+        b' /BitsPerComponent 1 /Filter /FlateDecode' % (size, size)
+    )
+
+
+def page_content(certificate, qr=False):
+    operations = [
+        'q /Static Do Q',
+        centred(HEIGHT - 230, certificate.student_name, 'Helvetica-Bold', 20),
+        centred(HEIGHT - 340, f'Completed on: {certificate.completion_date}'),
+        centred(HEIGHT - 360, f'Location: {certificate.location}'),
+        centred(HEIGHT - 400, f'Certificate Number: {certificate.certificate_number}'),
+    ]
+    if qr:
+        operations.append(f'q 100 0 0 100 {WIDTH - 150:.2f} 120 cm /QR Do Q')
+    return stream('\n'.join(operations).encode('ascii'))
+
+
+def write_pdf(objects):
+    """Serialise numbered objects (1..n, the catalog first) with their xref table."""
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def render(certificate, qr=None):
+    """The PDF bytes for one certificate (a CertificateText), with ``qr`` (from make_qr) if given."""
+    xobjects = b'/Static 7 0 R /QR 8 0 R' if qr is not None else b'/Static 7 0 R'
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [5 0 R] /Count 1 >>',
+        *FONT_OBJECTS,
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents 6 0 R'
+        b' /Resources << /Font << /F1 3 0 R /F2 4 0 R >> /XObject << %s >> >> >>' % (WIDTH, HEIGHT, xobjects),
+        page_content(certificate, qr is not None),
+        static_layer(certificate.course_name, certificate.instructor_name),
+    ]
+    if qr is not None:
+        objects.append(qr_image(qr))
+    return write_pdf(objects)
+
+
+def make_qr(data):
+    # The smallest version that fits; a verification link needs a low one
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, box_size=10, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def qr_png(qr):
+    buffer = BytesIO()
+    qr.make_image(fill_color='black', back_color='white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_files(items):
+    """(QR PNG, PDF) bytes for each (CertificateText, QR data) pair."""
+    files = []
+    for certificate, data in items:
+        qr = make_qr(data)
+        files.append((qr_png(qr), render(certificate, qr)))
+    return files
+
@@ -0,0 +1,134 @@
+# certificates/storage_stub.py
+"""
+Local stand-in for an S3-compatible object store (MinIO, S3 itself) for
+tests of presigned downloads. It speaks enough of the S3 REST API for
+django-storages' S3Storage to save and open objects with path-style
+addressing, and serves presigned GETs the way the real store does: expired
+links get a 403, and Range, If-None-Match and the response-content-*
+overrides are honoured. Signatures are not checked, only that there is one.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from django.utils.http import http_date
+
+from .downloads import RangeNotSatisfiable, byte_range
+
+
+class StubObjectStorageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def key(self):
+        return unquote(urlsplit(self.path).path).lstrip('/')
+
+    def query(self):
+        return {name: values[0] for name, values in parse_qs(urlsplit(self.path).query).items()}
+
+    def body(self):
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if 'aws-chunked' not in self.headers.get('Content-Encoding', ''):
+            return data
+        # botocore streams uploads as aws-chunked: "<hex size>[;...]\r\n<data>\r\n" until a 0 chunk
+        chunks = []
+        while data:
+            header, _, data = data.partition(b'\r\n')
+            size = int(header.split(b';')[0], 16)
+            if not size:
+                break
+            chunks.append(data[:size])
+            data = data[size + 2:]
+        return b''.join(chunks)
+
+    def reply(self, status, data=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def error(self, status, code):
+        self.reply(status, f'<Error><Code>{code}</Code></Error>'.encode(), {'Content-Type': 'application/xml'})
+
+    def do_PUT(self):
+        data = self.body()
+        with self.server.lock:
+            self.server.objects[self.key()] = (data, time.time())
+        self.reply(200, headers={'ETag': f'"{hashlib.md5(data).hexdigest()}"'})
+
+    def do_GET(self):
+        query = self.query()
+        with self.server.lock:
+            stored = self.server.objects.get(self.key())
+
+        if 'X-Amz-Signature' in query:
+            signed = datetime.strptime(query['X-Amz-Date'], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+            expires = signed.timestamp() + int(query['X-Amz-Expires'])
+        else:
+            # Signature version 2 links carry the expiry itself
+            expires = int(query['Expires']) if 'Signature' in query else None
+        if expires is not None and expires < time.time():
+            return self.error(403, 'AccessDenied')
+        if stored is None:
+            return self.error(404, 'NoSuchKey')
+
+        data, modified = stored
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(modified),
+            'Accept-Ranges': 'bytes',
+            'Content-Type': query.get('response-content-type', 'binary/octet-stream'),
+        }
+        if 'response-content-disposition' in query:
+            headers['Content-Disposition'] = query['response-content-disposition']
+        if self.headers.get('If-None-Match') == etag:
+            return self.reply(304, headers={'ETag': etag})
+
+        status = 200
+        if 'Range' in self.headers:
+            try:
+                span = byte_range(self.headers['Range'], len(data))
+            except RangeNotSatisfiable:
+                return self.error(416, 'InvalidRange')
+            if span:
+                status, data = 206, data[span[0]:span[1] + 1]
+                headers['Content-Range'] = f'bytes {span[0]}-{span[1]}/{len(stored[0])}'
+        self.reply(status, data, headers)
+
+    do_HEAD = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubObjectStorageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubObjectStorageHandler)
+        self.lock = threading.Lock()
+        # "bucket/key" -> (bytes, modified timestamp)
+        self.objects = {}
+
+    def handle_error(self, request, client_address):
+        pass
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
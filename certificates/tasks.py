@@ -4,110 +4,48 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-import qrcode
-from io import BytesIO
-from django.core.files import File
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from django.core.files.base import ContentFile
 from django.utils import timezone
-from .models import Certificate
+from .models import Certificate, CertificateBatch
+from .rendering import CertificateText, make_qr, qr_png, render
+from .verification import qr_payload
 from courses.models import Enrollment
 
+def create_certificate(enrollment):
+    """Create the Certificate for ``enrollment`` with its QR code and PDF"""
+    # Generate certificate number first
+    cert_num = Certificate.generate_certificate_number()
+
+    # Create certificate record
+    certificate = Certificate.objects.create(
+        enrollment=enrollment,
+        certificate_number=cert_num,
+        qr_data=qr_payload(cert_num)
+    )
+    
+    # One QR code for both the PNG and the image inside the PDF
+    qr = make_qr(certificate.qr_data['url'])
+    certificate.qr_code_image.save(
+        f'qr_{certificate.certificate_number}.png',
+        ContentFile(qr_png(qr)),
+        save=False
+    )
+    
+    # Generate PDF certificate over the course's cached static layer
+    pdf = render(CertificateText.for_enrollment(enrollment, certificate.certificate_number), qr)
+    
+    certificate.certificate_file.save(
+        f'certificate_{certificate.certificate_number}.pdf',
+        ContentFile(pdf),
+        save=True
+    )
+    return certificate
+
 @shared_task
 def generate_certificate(enrollment_id):
     try:
         enrollment = Enrollment.objects.get(id=enrollment_id)
-
-        # Generate certificate number first
-        cert_num = Certificate().generate_certificate_number()
-
-        # Prepare QR data (use cert_num here)
-        qr_payload = {
-            'student_name': enrollment.student.get_full_name(),
-            'course_name': enrollment.course.name,
-            'completion_date': enrollment.completion_date.isoformat() if enrollment.completion_date else None,
-            'certificate_number': cert_num,
-            'mobile': enrollment.student.mobile,
-        }
-
-        # Create certificate record
-        certificate = Certificate.objects.create(
-            enrollment=enrollment,
-            certificate_number=cert_num,
-            qr_data=qr_payload
-        )
-        
-        # Generate QR code
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(str(certificate.qr_data))
-        qr.make(fit=True)
-        
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        qr_buffer = BytesIO()
-        qr_img.save(qr_buffer, format='PNG')
-        qr_buffer.seek(0)
-        
-        certificate.qr_code_image.save(
-            f'qr_{certificate.certificate_number}.png',
-            File(qr_buffer),
-            save=False
-        )
-        
-        # Generate PDF certificate
-        pdf_buffer = BytesIO()
-        p = canvas.Canvas(pdf_buffer, pagesize=letter)
-        
-        width, height = letter
-        
-        # Title
-        p.setFont("Helvetica-Bold", 24)
-        p.drawCentredString(width/2, height-100, "CERTIFICATE OF COMPLETION")
-        
-        # Logo area
-        p.setFont("Helvetica-Bold", 16)
-        p.drawCentredString(width/2, height-140, "ULTIMA TRAINING")
-        
-        # Student
-        p.setFont("Helvetica-Bold", 18)
-        p.drawCentredString(width/2, height-200, f"This certifies that")
-        p.setFont("Helvetica-Bold", 20)
-        p.drawCentredString(width/2, height-230, enrollment.student.get_full_name())
-        
-        # Course
-        p.setFont("Helvetica", 14)
-        p.drawCentredString(width/2, height-270, f"has successfully completed the course")
-        p.setFont("Helvetica-Bold", 16)
-        p.drawCentredString(width/2, height-300, enrollment.course.name)
-        
-        # Dates and location
-        p.setFont("Helvetica", 12)
-        completion_date = enrollment.completion_date.strftime('%B %d, %Y') if enrollment.completion_date else 'N/A'
-        p.drawCentredString(width/2, height-340, f"Completed on: {completion_date}")
-        p.drawCentredString(width/2, height-360, f"Location: {enrollment.session.location}")
-        
-        # Certificate number
-        p.drawCentredString(width/2, height-400, f"Certificate Number: {certificate.certificate_number}")
-        
-        # Signatures
-        p.setFont("Helvetica", 10)
-        p.drawString(100, 150, "Dr. Josef Balahan")
-        p.drawString(100, 130, "Founder & Lead Trainer")
-        
-        p.drawString(400, 150, enrollment.course.instructor.get_full_name())
-        p.drawString(400, 130, "Course Instructor")
-        
-        # Placeholder for QR code box (not embedding image into PDF in this demo)
-        p.drawString(width-150, 100, "QR Code")
-        p.rect(width-150, 120, 100, 100, stroke=1, fill=0)
-        
-        p.save()
-        pdf_buffer.seek(0)
-        
-        certificate.certificate_file.save(
-            f'certificate_{certificate.certificate_number}.pdf',
-            File(pdf_buffer),
-            save=True
-        )
+        certificate = create_certificate(enrollment)
         
         # Send certificate email
         send_certificate_email.delay(certificate.id)
@@ -115,6 +53,21 @@ def generate_certificate(enrollment_id):
     except Exception as e:
         print(f"Error generating certificate: {e}")
 
+@shared_task
+def generate_session_certificates(batch_id, enrollment_ids=None):
+    """Run one bulk certificate job (certificates.bulk)"""
+    from .bulk import generate
+    
+    try:
+        certificate_ids = generate(CertificateBatch.objects.get(id=batch_id), enrollment_ids)
+    except Exception as e:
+        print(f"Error generating session certificates: {e}")
+        CertificateBatch.objects.filter(id=batch_id).update(status='failed', finished_at=timezone.now())
+        return
+    
+    if certificate_ids:
+        send_certificate_emails.delay(certificate_ids)
+
 @shared_task
 def send_certificate_email(certificate_id):
     try:
@@ -134,4 +87,32 @@ def send_certificate_email(certificate_id):
             html_message=html_message,
         )
     except Exception as e:
-        print(f"Error sending certificate email: {e}")
\ No newline at end of file
+        print(f"Error sending certificate email: {e}")
+
+@shared_task
+def send_certificate_emails(certificate_ids):
+    """Send a batch of certificate emails over one SMTP connection"""
+    from django.core.mail import EmailMultiAlternatives, get_connection
+    
+    try:
+        certificates = Certificate.objects.filter(
+            id__in=certificate_ids
+        ).select_related('enrollment__student', 'enrollment__course')
+        
+        messages = []
+        for certificate in certificates:
+            html_message = render_to_string('emails/certificate_ready.html', {
+                'certificate': certificate,
+            })
+            message = EmailMultiAlternatives(
+                f'Your Certificate is Ready - {certificate.enrollment.course.name}',
+                strip_tags(html_message),
+                settings.DEFAULT_FROM_EMAIL,
+                [certificate.enrollment.student.email],
+            )
+            message.attach_alternative(html_message, 'text/html')
+            messages.append(message)
+        
+        return get_connection().send_messages(messages)
+    except Exception as e:
+        print(f"Error sending certificate emails: {e}")
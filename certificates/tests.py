@@ -1,3 +1,279 @@
-from django.test import TestCase
+import re
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from courses.models import Course, CourseSession, Enrollment
+from .models import Certificate, CertificateBatch
+from .downloads import RangeNotSatisfiable, byte_range
+from .rendering import CertificateText, make_qr, render, static_layer
+from .storage_stub import StubObjectStorageServer
+from .tasks import generate_session_certificates
+from .verification import signature, verification_url
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class SessionCertificateBatchTest(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=self.instructor, price=100, duration_hours=8, max_capacity=10
+        )
+        self.session = CourseSession.objects.create(
+            course=course,
+            start_datetime=timezone.now() - timedelta(days=2),
+            end_datetime=timezone.now() - timedelta(days=1),
+        )
+        self.enrollments = [
+            Enrollment.objects.create(
+                student=User.objects.create_user(
+                    email=f'student{n}@example.com', username=f'student{n}', password='x'
+                ),
+                course=course, session=self.session, final_price=100, status='completed'
+            )
+            for n in range(3)
+        ]
+        self.batch = CertificateBatch.objects.create(
+            session=self.session, requested_by=self.instructor, total=len(self.enrollments)
+        )
+
+    @mock.patch('certificates.tasks.send_certificate_emails.delay')
+    def test_renders_whole_session_in_one_pass(self, send_emails):
+        ids = [str(enrollment.id) for enrollment in self.enrollments]
+        generate_session_certificates(str(self.batch.id), ids)
+
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.status, self.batch.completed, self.batch.failed), ('completed', 3, 0))
+        self.assertEqual(Certificate.objects.filter(enrollment__session=self.session).count(), 3)
+        self.assertEqual(len(send_emails.call_args.args[0]), 3)
+
+        # Re-running skips enrollments that already have a certificate
+        generate_session_certificates(str(self.batch.id), ids)
+        self.assertEqual(Certificate.objects.count(), 3)
+
+    @override_settings(CERTIFICATE_CHUNK_SIZE=2, CERTIFICATE_RENDER_PROCESSES=2)
+    @mock.patch('certificates.tasks.send_certificate_emails.delay')
+    def test_whole_session_renders_in_process_pool(self, send_emails):
+        generate_session_certificates(str(self.batch.id))
+
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.status, self.batch.total, self.batch.completed), ('completed', 3, 3))
+        self.assertEqual(set(self.batch.timings), {'query', 'render', 'store', 'insert'})
+
+        certificate = Certificate.objects.select_related('enrollment').first()
+        self.assertEqual(certificate.qr_data['certificate_number'], certificate.certificate_number)
+        self.assertNotIn('mobile', certificate.qr_data)
+        with certificate.certificate_file.open('rb') as pdf:
+            self.assertIn(certificate.certificate_number.encode(), pdf.read())
+
+    @mock.patch('certificates.tasks.send_certificate_email.delay')
+    @mock.patch('certificates.tasks.send_certificate_emails.delay')
+    def test_bulk_and_single_numbers_match(self, send_emails, send_email):
+        from .tasks import generate_certificate
+
+        generate_certificate(self.enrollments[0].id)
+        generate_session_certificates(str(self.batch.id), [str(e.id) for e in self.enrollments[1:]])
+
+        numbers = list(Certificate.objects.values_list('certificate_number', flat=True))
+        self.assertEqual(len(numbers), 3)
+        for number in numbers:
+            self.assertRegex(number, r'^CERT-[0-9A-Z]{9}$')
+
+    def test_status_endpoint(self):
+        url = reverse('certificate_batch_status', args=[self.batch.id])
+        self.client.force_login(self.instructor)
+        self.assertEqual(self.client.get(url).json()['status'], 'queued')
+
+        self.client.force_login(self.enrollments[0].student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class CertificateRenderingTest(SimpleTestCase):
+    def certificate(self, student_name):
+        return CertificateText(
+            course_name='Negotiation', instructor_name='Sara Ahmadi', student_name=student_name,
+            completion_date='May 01, 2026', location='Tehran', certificate_number='CERT-000001'
+        )
+
+    def test_xref_points_at_every_object(self):
+        pdf = render(self.certificate('Zo\u00eb (Jr.)'))
+
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        xref = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+        offsets = re.findall(rb'(\d{10}) 00000 n', pdf[xref:])
+        for number, offset in enumerate(offsets, start=1):
+            self.assertTrue(pdf[int(offset):].startswith(b'%d 0 obj' % number))
+        self.assertIn(rb'(Zo\353 \(Jr.\)) Tj', pdf)
+
+    def test_static_layer_is_shared_per_course(self):
+        static_layer.cache_clear()
+        render(self.certificate('First Student'))
+        render(self.certificate('Second Student'))
+
+        self.assertEqual(static_layer.cache_info().misses, 1)
+        self.assertEqual(static_layer.cache_info().hits, 1)
+
+    @override_settings(CERTIFICATE_VERIFY_BASE_URL='https://ultima.example')
+    def test_qr_code_is_a_low_version_image_in_the_pdf(self):
+        qr = make_qr(verification_url('CERT-000001'))
+        self.assertLessEqual(qr.version, 4)
+
+        pdf = render(self.certificate('First Student'), qr)
+        size = len(qr.get_matrix())
+        self.assertIn(b'/Subtype /Image /Width %d /Height %d' % (size, size), pdf)
+        self.assertIn(b'/QR Do', pdf)
+
+
+@override_settings(CERTIFICATE_VERIFY_BASE_URL='https://ultima.example')
+class CertificateVerificationTest(TestCase):
+    def setUp(self):
+        student = User.objects.create_user(email='student@example.com', username='student', password='x')
+        course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=student, price=100, duration_hours=8, max_capacity=10
+        )
+        session = CourseSession.objects.create(
+            course=course,
+            start_datetime=timezone.now() - timedelta(days=2),
+            end_datetime=timezone.now() - timedelta(days=1),
+        )
+        enrollment = Enrollment.objects.create(
+            student=student, course=course, session=session, final_price=100, status='completed'
+        )
+        self.certificate = Certificate.objects.create(
+            enrollment=enrollment, certificate_number='CERT-000001', qr_data={}
+        )
+
+    def test_link_is_upper_case_and_signed(self):
+        url = verification_url('CERT-000001')
+        self.assertEqual(url, url.upper())
+        self.assertTrue(url.startswith('HTTPS://ULTIMA.EXAMPLE/C/CERT-000001/'))
+
+        response = self.client.get(url.removeprefix('HTTPS://ULTIMA.EXAMPLE'))
+        self.assertTrue(response.context['is_valid'])
+        self.assertEqual(response.context['certificate'], self.certificate)
+
+    def test_forged_signature_is_refused(self):
+        forged = signature('CERT-000002')
+        response = self.client.get(f'/C/CERT-000001/{forged}')
+        self.assertFalse(response.context['is_valid'])
+
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CERTIFICATE_DOWNLOAD_OFFLOAD='')
+class CertificateDownloadTest(TestCase):
+    content = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+    def setUp(self):
+        self.student = User.objects.create_user(email='student@example.com', username='student', password='x')
+        course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=self.student, price=100, duration_hours=8, max_capacity=10
+        )
+        session = CourseSession.objects.create(
+            course=course,
+            start_datetime=timezone.now() - timedelta(days=2),
+            end_datetime=timezone.now() - timedelta(days=1),
+        )
+        enrollment = Enrollment.objects.create(
+            student=self.student, course=course, session=session, final_price=100, status='completed'
+        )
+        self.certificate = Certificate.objects.create(
+            enrollment=enrollment, certificate_number='CERT-000001', qr_data={}
+        )
+        self.url = reverse('download_certificate', args=[self.certificate.id])
+        self.client.force_login(self.student)
+
+    def save_file(self):
+        self.certificate.certificate_file.save('certificate_CERT-000001.pdf', ContentFile(self.content))
+
+    def test_streams_local_file_with_validators(self):
+        self.save_file()
+        response = self.client.get(self.url)
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertIn('certificate_CERT-000001.pdf', response['Content-Disposition'])
+
+        cached = self.client.get(self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_byte_ranges(self):
+        self.save_file()
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(response.status_code, 416)
+
+        # A Range for an older copy of the file gets the whole current one
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(CERTIFICATE_DOWNLOAD_OFFLOAD='nginx', CERTIFICATE_DOWNLOAD_ACCEL_PREFIX='/protected-media/')
+    def test_offloads_to_nginx(self):
+        self.save_file()
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.certificate.certificate_file.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_other_students_get_404(self):
+        self.save_file()
+        self.client.force_login(User.objects.create_user(email='other@example.com', username='other', password='x'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(CERTIFICATE_DOWNLOAD_URL_EXPIRY=60)
+    def test_object_storage_redirects_to_presigned_url(self):
+        from storages.backends.s3 import S3Storage
+
+        with StubObjectStorageServer() as server:
+            storage = S3Storage(
+                bucket_name='media', endpoint_url=server.url, access_key='minio', secret_key='minio123',
+                region_name='us-east-1', addressing_style='path', signature_version='s3v4', file_overwrite=True
+            )
+            field = Certificate._meta.get_field('certificate_file')
+            with mock.patch.object(field, 'storage', storage):
+                self.certificate.refresh_from_db()
+                self.save_file()
+                response = self.client.get(self.url)
+
+            self.assertEqual(response.status_code, 302)
+            location = response['Location']
+            self.assertTrue(location.startswith(f'{server.url}/media/certificates/'))
+            self.assertIn('X-Amz-Expires=60', location)
+
+            download = requests.get(location, headers={'Range': 'bytes=0-8'}, timeout=5)
+            self.assertEqual((download.status_code, download.content), (206, b'%PDF-1.4 '))
+            self.assertIn('certificate_CERT-000001.pdf', download.headers['Content-Disposition'])
+
+            with mock.patch('certificates.storage_stub.time.time', return_value=time.time() + 61):
+                self.assertEqual(requests.get(location, timeout=5).status_code, 403)
+
+
+class ByteRangeTest(SimpleTestCase):
+    def test_forms(self):
+        self.assertEqual(byte_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(byte_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(byte_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(byte_range('bytes=990-2000', 1000), (990, 999))
+        # Multiple or malformed ranges are ignored, so the whole file is sent
+        self.assertIsNone(byte_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(byte_range('bytes=9-1', 1000))
+        with self.assertRaises(RangeNotSatisfiable):
+            byte_range('bytes=1000-', 1000)
@@ -4,5 +4,6 @@ from . import views
 
 urlpatterns = [
     path('download/<uuid:certificate_id>/', views.download_certificate, name='download_certificate'),
+    path('batches/<uuid:batch_id>/', views.certificate_batch_status, name='certificate_batch_status'),
     path('verify/<str:certificate_number>/', views.verify_certificate, name='verify_certificate'),
 ]
\ No newline at end of file
@@ -1,11 +1,11 @@
 # certificates/views.py
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, Http404
-from django.conf import settings
-import os
+from django.http import Http404, JsonResponse
 
-from .models import Certificate
+from .downloads import serve_file
+from .models import Certificate, CertificateBatch
+from .verification import is_authentic
 
 @login_required
 def download_certificate(request, certificate_id):
@@ -22,14 +22,22 @@ def download_certificate(request, certificate_id):
     if not certificate.certificate_file:
         raise Http404("Certificate file not found")
     
-    file_path = certificate.certificate_file.path
-    if os.path.exists(file_path):
-        with open(file_path, 'rb') as fh:
-            response = HttpResponse(fh.read(), content_type="application/pdf")
-            response['Content-Disposition'] = f'attachment; filename="certificate_{certificate.certificate_number}.pdf"'
-            return response
+    return serve_file(
+        request,
+        certificate.certificate_file,
+        f'certificate_{certificate.certificate_number}.pdf',
+        content_type='application/pdf'
+    )
+
+@login_required
+def certificate_batch_status(request, batch_id):
+    """Progress of a bulk certificate job, polled by the instructor dashboard"""
+    batch = get_object_or_404(CertificateBatch.objects.select_related('session__course'), id=batch_id)
+    
+    if batch.requested_by_id != request.user.id and batch.session.course.instructor_id != request.user.id:
+        return JsonResponse({'error': 'Access denied'}, status=403)
     
-    raise Http404("Certificate file not found")
+    return JsonResponse(batch.as_dict())
 
 def verify_certificate(request, certificate_number):
     """Public certificate verification"""
@@ -48,4 +56,14 @@ def verify_certificate(request, certificate_number):
             'error': 'Certificate not found or invalid'
         }
     
-    return render(request, 'certificates/verify.html', context)
\ No newline at end of file
+    return render(request, 'certificates/verify.html', context)
+
+def verify_signed_certificate(request, certificate_number, signature):
+    """Where a certificate's QR code points; the signature stops anyone guessing numbers"""
+    if not is_authentic(certificate_number, signature):
+        return render(request, 'certificates/verify.html', {
+            'is_valid': False,
+            'error': 'Certificate not found or invalid'
+        })
+    
+    return verify_certificate(request, certificate_number)
@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import PromoCode
 
-# Register your models here.
+@admin.register(PromoCode)
+class PromoCodeAdmin(admin.ModelAdmin):
+    list_display = ('code', 'discount_type', 'discount_value', 'times_redeemed', 'max_redemptions', 'valid_until', 'is_active')
+    list_filter = ('discount_type', 'is_active')
+    search_fields = ('code',)
+    filter_horizontal = ('courses',)
+    readonly_fields = ('times_redeemed',)
@@ -0,0 +1,194 @@
+# courses/admission.py
+"""
+Admission control for course registration.
+
+When a popular course opens, only as many students as there are free seats
+(capped at ADMISSION_MAX_ACTIVE) may hold the registration form at once.
+Each admitted student holds a reservation token that expires after
+ADMISSION_TOKEN_TTL seconds or when their enrollment is created; everyone
+else waits in a FIFO queue and is shown a lightweight waiting page that
+polls until their turn comes.
+
+State lives in Redis when ADMISSION_REDIS_URL is set, otherwise in an
+in-process store that is only suitable for development and tests.
+"""
+import threading
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+
+
+class Admission(NamedTuple):
+    admitted: bool
+    position: int = 0
+
+
+class MemoryAdmissionStore:
+    """Single-process stand-in with the same semantics as the Redis store"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}
+
+    def _room(self, room):
+        return self._rooms.setdefault(room, {
+            'active': {}, 'queue': {}, 'seen': {}, 'admitted': 0, 'wait_seconds': 0.0,
+        })
+
+    def admit(self, room, member, capacity, ttl, stale, now):
+        with self._lock:
+            state = self._room(room)
+            active, queue, seen = state['active'], state['queue'], state['seen']
+
+            for key, expires in list(active.items()):
+                if expires <= now:
+                    del active[key]
+            for key, last_seen in list(seen.items()):
+                if last_seen <= now - stale:
+                    queue.pop(key, None)
+                    del seen[key]
+
+            if member in active:
+                return Admission(True)
+
+            enqueued = queue.setdefault(member, now)
+            seen[member] = now
+            rank = sorted(queue, key=lambda key: (queue[key], key)).index(member)
+            if rank < capacity - len(active):
+                del queue[member]
+                del seen[member]
+                active[member] = now + ttl
+                state['admitted'] += 1
+                state['wait_seconds'] += now - enqueued
+                return Admission(True)
+            return Admission(False, rank + 1)
+
+    def release(self, room, member):
+        with self._lock:
+            self._room(room)['active'].pop(member, None)
+
+    def metrics(self, room):
+        with self._lock:
+            state = self._room(room)
+            return {
+                'queue_depth': len(state['queue']),
+                'active': len(state['active']),
+                'admitted': state['admitted'],
+                'wait_seconds': state['wait_seconds'],
+            }
+
+
+ADMIT_SCRIPT = """
+local active, queue, seen, stats = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local member = ARGV[1]
+local now, ttl, capacity, stale = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+
+redis.call('ZREMRANGEBYSCORE', active, '-inf', now)
+local gone = redis.call('ZRANGEBYSCORE', seen, '-inf', now - stale)
+for _, key in ipairs(gone) do
+    redis.call('ZREM', queue, key)
+    redis.call('ZREM', seen, key)
+end
+
+for _, key in ipairs(KEYS) do
+    redis.call('EXPIRE', key, ttl * 2)
+end
+
+if redis.call('ZSCORE', active, member) then
+    return {1, 0}
+end
+
+local enqueued = redis.call('ZSCORE', queue, member)
+if not enqueued then
+    enqueued = now
+    redis.call('ZADD', queue, now, member)
+end
+redis.call('ZADD', seen, now, member)
+
+local rank = redis.call('ZRANK', queue, member)
+if rank < capacity - redis.call('ZCARD', active) then
+    redis.call('ZREM', queue, member)
+    redis.call('ZREM', seen, member)
+    redis.call('ZADD', active, now + ttl, member)
+    redis.call('HINCRBY', stats, 'admitted', 1)
+    redis.call('HINCRBYFLOAT', stats, 'wait_seconds', now - tonumber(enqueued))
+    return {1, 0}
+end
+return {0, rank + 1}
+"""
+
+
+class RedisAdmissionStore:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.admit_script = self.client.register_script(ADMIT_SCRIPT)
+
+    def keys(self, room):
+        prefix = f'admission:{room}'
+        return [f'{prefix}:active', f'{prefix}:queue', f'{prefix}:seen', f'{prefix}:stats']
+
+    def admit(self, room, member, capacity, ttl, stale, now):
+        admitted, position = self.admit_script(
+            keys=self.keys(room), args=[member, now, ttl, capacity, stale]
+        )
+        return Admission(bool(admitted), int(position))
+
+    def release(self, room, member):
+        self.client.zrem(self.keys(room)[0], member)
+
+    def metrics(self, room):
+        active, queue, _, stats = self.keys(room)
+        pipe = self.client.pipeline()
+        pipe.zcard(queue)
+        pipe.zcard(active)
+        pipe.hgetall(stats)
+        queue_depth, active_count, totals = pipe.execute()
+        return {
+            'queue_depth': queue_depth,
+            'active': active_count,
+            'admitted': int(totals.get(b'admitted', 0)),
+            'wait_seconds': float(totals.get(b'wait_seconds', 0)),
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = settings.ADMISSION_REDIS_URL
+                _store = RedisAdmissionStore(url) if url else MemoryAdmissionStore()
+    return _store
+
+
+def admit(course, user):
+    """Admit ``user`` to ``course`` registration or tell them their queue position."""
+    capacity = min(course.available_spots, settings.ADMISSION_MAX_ACTIVE)
+    if capacity <= 0:
+        # Sold out: the form itself explains that every session is full
+        return Admission(True)
+    return get_store().admit(
+        str(course.pk),
+        str(user.pk),
+        capacity=capacity,
+        ttl=settings.ADMISSION_TOKEN_TTL,
+        stale=settings.ADMISSION_POLL_SECONDS * 3,
+        now=time.time(),
+    )
+
+
+def release(course, user):
+    get_store().release(str(course.pk), str(user.pk))
+
+
+def metrics(course):
+    stats = get_store().metrics(str(course.pk))
+    admitted = stats['admitted']
+    stats['average_wait_seconds'] = round(stats['wait_seconds'] / admitted, 2) if admitted else 0.0
+    return stats
@@ -0,0 +1,120 @@
+# courses/cache.py
+"""
+Versioned cache for the public course catalog.
+
+Cache keys embed a version token that is replaced whenever a Course or
+CourseSession changes (see courses.signals), so stale pages are never
+served and nothing has to be deleted explicitly.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+CATALOG_VERSION_KEY = 'courses:catalog:version'
+
+
+def course_version_key(course_id):
+    return f'courses:course:{course_id}:version'
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # A random token rather than a counter, so an evicted version key
+        # can never resurrect pages cached under an older version.
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def invalidate_catalog():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def invalidate_course(course_id):
+    bump_version(course_version_key(course_id))
+
+
+def student_version_key(user_id):
+    return f'dashboard:student:{user_id}:version'
+
+
+def invalidate_student(user_id):
+    bump_version(student_version_key(user_id))
+
+
+def student_dashboard_key(user_id):
+    # Course and session edits change what the dashboard shows as well
+    return (
+        f'dashboard:student:{user_id}:'
+        f'{get_version(student_version_key(user_id))}:{get_version(CATALOG_VERSION_KEY)}'
+    )
+
+
+def catalog_key(**params):
+    digest = hashlib.md5(repr(sorted(params.items())).encode()).hexdigest()
+    return f'courses:list:{get_version(CATALOG_VERSION_KEY)}:{digest}'
+
+
+def course_key(course_id):
+    return f'courses:detail:{course_id}:{get_version(course_version_key(course_id))}'
+
+
+def catalog_last_modified():
+    from .models import Course
+    return cache.get_or_set(
+        f'courses:list:{get_version(CATALOG_VERSION_KEY)}:last_modified',
+        lambda: Course.objects.filter(is_active=True).aggregate(Max('updated_at'))['updated_at__max'],
+        settings.CATALOG_CACHE_TIMEOUT
+    )
+
+
+def course_last_modified(course_id):
+    from .models import Course
+    return cache.get_or_set(
+        f'{course_key(course_id)}:last_modified',
+        lambda: Course.objects.filter(pk=course_id, is_active=True).values_list('updated_at', flat=True).first(),
+        settings.CATALOG_CACHE_TIMEOUT
+    )
+
+
+def cached_page(request, key, last_modified, render_page):
+    """
+    Serve a catalog page for anonymous visitors from the cache and answer
+    conditional requests with 304. Signed-in users get a fresh render since
+    the page includes their account menu.
+    """
+    if request.user.is_authenticated or len(get_messages(request)):
+        return render_page()
+
+    etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        content = cache.get(key)
+        if content is None:
+            response = render_page()
+            if response.status_code != 200:
+                return response
+            cache.set(key, response.content, settings.CATALOG_CACHE_TIMEOUT)
+        else:
+            response = HttpResponse(content)
+
+    response['ETag'] = etag
+    if timestamp:
+        response['Last-Modified'] = http_date(timestamp)
+    patch_vary_headers(response, ['Cookie'])
+    patch_cache_control(response, public=True, max_age=settings.CATALOG_BROWSER_MAX_AGE)
+    return response
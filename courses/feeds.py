@@ -0,0 +1,161 @@
+# courses/feeds.py
+"""
+Streaming iCalendar and JSON schedule feeds.
+
+Rows come from a start_datetime range query read with .iterator(), so a
+feed is written out as it is read and never materialized in memory.
+"""
+import hashlib
+import heapq
+import json
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import CATALOG_VERSION_KEY, get_version
+
+EVENTS_VERSION_KEY = 'branding:events:version'
+
+# Feeds cover sessions that started up to this long ago ...
+PAST_WINDOW = timedelta(days=30)
+# ... and everything scheduled up to this far ahead
+FUTURE_WINDOW = timedelta(days=365)
+
+CHUNK_SIZE = 500
+
+
+def feed_window():
+    # Day granularity keeps the ETag stable between polls
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - PAST_WINDOW, today + FUTURE_WINDOW
+
+
+def feed_etag(*parts, include_events=False):
+    start, _ = feed_window()
+    versions = [get_version(CATALOG_VERSION_KEY)]
+    if include_events:
+        versions.append(get_version(EVENTS_VERSION_KEY))
+    key = ':'.join(str(part) for part in (*parts, start.date(), *versions))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def session_entries(course_id=None, instructor_id=None):
+    from .models import CourseSession
+
+    start, end = feed_window()
+    sessions = CourseSession.objects.filter(
+        start_datetime__gte=start,
+        start_datetime__lt=end,
+        is_active=True,
+        course__is_active=True
+    )
+    if course_id:
+        sessions = sessions.filter(course_id=course_id)
+    if instructor_id:
+        sessions = sessions.filter(course__instructor_id=instructor_id)
+
+    rows = sessions.order_by('start_datetime').values(
+        'id', 'start_datetime', 'end_datetime', 'location', 'online_link',
+        'course_id', 'course__name', 'course__short_description'
+    )
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'uid': f"session-{row['id']}",
+            'type': 'session',
+            'title': row['course__name'],
+            'description': row['course__short_description'],
+            'start': row['start_datetime'],
+            'end': row['end_datetime'],
+            'location': row['location'] or row['online_link'],
+            'url': reverse('course_detail', args=[row['course_id']]),
+        }
+
+
+def event_entries():
+    from branding.models import Event
+
+    start, end = feed_window()
+    rows = Event.objects.filter(
+        start_datetime__gte=start,
+        start_datetime__lt=end
+    ).order_by('start_datetime').values(
+        'id', 'title', 'description', 'start_datetime', 'end_datetime', 'location', 'online_link'
+    )
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'uid': f"event-{row['id']}",
+            'type': 'event',
+            'title': row['title'],
+            'description': row['description'],
+            'start': row['start_datetime'],
+            'end': row['end_datetime'],
+            'location': row['location'] or row['online_link'],
+            'url': reverse('workshops_events'),
+        }
+
+
+def merged_entries(*streams):
+    return heapq.merge(*streams, key=lambda entry: entry['start'])
+
+
+def ical_escape(value):
+    return (
+        (value or '').replace('\\', '\\\\').replace(';', '\\;')
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def ical_line(line):
+    # RFC 5545 folds content lines longer than 75 octets
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, current = [], b''
+    for char in line:
+        char_bytes = char.encode('utf-8')
+        if len(current) + len(char_bytes) > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += char_bytes
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ical_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_ical(entries, name, base_url):
+    stamp = ical_datetime(timezone.now())
+    yield ical_line('BEGIN:VCALENDAR')
+    yield ical_line('VERSION:2.0')
+    yield ical_line('PRODID:-//Ultima Training//Schedule//EN')
+    yield ical_line('CALSCALE:GREGORIAN')
+    yield ical_line(f'X-WR-CALNAME:{ical_escape(name)}')
+    for entry in entries:
+        yield ''.join([
+            ical_line('BEGIN:VEVENT'),
+            ical_line(f"UID:{entry['uid']}@ultima-training"),
+            ical_line(f'DTSTAMP:{stamp}'),
+            ical_line(f"DTSTART:{ical_datetime(entry['start'])}"),
+            ical_line(f"DTEND:{ical_datetime(entry['end'])}"),
+            ical_line(f"SUMMARY:{ical_escape(entry['title'])}"),
+            ical_line(f"DESCRIPTION:{ical_escape(entry['description'])}"),
+            ical_line(f"LOCATION:{ical_escape(entry['location'])}"),
+            ical_line(f"URL:{base_url}{entry['url']}"),
+            ical_line('END:VEVENT'),
+        ])
+    yield ical_line('END:VCALENDAR')
+
+
+def render_json(entries, base_url):
+    yield '['
+    separator = ''
+    for entry in entries:
+        entry = {key: value for key, value in entry.items() if key != 'uid'}
+        entry['url'] = base_url + entry['url']
+        yield separator + json.dumps(entry, cls=DjangoJSONEncoder)
+        separator = ','
+    yield ']'
@@ -3,8 +3,15 @@ from django import forms
 from .models import Enrollment, Feedback, CourseSession
 from django.utils import timezone
 
+class SessionChoiceField(forms.ModelChoiceField):
+    def label_from_instance(self, obj):
+        label = f"{obj.start_datetime.strftime('%Y-%m-%d %H:%M')} - {obj.location or 'Online'}"
+        if obj.is_full:
+            return f"{label} (fully booked)"
+        return f"{label} ({obj.available_spots} spots left)"
+
 class CourseRegistrationForm(forms.ModelForm):
-    session = forms.ModelChoiceField(
+    session = SessionChoiceField(
         queryset=CourseSession.objects.none(),
         widget=forms.Select(attrs={'class': 'form-control'}),
         empty_label="Select date and location"
@@ -22,6 +29,8 @@ class CourseRegistrationForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         course = kwargs.pop('course', None)
         super().__init__(*args, **kwargs)
+        self.course = course
+        self.promo_rule = None
         
         if course:
             self.fields['session'].queryset = course.sessions.filter(
@@ -29,15 +38,32 @@ class CourseRegistrationForm(forms.ModelForm):
                 is_active=True
             ).order_by('start_datetime')
     
+    def clean_session(self):
+        session = self.cleaned_data['session']
+        if session.is_full:
+            raise forms.ValidationError('This session is fully booked.')
+        return session
+    
+    def clean_promo_code(self):
+        promo_code = self.cleaned_data.get('promo_code', '')
+        if not promo_code:
+            return ''
+        
+        from .promotions import lookup
+        self.promo_rule = lookup(promo_code, self.course)
+        if self.promo_rule is None:
+            raise forms.ValidationError('This promo code is not valid for this course.')
+        return self.promo_rule.code
+    
     def save(self, commit=True):
         enrollment = super().save(commit=False)
         enrollment.final_price = enrollment.session.course.price
         
-        # Apply promo code if valid
-        promo_code = self.cleaned_data.get('promo_code')
-        if promo_code:
-            # Implement promo code logic here
-            pass
+        # Apply promo code if valid; the usage cap is enforced when the
+        # enrollment is saved
+        if self.promo_rule:
+            enrollment.promo_code = self.promo_rule.code
+            enrollment.final_price = self.promo_rule.apply(enrollment.final_price)
         
         if commit:
             enrollment.save()
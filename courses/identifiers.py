@@ -0,0 +1,184 @@
+# courses/identifiers.py
+"""
+Short, human-friendly, collision-free codes for tracking and certificate
+numbers.
+
+Each allocator draws integers from a database counter (IdentifierSequence)
+in blocks, so most allocations never touch the database. The integer is
+scrambled with a keyed Feistel permutation, which is a bijection, so
+distinct counters always give distinct codes that still look random. The
+result is written in Crockford base32 (no I, L, O or U) followed by a
+Luhn mod 32 check character that catches any single mistyped character.
+"""
+import hashlib
+import os
+import secrets
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.db.models import F
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+CHAR_BITS = 5
+
+
+def checksum_char(payload):
+    """Luhn mod 32 check character for a base32 payload."""
+    factor, total = 2, 0
+    for char in reversed(payload):
+        addend = factor * ALPHABET.index(char)
+        addend = addend // 32 + addend % 32
+        total += addend
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(32 - total % 32) % 32]
+
+
+def is_valid(code, length=8):
+    code = code.upper()
+    if len(code) != length + 1 or any(char not in ALPHABET for char in code):
+        return False
+    return checksum_char(code[:-1]) == code[-1]
+
+
+def encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def feistel(value, key, bits, rounds=4):
+    """Keyed permutation of the integers in [0, 2**bits); bits must be even."""
+    half = bits // 2
+    mask = (1 << half) - 1
+    left, right = value >> half, value & mask
+    for round_number in range(rounds):
+        digest = hashlib.blake2b(
+            f'{round_number}:{right}'.encode(), key=key, digest_size=8
+        ).digest()
+        left, right = right, left ^ (int.from_bytes(digest, 'big') & mask)
+    return (left << half) | right
+
+
+class IdentifierAllocator:
+    """
+    Allocates codes of ``length`` base32 characters plus a check character
+    from the sequence called ``name``. Thread-safe and fork-safe.
+
+    Blocks are reserved and committed at once, so the counter row is only
+    locked for the reservation itself. Inside a caller's transaction that
+    takes the allocator's own connection; a rollback then leaves a gap in
+    the sequence, never a repeat. SQLite allows one writer at a time, so the
+    own connection would wait on the caller's lock: there a single value is
+    reserved on the caller's connection instead.
+    """
+
+    def __init__(self, name, length=8, block_size=None):
+        assert (length * CHAR_BITS) % 2 == 0, 'length must give an even number of bits'
+        self.name = name
+        self.length = length
+        self.bits = length * CHAR_BITS
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._next = self._end = 0
+        self._key = None
+        # A forked child must not talk over its parent's socket
+        self._connection = None
+
+    def allocate(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Never share a block with the parent of a forked worker
+                self._reset()
+
+            if self._next < self._end:
+                value, key = self._next, self._key
+                self._next += 1
+            elif connection.in_atomic_block and connection.vendor == 'sqlite':
+                value, _, key = self._reserve(1)
+            else:
+                block_size = self.block_size or settings.IDENTIFIER_BLOCK_SIZE
+                if connection.in_atomic_block:
+                    value, self._end, self._key = self._reserve_separately(block_size)
+                else:
+                    value, self._end, self._key = self._reserve(block_size)
+                self._next = value + 1
+                key = self._key
+
+        if value >= 1 << self.bits:
+            raise OverflowError(f'Identifier sequence {self.name!r} is exhausted')
+        payload = encode(feistel(value, bytes.fromhex(key), self.bits), self.length)
+        return payload + checksum_char(payload)
+
+    def _reserve(self, size):
+        """Take ``size`` values from the database counter: returns (start, end, key)."""
+        IdentifierSequence = apps.get_model('courses', 'IdentifierSequence')
+        sequences = IdentifierSequence.objects.filter(name=self.name)
+        with transaction.atomic():
+            if not sequences.update(next_value=F('next_value') + size):
+                try:
+                    with transaction.atomic():
+                        IdentifierSequence.objects.create(
+                            name=self.name, next_value=1 + size, key=secrets.token_hex(16)
+                        )
+                except IntegrityError:
+                    # Another worker created the row first
+                    sequences.update(next_value=F('next_value') + size)
+            end, key = sequences.values_list('next_value', 'key').get()
+        return end - size, end, key
+
+    def _own_connection(self):
+        if self._connection is None:
+            self._connection = connections.create_connection(DEFAULT_DB_ALIAS)
+            # Only ever used under self._lock, by whichever thread holds it
+            self._connection.inc_thread_sharing()
+        self._connection.close_if_unusable_or_obsolete()
+        return self._connection
+
+    def _reserve_separately(self, size):
+        """_reserve() in a short transaction of the allocator's own connection."""
+        IdentifierSequence = apps.get_model('courses', 'IdentifierSequence')
+        own = self._own_connection()
+        quote = own.ops.quote_name
+        table = quote(IdentifierSequence._meta.db_table)
+        name, next_value, key = quote('name'), quote('next_value'), quote('key')
+
+        for attempt in range(2):
+            own.set_autocommit(False)
+            try:
+                with own.cursor() as cursor:
+                    cursor.execute(
+                        f'UPDATE {table} SET {next_value} = {next_value} + %s WHERE {name} = %s',
+                        [size, self.name]
+                    )
+                    if not cursor.rowcount:
+                        cursor.execute(
+                            f'INSERT INTO {table} ({name}, {next_value}, {key}) VALUES (%s, %s, %s)',
+                            [self.name, 1 + size, secrets.token_hex(16)]
+                        )
+                    cursor.execute(f'SELECT {next_value}, {key} FROM {table} WHERE {name} = %s', [self.name])
+                    end, sequence_key = cursor.fetchone()
+                own.commit()
+            except IntegrityError:
+                # Another worker created the row first; the update will find it now
+                own.rollback()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                own.rollback()
+                raise
+            finally:
+                own.set_autocommit(True)
+            return end - size, end, sequence_key
+
+
+TRACKING_NUMBERS = IdentifierAllocator('enrollment_tracking_number')
+CERTIFICATE_NUMBERS = IdentifierAllocator('certificate_number')
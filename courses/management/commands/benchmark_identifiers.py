@@ -0,0 +1,74 @@
+# courses/management/commands/benchmark_identifiers.py
+import multiprocessing
+import random
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from courses.identifiers import IdentifierAllocator
+from courses.models import Enrollment, IdentifierSequence
+
+SEQUENCE_NAME = 'benchmark'
+
+
+def allocate_codes(count):
+    allocator = IdentifierAllocator(SEQUENCE_NAME)
+    try:
+        return [allocator.allocate() for _ in range(count)]
+    finally:
+        connections.close_all()
+
+
+def legacy_codes(count):
+    # The old scheme: random code plus a uniqueness query per attempt
+    codes = []
+    try:
+        for _ in range(count):
+            code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+            Enrollment.objects.filter(tracking_number=code).exists()
+            codes.append(code)
+        return codes
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Measure identifier allocation rate across concurrent workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--count', type=int, default=5000, help='Codes per worker')
+        parser.add_argument('--mode', choices=['process', 'thread'], default='process')
+        parser.add_argument('--compare-legacy', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            self.run('allocator', allocate_codes, options)
+            if options['compare_legacy']:
+                self.run('legacy random', legacy_codes, options)
+        finally:
+            IdentifierSequence.objects.filter(name=SEQUENCE_NAME).delete()
+
+    def run(self, label, func, options):
+        workers, count = options['workers'], options['count']
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        if options['mode'] == 'process':
+            executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+        else:
+            executor = ThreadPoolExecutor(workers)
+
+        started = time.perf_counter()
+        with executor:
+            batches = list(executor.map(func, [count] * workers))
+        elapsed = time.perf_counter() - started
+
+        codes = [code for batch in batches for code in batch]
+        duplicates = len(codes) - len(set(codes))
+        self.stdout.write(
+            f'{label}: {len(codes)} codes from {workers} {options["mode"]} workers '
+            f'in {elapsed:.2f}s ({len(codes) / elapsed:,.0f}/s), {duplicates} duplicates'
+        )
@@ -0,0 +1,18 @@
+# courses/management/commands/rebuild_course_search_index.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all courses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        with transaction.atomic():
+            backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt course search index ({type(backend).__name__})'))
@@ -0,0 +1,15 @@
+# courses/management/commands/rebuild_rating_rollups.py
+from django.core.management.base import BaseCommand
+
+from courses.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute course, session and instructor rating rollups from approved feedback'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rating rollup(s)'))
@@ -0,0 +1,45 @@
+# courses/management/commands/rebuild_seat_inventory.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from courses.models import CourseSession, Enrollment
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild CourseSession seat counters from Enrollment rows. '
+        'Run while registration is quiet; counters are overwritten, not adjusted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        taken = dict(
+            Enrollment.objects.filter(status__in=Enrollment.SEAT_HOLDING_STATUSES)
+            .values_list('session_id')
+            .annotate(total=Count('id'))
+        )
+
+        drifted = []
+        sessions = CourseSession.objects.select_related('course').only(
+            'id', 'capacity', 'seats_taken', 'course__max_capacity'
+        )
+        for session in sessions.iterator(chunk_size=options['batch_size']):
+            seats_taken = taken.get(session.id, 0)
+            capacity = session.capacity if session.capacity is not None else session.course.max_capacity
+            if session.seats_taken != seats_taken or session.capacity != capacity:
+                session.seats_taken = seats_taken
+                session.capacity = capacity
+                drifted.append(session)
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                CourseSession.objects.bulk_update(
+                    drifted, ['seats_taken', 'capacity'], batch_size=options['batch_size']
+                )
+
+        verb = 'would be corrected' if options['dry_run'] else 'corrected'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} session(s) {verb}'))
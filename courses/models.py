@@ -1,7 +1,13 @@
 # courses/models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+from collections import Counter
+from functools import partial
 import uuid
 
 User = get_user_model()
@@ -49,17 +55,28 @@ class Course(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='courses_course_seek_idx'),
+        ]
     
     def __str__(self):
         return self.name
     
+    def upcoming_sessions(self):
+        # Iterates sessions.all() so a prefetch_related('sessions') is reused
+        now = timezone.now()
+        return [
+            session for session in self.sessions.all()
+            if session.is_active and session.start_datetime >= now
+        ]
+    
     @property
     def enrolled_count(self):
-        return self.enrollments.filter(status='enrolled').count()
+        return sum(session.seats_taken for session in self.upcoming_sessions())
     
     @property
     def available_spots(self):
-        return self.max_capacity - self.enrolled_count
+        return sum(session.available_spots for session in self.upcoming_sessions())
 
 class CourseSession(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='sessions')
@@ -69,11 +86,57 @@ class CourseSession(models.Model):
     online_link = models.URLField(blank=True)
     is_active = models.BooleanField(default=True)
     
+    # Seat inventory, kept in sync by Enrollment.save() and Enrollment.release_seat()
+    capacity = models.PositiveIntegerField(null=True, blank=True, help_text='Defaults to the course max capacity')
+    seats_taken = models.PositiveIntegerField(default=0)
+    
     class Meta:
         ordering = ['start_datetime']
+        indexes = [
+            models.Index(fields=['start_datetime'], name='courses_session_start_idx'),
+        ]
     
     def __str__(self):
         return f"{self.course.name} - {self.start_datetime.strftime('%Y-%m-%d %H:%M')}"
+    
+    def save(self, *args, **kwargs):
+        if self.capacity is None:
+            self.capacity = self.course.max_capacity
+        super().save(*args, **kwargs)
+    
+    @property
+    def available_spots(self):
+        return max((self.capacity or 0) - self.seats_taken, 0)
+    
+    @property
+    def is_full(self):
+        return self.available_spots == 0
+    
+    def reserve_seat(self):
+        """Atomically take one seat. Returns False when the session is full."""
+        reserved = CourseSession.objects.filter(
+            pk=self.pk,
+            seats_taken__lt=F('capacity')
+        ).update(seats_taken=F('seats_taken') + 1)
+        if reserved:
+            self.seats_taken += 1
+            self._seats_changed()
+        return bool(reserved)
+    
+    def release_seat(self):
+        released = CourseSession.objects.filter(
+            pk=self.pk,
+            seats_taken__gt=0
+        ).update(seats_taken=F('seats_taken') - 1)
+        if released:
+            self.seats_taken -= 1
+            self._seats_changed()
+        return bool(released)
+    
+    def _seats_changed(self):
+        # Course pages show spots left per session
+        from .cache import invalidate_course
+        transaction.on_commit(partial(invalidate_course, self.course_id))
 
 class Enrollment(models.Model):
     STATUS_CHOICES = (
@@ -82,8 +145,12 @@ class Enrollment(models.Model):
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
         ('rejected', 'Rejected'),
+        ('expired', 'Expired'),
     )
     
+    # Statuses that occupy a seat in CourseSession.seats_taken
+    SEAT_HOLDING_STATUSES = ('pending', 'enrolled', 'completed')
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='enrollments')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
@@ -113,19 +180,151 @@ class Enrollment(models.Model):
     
     class Meta:
         unique_together = ['student', 'course', 'session']
+        indexes = [
+            # Instructor work queue: pending enrollments per course, oldest first
+            models.Index(fields=['course', 'status', 'created_at'], name='courses_enroll_queue_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.course.name}"
     
     def generate_tracking_number(self):
-        import random
-        import string
-        return ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+        from .identifiers import TRACKING_NUMBERS
+        return TRACKING_NUMBERS.allocate()
     
     def save(self, *args, **kwargs):
         if not self.tracking_number:
             self.tracking_number = self.generate_tracking_number()
+        
+        if self._state.adding and self.status in self.SEAT_HOLDING_STATUSES:
+            from . import promotions
+            with transaction.atomic():
+                if not self.session.reserve_seat():
+                    raise ValidationError({'session': 'This session is fully booked.'})
+                if self.promo_code and not promotions.redeem(self.promo_code):
+                    raise ValidationError({'promo_code': 'This promo code has reached its usage limit.'})
+                super().save(*args, **kwargs)
+            return
+        
         super().save(*args, **kwargs)
+    
+    def release_seat(self, status, **fields):
+        """
+        Move a seat-holding enrollment to ``status`` and give its seat back.
+        The status change is conditional, so concurrent calls release once.
+        Returns True if this call performed the transition.
+        """
+        fields['status'] = status
+        fields['updated_at'] = timezone.now()
+        with transaction.atomic():
+            updated = Enrollment.objects.filter(
+                pk=self.pk,
+                status__in=self.SEAT_HOLDING_STATUSES
+            ).update(**fields)
+            if updated:
+                self.session.release_seat()
+                if self.promo_code:
+                    from . import promotions
+                    promotions.release(self.promo_code)
+                from .cache import invalidate_student
+                transaction.on_commit(partial(invalidate_student, self.student_id))
+                Enrollment.mark_metrics_stale([(self.created_at, self.course_id)])
+                from .signals import enrollments_changed
+                enrollments_changed.send(sender=Enrollment, enrollment_ids=[self.pk])
+        
+        if updated:
+            for name, value in fields.items():
+                setattr(self, name, value)
+        return bool(updated)
+    
+    @classmethod
+    def bulk_decide(cls, enrollment_ids, instructor, action, reason=''):
+        """
+        Approve or reject many pending enrollments of ``instructor``'s courses
+        with a single UPDATE. Returns the ids that were actually changed.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            candidates = list(
+                cls.objects.select_for_update().filter(
+                    id__in=enrollment_ids,
+                    course__instructor=instructor,
+                    status='pending'
+                ).values_list('id', 'student_id', 'created_at', 'course_id')
+            )
+            ids = [candidate[0] for candidate in candidates]
+            if not ids:
+                return []
+            
+            if action == 'approve':
+                cls.objects.filter(id__in=ids, status='pending').update(
+                    status='enrolled', approved_by=instructor, approval_date=now, updated_at=now
+                )
+                from .cache import invalidate_student
+                for student_id in {candidate[1] for candidate in candidates}:
+                    transaction.on_commit(partial(invalidate_student, student_id))
+                cls.mark_metrics_stale(candidate[2:] for candidate in candidates)
+                from .signals import enrollments_changed
+                enrollments_changed.send(sender=cls, enrollment_ids=ids)
+                return ids
+            
+            return cls.bulk_release(ids, 'rejected', rejection_reason=reason)
+    
+    @classmethod
+    def bulk_release(cls, enrollment_ids, status, **fields):
+        """
+        Move many seat-holding enrollments to ``status`` and give their seats
+        and promo code uses back, with one UPDATE per table. Returns the ids
+        that were actually changed.
+        """
+        fields['status'] = status
+        fields['updated_at'] = timezone.now()
+        with transaction.atomic():
+            candidates = list(
+                cls.objects.select_for_update().filter(
+                    id__in=enrollment_ids,
+                    status__in=cls.SEAT_HOLDING_STATUSES
+                ).values_list('id', 'session_id', 'course_id', 'promo_code', 'student_id', 'created_at')
+            )
+            ids = [candidate[0] for candidate in candidates]
+            if not ids:
+                return []
+            
+            cls.objects.filter(id__in=ids).update(**fields)
+            released = Counter(candidate[1] for candidate in candidates)
+            for session_id, count in released.items():
+                CourseSession.objects.filter(pk=session_id).update(
+                    seats_taken=Greatest(F('seats_taken') - count, 0)
+                )
+            
+            from . import promotions
+            redeemed = Counter(candidate[3] for candidate in candidates if candidate[3])
+            for code, count in redeemed.items():
+                promotions.release(code, count)
+            
+            from .cache import invalidate_course, invalidate_student
+            for course_id in {candidate[2] for candidate in candidates}:
+                transaction.on_commit(partial(invalidate_course, course_id))
+            for student_id in {candidate[4] for candidate in candidates}:
+                transaction.on_commit(partial(invalidate_student, student_id))
+            cls.mark_metrics_stale((candidate[5], candidate[2]) for candidate in candidates)
+            from .signals import enrollments_changed
+            enrollments_changed.send(sender=cls, enrollment_ids=ids)
+        return ids
+    
+    @staticmethod
+    def mark_metrics_stale(changed):
+        """
+        Queue a rebuild of the analytics days that (created_at, course_id)
+        enrollments changed today fall on. Conditional UPDATEs skip the
+        post_save receiver that would otherwise do it.
+        """
+        from dashboard.analytics import mark_stale_days
+        today = timezone.localdate()
+        days = set()
+        for created_at, course_id in changed:
+            days.update([(today, course_id), (timezone.localdate(created_at), course_id)])
+        mark_stale_days(days)
 
 class Feedback(models.Model):
     enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='feedback')
@@ -166,5 +365,168 @@ class Feedback(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_approved', 'created_at'], name='courses_feedback_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Feedback for {self.enrollment}"
+    
+    def approve(self, reviewer):
+        """
+        Approve this feedback and count it in the rating rollups in the same
+        transaction. Returns False if it was already approved.
+        """
+        from . import rollups
+        from .cache import invalidate_student
+        now = timezone.now()
+        fields = {'is_approved': True, 'reviewed_by': reviewer, 'review_date': now, 'updated_at': now}
+        with transaction.atomic():
+            updated = Feedback.objects.filter(pk=self.pk, is_approved=False).update(**fields)
+            if updated:
+                rollups.apply(self)
+                transaction.on_commit(partial(invalidate_student, self.enrollment.student_id))
+                from .signals import feedback_approved
+                feedback_approved.send(sender=Feedback, feedback_ids=[self.pk])
+        
+        if updated:
+            for name, value in fields.items():
+                setattr(self, name, value)
+        return bool(updated)
+    
+    @classmethod
+    def bulk_approve(cls, feedback_ids, reviewer):
+        """
+        Approve many pending feedbacks on ``reviewer``'s courses in one
+        transaction. Returns the feedbacks that were actually approved.
+        """
+        from . import rollups
+        from .cache import invalidate_student
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                cls.objects.select_for_update().filter(
+                    id__in=feedback_ids,
+                    enrollment__course__instructor=reviewer,
+                    is_approved=False
+                ).values_list('id', flat=True)
+            )
+            if not ids:
+                return []
+            
+            cls.objects.filter(id__in=ids).update(
+                is_approved=True, reviewed_by=reviewer, review_date=now, updated_at=now
+            )
+            approved = list(cls.objects.filter(id__in=ids).select_related('enrollment__course'))
+            rollups.apply_many(approved)
+            for student_id in {feedback.enrollment.student_id for feedback in approved}:
+                transaction.on_commit(partial(invalidate_student, student_id))
+            from .signals import feedback_approved
+            feedback_approved.send(sender=cls, feedback_ids=ids)
+        return approved
+
+class PromoCode(models.Model):
+    DISCOUNT_TYPES = (
+        ('percent', 'Percentage'),
+        ('fixed', 'Fixed Amount'),
+    )
+    
+    code = models.CharField(max_length=50, unique=True)
+    description = models.CharField(max_length=200, blank=True)
+    
+    discount_type = models.CharField(max_length=10, choices=DISCOUNT_TYPES, default='percent')
+    discount_value = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    courses = models.ManyToManyField(
+        Course,
+        blank=True,
+        related_name='promo_codes',
+        help_text='Leave empty to apply to every course'
+    )
+    
+    valid_from = models.DateTimeField(null=True, blank=True)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    
+    max_redemptions = models.PositiveIntegerField(null=True, blank=True)
+    times_redeemed = models.PositiveIntegerField(default=0)
+    
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.code
+    
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+class RatingRollup(models.Model):
+    """Running totals of approved feedback for a course, session or instructor"""
+    SCOPES = (
+        ('course', 'Course'),
+        ('session', 'Session'),
+        ('instructor', 'Instructor'),
+    )
+    
+    scope = models.CharField(max_length=20, choices=SCOPES)
+    object_id = models.CharField(max_length=40)
+    
+    count = models.PositiveIntegerField(default=0)
+    overall_sum = models.PositiveIntegerField(default=0)
+    instructor_sum = models.PositiveIntegerField(default=0)
+    content_sum = models.PositiveIntegerField(default=0)
+    venue_sum = models.PositiveIntegerField(default=0)
+    recommend_count = models.PositiveIntegerField(default=0)
+    
+    # Histogram of overall_rating
+    overall_1 = models.PositiveIntegerField(default=0)
+    overall_2 = models.PositiveIntegerField(default=0)
+    overall_3 = models.PositiveIntegerField(default=0)
+    overall_4 = models.PositiveIntegerField(default=0)
+    overall_5 = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['scope', 'object_id']
+    
+    def __str__(self):
+        return f"{self.scope} {self.object_id}: {self.average_overall} ({self.count})"
+    
+    def _average(self, total):
+        return round(total / self.count, 2) if self.count else None
+    
+    @property
+    def average_overall(self):
+        return self._average(self.overall_sum)
+    
+    @property
+    def average_instructor(self):
+        return self._average(self.instructor_sum)
+    
+    @property
+    def average_content(self):
+        return self._average(self.content_sum)
+    
+    @property
+    def average_venue(self):
+        return self._average(self.venue_sum)
+    
+    @property
+    def recommend_percent(self):
+        return round(100 * self.recommend_count / self.count) if self.count else None
+    
+    @property
+    def histogram(self):
+        return [self.overall_1, self.overall_2, self.overall_3, self.overall_4, self.overall_5]
+
+class IdentifierSequence(models.Model):
+    """Counter that courses.identifiers reserves blocks of codes from"""
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+    key = models.CharField(max_length=32)
+    
     def __str__(self):
-        return f"Feedback for {self.enrollment}"
\ No newline at end of file
+        return f"{self.name} ({self.next_value})"
\ No newline at end of file
@@ -0,0 +1,120 @@
+# courses/promotions.py
+"""
+Promo code engine.
+
+Active codes are compiled into an in-process dict keyed by code, so
+validating a code during checkout costs one cache read and no query. The
+table is rebuilt whenever the promo version in the cache changes, which
+courses.signals bumps on any PromoCode change. Usage caps are enforced by
+a conditional UPDATE at redemption time, never by the compiled table.
+"""
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+from typing import FrozenSet, NamedTuple, Optional
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+
+PROMO_VERSION_KEY = 'courses:promo:version'
+
+CENT = Decimal('0.01')
+
+
+class PromoRule(NamedTuple):
+    id: int
+    code: str
+    discount_type: str
+    discount_value: Decimal
+    valid_from: Optional[object]
+    valid_until: Optional[object]
+    course_ids: Optional[FrozenSet]
+
+    def is_current(self, now):
+        if self.valid_from and now < self.valid_from:
+            return False
+        return not (self.valid_until and now >= self.valid_until)
+
+    def applies_to(self, course):
+        return self.course_ids is None or course.pk in self.course_ids
+
+    def apply(self, price):
+        if self.discount_type == 'percent':
+            discount = price * self.discount_value / 100
+        else:
+            discount = self.discount_value
+        return max(price - discount, Decimal('0')).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+_table = {'version': None, 'rules': {}}
+_lock = threading.Lock()
+
+
+def compile_rules():
+    from .models import PromoCode
+
+    now = timezone.now()
+    codes = PromoCode.objects.filter(is_active=True).filter(
+        Q(valid_until__isnull=True) | Q(valid_until__gt=now)
+    ).prefetch_related('courses')
+
+    rules = {}
+    for promo in codes:
+        course_ids = frozenset(course.pk for course in promo.courses.all())
+        rules[promo.code] = PromoRule(
+            id=promo.pk,
+            code=promo.code,
+            discount_type=promo.discount_type,
+            discount_value=promo.discount_value,
+            valid_from=promo.valid_from,
+            valid_until=promo.valid_until,
+            course_ids=course_ids or None,
+        )
+    return rules
+
+
+def get_rules():
+    version = get_version(PROMO_VERSION_KEY)
+    if _table['version'] != version:
+        with _lock:
+            if _table['version'] != version:
+                _table['rules'] = compile_rules()
+                _table['version'] = version
+    return _table['rules']
+
+
+def invalidate():
+    bump_version(PROMO_VERSION_KEY)
+
+
+def normalize(code):
+    return code.strip().upper()
+
+
+def lookup(code, course, now=None):
+    """Return the PromoRule for ``code`` if it is usable for ``course`` right now."""
+    rule = get_rules().get(normalize(code))
+    if rule and rule.is_current(now or timezone.now()) and rule.applies_to(course):
+        return rule
+    return None
+
+
+def redeem(code):
+    """Count one use of ``code``. Returns False once its usage cap is reached."""
+    from .models import PromoCode
+
+    return bool(
+        PromoCode.objects.filter(code=normalize(code), is_active=True).filter(
+            Q(max_redemptions__isnull=True) | Q(times_redeemed__lt=F('max_redemptions'))
+        ).update(times_redeemed=F('times_redeemed') + 1)
+    )
+
+
+def release(code, count=1):
+    """Give back ``count`` uses, e.g. when a discounted enrollment is cancelled."""
+    from .models import PromoCode
+
+    PromoCode.objects.filter(code=normalize(code), times_redeemed__gte=count).update(
+        times_redeemed=F('times_redeemed') - count
+    )
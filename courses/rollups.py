@@ -0,0 +1,116 @@
+# courses/rollups.py
+"""
+Incremental rating rollups.
+
+Every approved Feedback is counted once in the RatingRollup rows of its
+course, its session and the course's instructors. apply() adjusts those
+rows with F() increments and must run in the same transaction as the
+change to the feedback itself; rebuild() recomputes everything from
+scratch.
+"""
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .cache import invalidate_course
+from .models import Feedback, RatingRollup
+
+RATING_FIELDS = ('overall', 'instructor', 'content', 'venue')
+
+
+def rollup_keys(enrollment):
+    course = enrollment.course
+    keys = [
+        ('course', str(course.pk)),
+        ('session', str(enrollment.session_id)),
+        ('instructor', str(course.instructor_id)),
+    ]
+    if course.co_instructor_id:
+        keys.append(('instructor', str(course.co_instructor_id)))
+    return keys
+
+
+def apply(feedback, sign=1):
+    """Add (sign=1) or remove (sign=-1) one approved feedback from its rollups."""
+    apply_many([feedback], sign)
+
+
+def apply_many(feedbacks, sign=1):
+    """Like apply(), but with one UPDATE per affected rollup row for the whole batch."""
+    deltas = defaultdict(Counter)
+    course_ids = set()
+    for feedback in feedbacks:
+        enrollment = feedback.enrollment
+        course_ids.add(enrollment.course_id)
+        for key in rollup_keys(enrollment):
+            delta = deltas[key]
+            delta['count'] += sign
+            delta['recommend_count'] += sign * int(feedback.would_recommend)
+            delta[f'overall_{feedback.overall_rating}'] += sign
+            for field in RATING_FIELDS:
+                delta[f'{field}_sum'] += sign * getattr(feedback, f'{field}_rating')
+
+    with transaction.atomic():
+        for (scope, object_id), delta in deltas.items():
+            RatingRollup.objects.get_or_create(scope=scope, object_id=object_id)
+            RatingRollup.objects.filter(scope=scope, object_id=object_id).update(
+                **{field: F(field) + value for field, value in delta.items()}
+            )
+    # Course pages show the rating summary
+    for course_id in course_ids:
+        transaction.on_commit(partial(invalidate_course, course_id))
+
+
+def get_rollup(scope, object_id):
+    """The rollup row for one scope, or an empty unsaved one."""
+    return (
+        RatingRollup.objects.filter(scope=scope, object_id=str(object_id)).first()
+        or RatingRollup(scope=scope, object_id=str(object_id))
+    )
+
+
+def get_rollups(scope, object_ids):
+    """Rollup rows for many objects of one scope, keyed by object id."""
+    rows = RatingRollup.objects.filter(scope=scope, object_id__in=[str(object_id) for object_id in object_ids])
+    return {rollup.object_id: rollup for rollup in rows}
+
+
+def aggregate(queryset, group_by):
+    values = {
+        'count': Count('id'),
+        'recommend_count': Count('id', filter=Q(would_recommend=True)),
+    }
+    for field in RATING_FIELDS:
+        values[f'{field}_sum'] = Sum(f'{field}_rating')
+    for rating in range(1, 6):
+        values[f'overall_{rating}'] = Count('id', filter=Q(overall_rating=rating))
+    return queryset.values(group_by).annotate(**values).order_by()
+
+
+def rebuild(batch_size=500):
+    approved = Feedback.objects.filter(is_approved=True)
+    groups = [
+        ('course', 'enrollment__course_id'),
+        ('session', 'enrollment__session_id'),
+        ('instructor', 'enrollment__course__instructor_id'),
+        ('instructor', 'enrollment__course__co_instructor_id'),
+    ]
+
+    rollups = {}
+    for scope, group_by in groups:
+        for row in aggregate(approved, group_by):
+            object_id = row.pop(group_by)
+            if object_id is None:
+                continue
+            key = (scope, str(object_id))
+            rollup = rollups.setdefault(key, RatingRollup(scope=scope, object_id=key[1]))
+            # An instructor can be lead on some courses and co-instructor on others
+            for field, value in row.items():
+                setattr(rollup, field, getattr(rollup, field) + (value or 0))
+
+    with transaction.atomic():
+        RatingRollup.objects.all().delete()
+        RatingRollup.objects.bulk_create(rollups.values(), batch_size=batch_size)
+    return len(rollups)
@@ -0,0 +1,199 @@
+# courses/search.py
+"""
+Full-text search over the course catalog.
+
+The index lives in a side table next to ``courses_course``: an FTS5 virtual
+table on SQLite and a ``tsvector`` column with a GIN index on PostgreSQL.
+It is created after ``migrate`` and kept in sync by the signals in
+``courses.signals``. Other databases fall back to ``icontains`` filtering.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils.module_loading import import_string
+
+from .models import Course
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Indexed fields, highest weight first
+SEARCH_FIELDS = ('name', 'short_description', 'detailed_description', 'prerequisites')
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())[:10]
+
+
+class BaseSearchBackend:
+    def setup(self):
+        pass
+
+    def index(self, course):
+        pass
+
+    def remove(self, course_id):
+        pass
+
+    def clear(self):
+        pass
+
+    def rebuild(self, batch_size=500):
+        self.setup()
+        self.clear()
+        for course in Course.objects.only(*SEARCH_FIELDS).iterator(chunk_size=batch_size):
+            self.index(course)
+
+    def search(self, query, limit):
+        """Return course ids ordered by relevance, best match first."""
+        raise NotImplementedError
+
+    def filter(self, queryset, query, limit=None):
+        limit = limit or settings.COURSE_SEARCH_LIMIT
+        ids = self.search(query, limit)
+        if not ids:
+            return queryset.none()
+        ranking = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+            output_field=IntegerField()
+        )
+        return queryset.filter(pk__in=ids).order_by(ranking)
+
+    def db_id(self, course_id):
+        return Course._meta.pk.get_db_prep_value(course_id, connection)
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """Unindexed fallback for databases without a native full-text engine"""
+
+    def search(self, query, limit):
+        return list(
+            Course.objects.filter(
+                Q(name__icontains=query) | Q(short_description__icontains=query)
+            ).values_list('pk', flat=True)[:limit]
+        )
+
+    def filter(self, queryset, query, limit=None):
+        return queryset.filter(
+            Q(name__icontains=query) | Q(short_description__icontains=query)
+        )
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    table = 'courses_course_fts'
+    # bm25() weights, one per column including the unindexed course_id
+    weights = (0.0, 10.0, 5.0, 1.0, 2.0)
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                f"course_id UNINDEXED, {', '.join(SEARCH_FIELDS)}, "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def index(self, course):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE course_id = %s", [self.db_id(course.pk)])
+            cursor.execute(
+                f"INSERT INTO {self.table} (course_id, {', '.join(SEARCH_FIELDS)}) "
+                f"VALUES (%s, %s, %s, %s, %s)",
+                [self.db_id(course.pk)] + [getattr(course, field) for field in SEARCH_FIELDS]
+            )
+
+    def remove(self, course_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE course_id = %s", [self.db_id(course_id)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Quote every token so user input can't inject FTS5 operators; the
+        # trailing * gives prefix matches for search-as-you-type.
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT course_id FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, {weights}) LIMIT %s",
+                [match, limit]
+            )
+            return [Course._meta.pk.to_python(row[0]) for row in cursor.fetchall()]
+
+
+class PostgreSQLSearchBackend(BaseSearchBackend):
+    table = 'courses_course_search'
+    config = 'english'
+    # setweight() labels in SEARCH_FIELDS order
+    weights = ('A', 'B', 'D', 'C')
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                f"course_id uuid PRIMARY KEY REFERENCES courses_course (id) ON DELETE CASCADE, "
+                f"document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_document_gin "
+                f"ON {self.table} USING gin (document)"
+            )
+
+    def index(self, course):
+        document = ' || '.join(
+            f"setweight(to_tsvector(%s::regconfig, %s), '{weight}')"
+            for weight in self.weights
+        )
+        params = []
+        for field in SEARCH_FIELDS:
+            params += [self.config, getattr(course, field)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table} (course_id, document) VALUES (%s, {document}) "
+                f"ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document",
+                [course.pk] + params
+            )
+
+    def remove(self, course_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE course_id = %s", [course_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+
+    def search(self, query, limit):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT course_id FROM {self.table}, to_tsquery(%s::regconfig, %s) query "
+                f"WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC LIMIT %s",
+                [self.config, tsquery, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_backend():
+    path = settings.COURSE_SEARCH_BACKEND
+    if path:
+        return import_string(path)()
+    return BACKENDS.get(connection.vendor, IContainsSearchBackend)()
+
+
+def search_courses(queryset, query):
+    return get_backend().filter(queryset, query)
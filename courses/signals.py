@@ -0,0 +1,66 @@
+# courses/signals.py
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .cache import invalidate_catalog, invalidate_course
+from . import promotions, rollups
+from .models import Course, CourseSession, Feedback, PromoCode
+from .search import get_backend
+
+# Sent by Enrollment.release_seat(), bulk_decide() and bulk_release() once
+# their conditional UPDATE has won, since post_save does not fire for it.
+# Arguments: enrollment_ids.
+enrollments_changed = Signal()
+# Sent the same way by Feedback.approve() and bulk_approve(). Arguments:
+# feedback_ids.
+feedback_approved = Signal()
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_cache(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+    transaction.on_commit(partial(invalidate_course, instance.pk))
+
+
+@receiver(post_save, sender=CourseSession)
+@receiver(post_delete, sender=CourseSession)
+def invalidate_session_cache(sender, instance, **kwargs):
+    # Sessions have no timestamp of their own; bump the course's so
+    # Last-Modified moves with the schedule.
+    Course.objects.filter(pk=instance.course_id).update(updated_at=timezone.now())
+    transaction.on_commit(invalidate_catalog)
+    transaction.on_commit(partial(invalidate_course, instance.course_id))
+
+
+@receiver(post_save, sender=PromoCode)
+@receiver(post_delete, sender=PromoCode)
+@receiver(m2m_changed, sender=PromoCode.courses.through)
+def invalidate_promo_rules(sender, **kwargs):
+    transaction.on_commit(promotions.invalidate)
+
+
+@receiver(post_delete, sender=Feedback)
+def remove_feedback_from_rollups(sender, instance, **kwargs):
+    if instance.is_approved:
+        rollups.apply(instance, sign=-1)
+
+
+def create_search_index(sender, **kwargs):
+    get_backend().setup()
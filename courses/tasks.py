@@ -99,3 +99,59 @@ def send_revision_request_email(feedback_id):
         )
     except Exception as e:
         print(f"Error sending revision request email: {e}")
+
+@shared_task
+def expire_pending_enrollments():
+    """Release seats held by pending enrollments that were never paid for"""
+    from datetime import timedelta
+    from django.utils import timezone
+    from .models import Enrollment
+    
+    cutoff = timezone.now() - timedelta(minutes=settings.ENROLLMENT_HOLD_MINUTES)
+    stale = Enrollment.objects.filter(
+        status='pending',
+        created_at__lt=cutoff
+    ).exclude(
+        payment__status='completed'
+    ).exclude(
+        # A submitted Rahgiri code is waiting on statement reconciliation
+        payment__status='pending', payment__rahgiri_code__gt=''
+    ).select_related('session')
+    
+    expired = 0
+    for enrollment in stale.iterator():
+        if enrollment.release_seat('expired'):
+            expired += 1
+    return expired
+
+@shared_task
+def send_enrollment_decision_emails(enrollment_ids, action):
+    """Notify a whole batch of approved/rejected students over one SMTP connection"""
+    from django.core.mail import EmailMultiAlternatives, get_connection
+    from .models import Enrollment
+    
+    template, subject = {
+        'approve': ('emails/enrollment_approved.html', 'Course Enrollment Approved - {}'),
+        'reject': ('emails/enrollment_rejected.html', 'Course Enrollment Update - {}'),
+    }[action]
+    
+    try:
+        enrollments = Enrollment.objects.filter(
+            id__in=enrollment_ids
+        ).select_related('student', 'course', 'session')
+        
+        messages = []
+        for enrollment in enrollments:
+            html_message = render_to_string(template, {'enrollment': enrollment})
+            message = EmailMultiAlternatives(
+                subject.format(enrollment.course.name),
+                strip_tags(html_message),
+                settings.DEFAULT_FROM_EMAIL,
+                [enrollment.student.email],
+            )
+            message.attach_alternative(html_message, 'text/html')
+            messages.append(message)
+        
+        return get_connection().send_messages(messages)
+    except Exception as e:
+        print(f"Error sending enrollment decision emails: {e}")
@@ -1,3 +1,511 @@
-from django.test import TestCase
+import json
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from payments.models import Payment, Refund
+from .identifiers import ALPHABET, IdentifierAllocator, feistel, is_valid
+from . import admission, promotions, rollups
+from .forms import CourseRegistrationForm
+from .models import Course, CourseSession, Enrollment, Feedback, IdentifierSequence, PromoCode, RatingRollup
+from .search import search_courses
+
+
+class EnrollmentFixtureMixin:
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        self.course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=self.instructor, price=100, duration_hours=8, max_capacity=2
+        )
+        self.session = CourseSession.objects.create(
+            course=self.course,
+            start_datetime=timezone.now() + timedelta(days=7),
+            end_datetime=timezone.now() + timedelta(days=8),
+        )
+
+    def enroll(self, n):
+        student = User.objects.create_user(
+            email=f'student{n}@example.com', username=f'student{n}', password='x'
+        )
+        return Enrollment.objects.create(
+            student=student, course=self.course, session=self.session, final_price=100
+        )
+
+
+class SeatInventoryTest(EnrollmentFixtureMixin, TestCase):
+    def test_capacity_defaults_to_course(self):
+        self.assertEqual(self.session.capacity, 2)
+
+    def test_reserve_until_full(self):
+        self.enroll(1)
+        self.enroll(2)
+        with self.assertRaises(ValidationError):
+            self.enroll(3)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.seats_taken, 2)
+        self.assertTrue(self.session.is_full)
+        self.assertEqual(Enrollment.objects.count(), 2)
+
+    def test_release_seat_only_once(self):
+        enrollment = self.enroll(1)
+        self.assertTrue(enrollment.release_seat('cancelled'))
+        self.assertFalse(enrollment.release_seat('cancelled'))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.seats_taken, 0)
+        self.assertEqual(Enrollment.objects.get(pk=enrollment.pk).status, 'cancelled')
+
+    def test_rebuild_seat_inventory(self):
+        self.enroll(1)
+        CourseSession.objects.filter(pk=self.session.pk).update(seats_taken=5)
+        call_command('rebuild_seat_inventory', stdout=StringIO())
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.seats_taken, 1)
+
+
+class CourseSearchTest(TestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        defaults = dict(instructor=instructor, price=100, duration_hours=8)
+        self.exact = Course.objects.create(
+            name='Negotiation Mastery', short_description='Close better deals',
+            detailed_description='Two days of practice', **defaults
+        )
+        self.mention = Course.objects.create(
+            name='Leadership Essentials', short_description='Lead teams',
+            detailed_description='Includes a short module on negotiation', **defaults
+        )
+        Course.objects.create(
+            name='Public Speaking', short_description='Speak with confidence',
+            detailed_description='Stage presence', **defaults
+        )
+
+    def test_results_are_ranked(self):
+        results = list(search_courses(Course.objects.all(), 'negotiat'))
+        self.assertEqual(results, [self.exact, self.mention])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.mention.detailed_description = 'No longer relevant'
+        self.mention.save()
+        self.exact.delete()
+        self.assertFalse(search_courses(Course.objects.all(), 'negotiation').exists())
+
+    def test_operators_in_query_are_ignored(self):
+        results = search_courses(Course.objects.all(), 'speaking" OR NEAR(')
+        self.assertEqual(list(results), [])
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        self.course = Course.objects.create(
+            name='Negotiation Mastery', short_description='Close better deals',
+            detailed_description='Two days of practice', instructor=instructor,
+            price=100, duration_hours=8
+        )
+
+    def test_anonymous_catalog_is_served_from_cache(self):
+        first = self.client.get(reverse('course_list'))
+        self.assertContains(first, 'Negotiation Mastery')
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('course_list'))
+        self.assertEqual(first.content, second.content)
+
+        not_modified = self.client.get(reverse('course_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_course_change_invalidates_cached_pages(self):
+        url = reverse('course_detail', args=[self.course.id])
+        first = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.name = 'Advanced Negotiation'
+            self.course.save()
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, 'Advanced Negotiation')
+
+
+class BulkEnrollmentActionTest(EnrollmentFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session.capacity = 5
+        self.session.save()
+        self.enrollments = [self.enroll(n) for n in range(3)]
+        self.client.force_login(self.instructor)
+
+    def post(self, action, enrollments, **extra):
+        with mock.patch('courses.tasks.send_enrollment_decision_emails.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('instructor_bulk_enrollment_action'), {
+                    'action': action,
+                    'enrollment_ids': [str(e.id) for e in enrollments],
+                    **extra,
+                })
+        return response, delay
+
+    def test_bulk_approve_enqueues_one_task(self):
+        response, delay = self.post('approve', self.enrollments[:2])
+        self.assertEqual(response.json()['updated'], 2)
+        delay.assert_called_once()
+        self.assertEqual(
+            Enrollment.objects.filter(status='enrolled', approved_by=self.instructor).count(), 2
+        )
+
+    def test_bulk_reject_releases_seats_and_skips_decided(self):
+        self.post('approve', self.enrollments[:1])
+        response, _ = self.post('reject', self.enrollments, reason='Full')
+        self.assertEqual(response.json(), {'status': 'success', 'updated': 2, 'skipped': 1})
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.seats_taken, 1)
+
+    def test_other_instructors_enrollments_are_untouched(self):
+        other = User.objects.create_user(
+            email='other@example.com', username='other', password='x', user_type='instructor'
+        )
+        self.client.force_login(other)
+        response, delay = self.post('approve', self.enrollments)
+        self.assertEqual(response.json()['updated'], 0)
+        delay.assert_not_called()
+
+
+class InstructorApproveViewTest(EnrollmentFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enrollment = self.enroll(1)
+        self.client.force_login(self.instructor)
+
+    def approve(self):
+        with mock.patch('courses.tasks.send_approval_email.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('instructor_approve_student', args=[self.enrollment.id]), {'action': 'approve'}
+                )
+        return response, delay
+
+    def test_approve(self):
+        response, delay = self.approve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Enrollment.objects.get(pk=self.enrollment.pk).status, 'enrolled')
+        delay.assert_called_once_with(self.enrollment.id)
+
+    def test_enrollment_expired_meanwhile_stays_expired(self):
+        # The view read the enrollment as pending just before the expiry task ran
+        stale = Enrollment.objects.get(pk=self.enrollment.pk)
+        self.enrollment.release_seat('expired')
+        with mock.patch('courses.views.get_object_or_404', return_value=stale):
+            response, delay = self.approve()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Enrollment.objects.get(pk=self.enrollment.pk).status, 'expired')
+        self.assertEqual(CourseSession.objects.get(pk=self.session.pk).seats_taken, 0)
+        delay.assert_not_called()
+
+
+class CancelEnrollmentViewTest(EnrollmentFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enrollment = self.enroll(1)
+        Payment.objects.create(enrollment=self.enrollment, amount=100, payment_method='paypal')
+        self.client.force_login(self.enrollment.student)
+
+    def post(self):
+        with mock.patch('courses.tasks.send_cancellation_email.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse('cancel_enrollment', args=[self.enrollment.id]),
+                    {'amount': '100', 'reason': 'Schedule clash'}
+                )
+        return delay
+
+    def test_cancel_requests_refund(self):
+        delay = self.post()
+        self.assertEqual(Enrollment.objects.get(pk=self.enrollment.pk).status, 'cancelled')
+        self.assertTrue(Refund.objects.filter(payment__enrollment=self.enrollment).exists())
+        delay.assert_called_once()
+
+    def test_lost_race_leaves_no_refund(self):
+        # The expiry task moves the enrollment on while the form is submitted
+        with mock.patch.object(Enrollment, 'release_seat', return_value=False):
+            delay = self.post()
+        self.assertFalse(Refund.objects.filter(payment__enrollment=self.enrollment).exists())
+        delay.assert_not_called()
+
+
+class IdentifierAllocatorTest(TransactionTestCase):
+    def test_block_allocation_is_unique_and_checksummed(self):
+        allocator = IdentifierAllocator('test', block_size=50)
+        codes = [allocator.allocate() for _ in range(120)]
+        self.assertEqual(len(set(codes)), 120)
+        self.assertTrue(all(is_valid(code) for code in codes))
+        # Three blocks of 50 were reserved
+        self.assertEqual(IdentifierSequence.objects.get(name='test').next_value, 151)
+
+    def test_allocation_inside_transaction_reserves_single_values(self):
+        allocator = IdentifierAllocator('test', block_size=50)
+        with transaction.atomic():
+            allocator.allocate()
+            allocator.allocate()
+        self.assertEqual(IdentifierSequence.objects.get(name='test').next_value, 3)
+
+    def test_block_reserved_inside_transaction_survives_rollback(self):
+        allocator = IdentifierAllocator('test', block_size=50)
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                first = allocator.allocate()
+                raise RuntimeError
+            second = allocator.allocate()
+        self.assertNotEqual(first, second)
+        # Committed on the allocator's own connection, not rolled back with the caller
+        self.assertEqual(IdentifierSequence.objects.get(name='test').next_value, 51)
+        allocator._connection.close()
+
+    def test_single_character_typos_are_detected(self):
+        code = IdentifierAllocator('test').allocate()
+        for position in range(len(code)):
+            for char in ALPHABET:
+                if char != code[position]:
+                    typo = code[:position] + char + code[position + 1:]
+                    self.assertFalse(is_valid(typo), typo)
+
+    def test_feistel_is_a_permutation(self):
+        key = bytes(16)
+        self.assertEqual(len({feistel(value, key, bits=12) for value in range(4096)}), 4096)
+
+
+class PromoCodeTest(EnrollmentFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.session.capacity = 10
+        self.session.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.promo = PromoCode.objects.create(
+                code='spring25', discount_type='percent', discount_value=25, max_redemptions=1
+            )
+
+    def register(self, n, code):
+        form = CourseRegistrationForm(
+            {'session': self.session.pk, 'promo_code': code}, course=self.course
+        )
+        if not form.is_valid():
+            return form
+        enrollment = form.save(commit=False)
+        enrollment.student = User.objects.create_user(
+            email=f'promo{n}@example.com', username=f'promo{n}', password='x'
+        )
+        enrollment.course = self.course
+        enrollment.save()
+        return enrollment
+
+    def test_discount_is_applied(self):
+        enrollment = self.register(1, ' Spring25 ')
+        self.assertEqual(enrollment.promo_code, 'SPRING25')
+        self.assertEqual(enrollment.final_price, 75)
+
+    def test_lookup_uses_compiled_table(self):
+        promotions.lookup('SPRING25', self.course)
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(promotions.lookup('SPRING25', self.course))
+
+    def test_changes_invalidate_compiled_table(self):
+        promotions.lookup('SPRING25', self.course)
+        other = Course.objects.create(
+            name='Other', short_description='', detailed_description='',
+            instructor=self.instructor, price=50, duration_hours=1
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.promo.courses.add(other)
+        self.assertIsNone(promotions.lookup('SPRING25', self.course))
+        self.assertIsNotNone(promotions.lookup('SPRING25', other))
+
+    def test_usage_cap_and_release(self):
+        first = self.register(1, 'SPRING25')
+        with self.assertRaises(ValidationError):
+            self.register(2, 'SPRING25')
+        first.release_seat('cancelled')
+        self.assertEqual(self.register(3, 'SPRING25').final_price, 75)
+
+    def test_unknown_code_is_a_form_error(self):
+        form = self.register(1, 'NOPE')
+        self.assertIn('promo_code', form.errors)
+
+
+class ScheduleFeedTest(EnrollmentFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.course.name = 'Negotiation; Advanced, Part 1'
+        self.course.save()
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_ical_feed_is_streamed_and_escaped(self):
+        response = self.client.get(reverse('course_schedule_feed', args=[self.course.id, 'ics']))
+        self.assertTrue(response.streaming)
+        body = self.content(response)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn('SUMMARY:Negotiation\\; Advanced\\, Part 1\r\n', body)
+        self.assertIn(f'UID:session-{self.session.id}@ultima-training', body)
+
+    def test_global_json_feed_merges_events(self):
+        from branding.models import Event
+        Event.objects.create(
+            title='Webinar', description='', event_type='webinar',
+            start_datetime=self.session.start_datetime - timedelta(days=1),
+            end_datetime=self.session.start_datetime,
+            registration_deadline=self.session.start_datetime,
+        )
+        response = self.client.get(reverse('schedule_feed', args=['json']))
+        entries = json.loads(self.content(response))
+        self.assertEqual([entry['type'] for entry in entries], ['event', 'session'])
+
+    def test_unchanged_feed_returns_304(self):
+        url = reverse('instructor_schedule_feed', args=[self.instructor.id, 'ics'])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.location = 'Tehran'
+            self.session.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AdmissionStoreTest(TestCase):
+    def admit(self, store, member, now, capacity=1):
+        return store.admit('room', member, capacity=capacity, ttl=60, stale=15, now=now)
+
+    def test_queue_is_fifo_and_tokens_expire(self):
+        store = admission.MemoryAdmissionStore()
+        self.assertTrue(self.admit(store, 'a', 0).admitted)
+        self.assertEqual(self.admit(store, 'b', 1), admission.Admission(False, 1))
+        self.assertEqual(self.admit(store, 'c', 2), admission.Admission(False, 2))
+
+        store.release('room', 'a')
+        self.assertFalse(self.admit(store, 'c', 3).admitted)
+        self.assertTrue(self.admit(store, 'b', 4).admitted)
+
+        # c keeps polling; b's token expires after the ttl and c moves up
+        for now in range(5, 65, 5):
+            self.assertFalse(self.admit(store, 'c', now).admitted)
+        self.assertTrue(self.admit(store, 'c', 65).admitted)
+        metrics = store.metrics('room')
+        self.assertEqual((metrics['queue_depth'], metrics['active'], metrics['admitted']), (0, 1, 3))
+        self.assertEqual(metrics['wait_seconds'], 3 + 63)
+
+    def test_abandoned_queue_entries_are_dropped(self):
+        store = admission.MemoryAdmissionStore()
+        self.admit(store, 'a', 0)
+        self.admit(store, 'b', 1)
+        self.assertEqual(self.admit(store, 'c', 2).position, 2)
+        # b stopped polling
+        self.assertEqual(self.admit(store, 'c', 20).position, 1)
+
+
+@override_settings(ADMISSION_MAX_ACTIVE=1)
+class WaitingRoomViewTest(EnrollmentFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        admission._store = None
+
+    def test_second_student_waits_until_first_registers(self):
+        first = User.objects.create_user(email='a@example.com', username='a', password='x')
+        second = User.objects.create_user(email='b@example.com', username='b', password='x')
+        url = reverse('course_register', args=[self.course.id])
+
+        self.client.force_login(first)
+        self.assertTemplateUsed(self.client.get(url), 'courses/course_register.html')
+
+        self.client.force_login(second)
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, 'courses/waiting_room.html')
+        self.assertEqual(response.context['position'], 1)
+
+        self.client.force_login(first)
+        self.client.post(url, {'session': self.session.pk})
+        self.assertEqual(Enrollment.objects.filter(student=first).count(), 1)
+
+        self.client.force_login(second)
+        self.assertTemplateUsed(self.client.get(url), 'courses/course_register.html')
+
+
+class RatingRollupTest(EnrollmentFixtureMixin, TestCase):
+    def feedback(self, n, rating, recommend=True):
+        return Feedback.objects.create(
+            enrollment=self.enroll(n), overall_rating=rating, overall_experience='Good',
+            instructor_rating=rating, content_rating=rating, venue_rating=rating,
+            key_takeaways='Plenty', would_recommend=recommend
+        )
+
+    def test_approve_updates_rollups(self):
+        self.feedback(1, 5).approve(self.instructor)
+        self.feedback(2, 2, recommend=False).approve(self.instructor)
+
+        for scope, object_id in [
+            ('course', self.course.pk), ('session', self.session.pk), ('instructor', self.instructor.pk)
+        ]:
+            rollup = rollups.get_rollup(scope, object_id)
+            self.assertEqual(rollup.count, 2)
+            self.assertEqual(rollup.average_overall, 3.5)
+            self.assertEqual(rollup.recommend_percent, 50)
+            self.assertEqual(rollup.histogram, [0, 1, 0, 0, 1])
+
+    def test_approve_twice_counts_once(self):
+        feedback = self.feedback(1, 4)
+        self.assertTrue(feedback.approve(self.instructor))
+        self.assertFalse(feedback.approve(self.instructor))
+        self.assertEqual(rollups.get_rollup('course', self.course.pk).count, 1)
+
+    def test_delete_removes_from_rollups(self):
+        feedback = self.feedback(1, 4)
+        feedback.approve(self.instructor)
+        feedback.delete()
+        self.assertEqual(rollups.get_rollup('course', self.course.pk).count, 0)
+
+    def test_rebuild_matches_incremental(self):
+        self.feedback(1, 5).approve(self.instructor)
+        self.feedback(2, 3).approve(self.instructor)
+        incremental = {
+            (rollup.scope, rollup.object_id): rollup.histogram for rollup in RatingRollup.objects.all()
+        }
+
+        call_command('rebuild_rating_rollups', stdout=StringIO())
+        rebuilt = {
+            (rollup.scope, rollup.object_id): rollup.histogram for rollup in RatingRollup.objects.all()
+        }
+        self.assertEqual(rebuilt, incremental)
+
+
+class BulkFeedbackApproveTest(EnrollmentFixtureMixin, TestCase):
+    feedback = RatingRollupTest.feedback
+
+    @mock.patch('certificates.tasks.generate_session_certificates.delay')
+    def test_one_certificate_batch_per_session(self, generate):
+        feedbacks = [self.feedback(n, 5) for n in range(2)]
+        self.client.force_login(self.instructor)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('instructor_bulk_feedback_approve'),
+                {'feedback_ids': [feedback.pk for feedback in feedbacks]}
+            )
+
+        self.assertEqual(response.json()['approved'], 2)
+        self.assertEqual(Feedback.objects.filter(is_approved=True).count(), 2)
+        self.assertEqual(rollups.get_rollup('session', self.session.pk).count, 2)
+        generate.assert_called_once()
+        self.assertEqual(len(generate.call_args.args[1]), 2)
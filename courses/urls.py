@@ -6,10 +6,18 @@ urlpatterns = [
     path('', views.course_list, name='course_list'),
     path('<uuid:course_id>/', views.course_detail, name='course_detail'),
     path('<uuid:course_id>/register/', views.course_register, name='course_register'),
+    path('<uuid:course_id>/admission/metrics/', views.admission_metrics, name='admission_metrics'),
+    
+    # Schedule feeds (.ics / .json)
+    path('schedule.<str:fmt>', views.schedule_feed, name='schedule_feed'),
+    path('<uuid:course_id>/schedule.<str:fmt>', views.schedule_feed, name='course_schedule_feed'),
+    path('instructors/<int:instructor_id>/schedule.<str:fmt>', views.schedule_feed, name='instructor_schedule_feed'),
     path('enrollment/<uuid:enrollment_id>/cancel/', views.cancel_enrollment, name='cancel_enrollment'),
     path('enrollment/<uuid:enrollment_id>/feedback/', views.submit_feedback, name='submit_feedback'),
     
     # Instructor URLs
     path('instructor/approve/<uuid:enrollment_id>/', views.instructor_approve_student, name='instructor_approve_student'),
+    path('instructor/enrollments/bulk/', views.instructor_bulk_enrollment_action, name='instructor_bulk_enrollment_action'),
+    path('instructor/feedback/bulk/', views.instructor_bulk_feedback_approve, name='instructor_bulk_feedback_approve'),
     path('instructor/feedback/<int:feedback_id>/review/', views.instructor_review_feedback, name='instructor_review_feedback'),
 ]
@@ -2,50 +2,112 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.views.decorators.csrf import csrf_exempt
+from django.urls import reverse
 from django.utils import timezone
-from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.conf import settings
 import json
+import uuid
 
 from .models import Course, CourseSession, Enrollment, Feedback
 from .forms import CourseRegistrationForm, FeedbackForm
+from .search import search_courses
+from .cache import cached_page, catalog_key, catalog_last_modified, course_key, course_last_modified, invalidate_student
+from . import admission, feeds, rollups
 from payments.models import Payment
+from ultima_training.pagination import KeysetPaginator
+
+MAX_BULK_ENROLLMENTS = 500
+MAX_BULK_FEEDBACK = 500
 
 def course_list(request):
-    courses = Course.objects.filter(is_active=True).prefetch_related('sessions')
-    
-    # Filters
-    course_type = request.GET.get('type')
-    if course_type:
-        courses = courses.filter(course_type=course_type)
+    course_type = request.GET.get('type', '')
+    search = request.GET.get('search', '')
+    cursor = request.GET.get('cursor', '')
     
-    search = request.GET.get('search')
-    if search:
-        courses = courses.filter(
-            Q(name__icontains=search) | Q(short_description__icontains=search)
-        )
+    def render_page():
+        courses = Course.objects.filter(is_active=True).prefetch_related('sessions')
+        
+        # Filters
+        if course_type:
+            courses = courses.filter(course_type=course_type)
+        
+        if search:
+            # Ranked results are already capped at COURSE_SEARCH_LIMIT
+            courses = search_courses(courses, search)
+        else:
+            courses = KeysetPaginator(courses, 12, 'name').get_page(cursor)
+        
+        context = {'courses': courses}
+        return render(request, 'courses/course_list.html', context)
     
-    context = {'courses': courses}
-    return render(request, 'courses/course_list.html', context)
+    key = catalog_key(type=course_type, search=search, cursor=cursor)
+    return cached_page(request, key, catalog_last_modified(), render_page)
 
 def course_detail(request, course_id):
-    course = get_object_or_404(Course, id=course_id, is_active=True)
-    upcoming_sessions = course.sessions.filter(
-        start_datetime__gte=timezone.now(),
-        is_active=True
-    ).order_by('start_datetime')
+    def render_page():
+        course = get_object_or_404(Course, id=course_id, is_active=True)
+        upcoming_sessions = course.sessions.filter(
+            start_datetime__gte=timezone.now(),
+            is_active=True
+        ).order_by('start_datetime')
+        
+        context = {
+            'course': course,
+            'upcoming_sessions': upcoming_sessions,
+            'rating': rollups.get_rollup('course', course.pk),
+        }
+        return render(request, 'courses/course_detail.html', context)
     
-    context = {
-        'course': course,
-        'upcoming_sessions': upcoming_sessions,
-    }
-    return render(request, 'courses/course_detail.html', context)
+    return cached_page(request, course_key(course_id), course_last_modified(course_id), render_page)
+
+def schedule_feed(request, fmt, course_id=None, instructor_id=None):
+    """iCalendar/JSON feed of upcoming sessions, and of events for the global feed"""
+    if fmt not in ('ics', 'json'):
+        raise Http404("Unknown feed format")
+    
+    include_events = not (course_id or instructor_id)
+    etag = quote_etag(feeds.feed_etag(fmt, course_id, instructor_id, include_events=include_events))
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+        return response
+    
+    entries = feeds.session_entries(course_id=course_id, instructor_id=instructor_id)
+    if include_events:
+        entries = feeds.merged_entries(entries, feeds.event_entries())
+    
+    base_url = request.build_absolute_uri('/').rstrip('/')
+    if fmt == 'ics':
+        content = feeds.render_ical(entries, 'Ultima Training Schedule', base_url)
+        response = StreamingHttpResponse(content, content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = 'inline; filename="schedule.ics"'
+    else:
+        content = feeds.render_json(entries, base_url)
+        response = StreamingHttpResponse(content, content_type='application/json')
+    
+    response['ETag'] = etag
+    return response
 
 @login_required
 def course_register(request, course_id):
     course = get_object_or_404(Course, id=course_id, is_active=True)
     
+    ticket = admission.admit(course, request.user)
+    if not ticket.admitted:
+        response = render(request, 'courses/waiting_room.html', {
+            'course': course,
+            'position': ticket.position,
+            'poll_seconds': settings.ADMISSION_POLL_SECONDS,
+        })
+        response['Retry-After'] = str(settings.ADMISSION_POLL_SECONDS)
+        return response
+    
     if request.method == 'POST':
         form = CourseRegistrationForm(request.POST, course=course)
         if form.is_valid():
@@ -53,10 +115,16 @@ def course_register(request, course_id):
             enrollment.student = request.user
             enrollment.course = course
             enrollment.tracking_number = enrollment.generate_tracking_number()
-            enrollment.save()
-            
-            # Redirect to payment
-            return redirect('payment_process', enrollment_id=enrollment.id)
+            try:
+                enrollment.save()
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                # The seat is now held by the enrollment itself
+                admission.release(course, request.user)
+                
+                # Redirect to payment
+                return redirect('payment_process', enrollment_id=enrollment.id)
     else:
         form = CourseRegistrationForm(course=course)
     
@@ -81,11 +149,17 @@ def submit_feedback(request, enrollment_id):
         feedback = None
     
     if request.method == 'POST':
+        # Approved feedback is already counted in the rating rollups
+        previous = Feedback.objects.get(pk=feedback.pk) if feedback and feedback.is_approved else None
         form = FeedbackForm(request.POST, instance=feedback)
         if form.is_valid():
             feedback = form.save(commit=False)
             feedback.enrollment = enrollment
-            feedback.save()
+            with transaction.atomic():
+                feedback.save()
+                if previous:
+                    rollups.apply(previous, sign=-1)
+                    rollups.apply(feedback)
             messages.success(request, 'Feedback submitted successfully!')
             return redirect('student_dashboard')
     else:
@@ -116,16 +190,19 @@ def cancel_enrollment(request, enrollment_id):
         from payments.forms import RefundRequestForm
         form = RefundRequestForm(request.POST, payment=enrollment.payment)
         if form.is_valid():
-            refund = form.save(commit=False)
-            refund.payment = enrollment.payment
-            refund.save()
-            
-            enrollment.status = 'cancelled'
-            enrollment.save()
-            
-            # Send cancellation email
             from .tasks import send_cancellation_email
-            send_cancellation_email.delay(enrollment.id, refund.id)
+            with transaction.atomic():
+                # Expiry or an instructor decision may have got there first
+                if not enrollment.release_seat('cancelled'):
+                    messages.error(request, 'This enrollment can no longer be cancelled.')
+                    return redirect('student_dashboard')
+                
+                refund = form.save(commit=False)
+                refund.payment = enrollment.payment
+                refund.save()
+                
+                # Send cancellation email
+                transaction.on_commit(lambda: send_cancellation_email.delay(enrollment.id, refund.id))
             
             messages.success(request, 'Cancellation request submitted successfully!')
             return redirect('student_dashboard')
@@ -139,6 +216,15 @@ def cancel_enrollment(request, enrollment_id):
     }
     return render(request, 'courses/cancel_enrollment.html', context)
 
+@login_required
+def admission_metrics(request, course_id):
+    """Queue depth and wait time of a course's registration waiting room"""
+    if request.user.user_type != 'admin':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    course = get_object_or_404(Course, id=course_id)
+    return JsonResponse(admission.metrics(course))
+
 # Instructor Views
 @login_required
 def instructor_approve_student(request, enrollment_id):
@@ -155,22 +241,30 @@ def instructor_approve_student(request, enrollment_id):
     if request.method == 'POST':
         action = request.POST.get('action')
         if action == 'approve':
-            enrollment.status = 'enrolled'
-            enrollment.approved_by = request.user
-            enrollment.approval_date = timezone.now()
-            enrollment.save()
-            
-            # Send approval email
             from .tasks import send_approval_email
-            send_approval_email.delay(enrollment.id)
+            now = timezone.now()
+            with transaction.atomic():
+                # Conditional, so an enrollment that expired or was cancelled
+                # meanwhile (its seat already given back) is never revived
+                approved = Enrollment.objects.filter(pk=enrollment.pk, status='pending').update(
+                    status='enrolled', approved_by=request.user, approval_date=now, updated_at=now
+                )
+                if not approved:
+                    return JsonResponse({'error': 'Enrollment is no longer pending'}, status=409)
+                
+                Enrollment.mark_metrics_stale([(enrollment.created_at, enrollment.course_id)])
+                from .signals import enrollments_changed
+                transaction.on_commit(lambda: invalidate_student(enrollment.student_id))
+                enrollments_changed.send(sender=Enrollment, enrollment_ids=[enrollment.pk])
+                
+                # Send approval email
+                transaction.on_commit(lambda: send_approval_email.delay(enrollment.id))
             
             return JsonResponse({'status': 'success', 'message': 'Student approved'})
         
         elif action == 'reject':
             reason = request.POST.get('reason', '')
-            enrollment.status = 'rejected'
-            enrollment.rejection_reason = reason
-            enrollment.save()
+            enrollment.release_seat('rejected', rejection_reason=reason)
             
             # Send rejection email
             from .tasks import send_rejection_email
@@ -180,6 +274,99 @@ def instructor_approve_student(request, enrollment_id):
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+@login_required
+def instructor_bulk_enrollment_action(request):
+    """Approve or reject a batch of pending enrollments in one request"""
+    if request.user.user_type != 'instructor':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    action = request.POST.get('action')
+    enrollment_ids = request.POST.getlist('enrollment_ids')
+    if action not in ('approve', 'reject') or not enrollment_ids:
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    if len(enrollment_ids) > MAX_BULK_ENROLLMENTS:
+        return JsonResponse({'error': f'At most {MAX_BULK_ENROLLMENTS} enrollments per request'}, status=400)
+    
+    try:
+        enrollment_ids = [uuid.UUID(enrollment_id) for enrollment_id in enrollment_ids]
+    except ValueError:
+        return JsonResponse({'error': 'Invalid enrollment id'}, status=400)
+    
+    updated = Enrollment.bulk_decide(
+        enrollment_ids,
+        request.user,
+        action,
+        reason=request.POST.get('reason', '')
+    )
+    
+    if updated:
+        from .tasks import send_enrollment_decision_emails
+        ids = [str(enrollment_id) for enrollment_id in updated]
+        transaction.on_commit(lambda: send_enrollment_decision_emails.delay(ids, action))
+    
+    return JsonResponse({
+        'status': 'success',
+        'updated': len(updated),
+        'skipped': len(enrollment_ids) - len(updated),
+    })
+
+@login_required
+def instructor_bulk_feedback_approve(request):
+    """Approve a batch of feedback and queue one certificate job per session"""
+    if request.user.user_type != 'instructor':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    feedback_ids = request.POST.getlist('feedback_ids')
+    if not feedback_ids:
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    if len(feedback_ids) > MAX_BULK_FEEDBACK:
+        return JsonResponse({'error': f'At most {MAX_BULK_FEEDBACK} feedbacks per request'}, status=400)
+    
+    try:
+        feedback_ids = [int(feedback_id) for feedback_id in feedback_ids]
+    except ValueError:
+        return JsonResponse({'error': 'Invalid feedback id'}, status=400)
+    
+    from certificates.models import CertificateBatch
+    from certificates.tasks import generate_session_certificates
+    
+    batches = []
+    with transaction.atomic():
+        approved = Feedback.bulk_approve(feedback_ids, request.user)
+        
+        sessions = {}
+        for feedback in approved:
+            sessions.setdefault(feedback.enrollment.session_id, []).append(str(feedback.enrollment_id))
+        
+        for session_id, enrollment_ids in sessions.items():
+            batch = CertificateBatch.objects.create(
+                session_id=session_id,
+                requested_by=request.user,
+                total=len(enrollment_ids)
+            )
+            batches.append(batch)
+            transaction.on_commit(
+                lambda batch_id=str(batch.id), ids=enrollment_ids: generate_session_certificates.delay(batch_id, ids)
+            )
+    
+    return JsonResponse({
+        'status': 'success',
+        'approved': len(approved),
+        'skipped': len(feedback_ids) - len(approved),
+        'batches': [
+            {'id': str(batch.id), 'status_url': reverse('certificate_batch_status', args=[batch.id])}
+            for batch in batches
+        ],
+    })
+
 @login_required
 def instructor_review_feedback(request, feedback_id):
     if request.user.user_type != 'instructor':
@@ -194,14 +381,10 @@ def instructor_review_feedback(request, feedback_id):
     if request.method == 'POST':
         action = request.POST.get('action')
         if action == 'approve':
-            feedback.is_approved = True
-            feedback.reviewed_by = request.user
-            feedback.review_date = timezone.now()
-            feedback.save()
-            
-            # Generate certificate
-            from certificates.tasks import generate_certificate
-            generate_certificate.delay(feedback.enrollment.id)
+            if feedback.approve(request.user):
+                # Generate certificate
+                from certificates.tasks import generate_certificate
+                generate_certificate.delay(feedback.enrollment.id)
             
             return JsonResponse({'status': 'success', 'message': 'Feedback approved'})
         
@@ -1,3 +1,14 @@
 from django.contrib import admin
+from .models import DailyCourseMetric, DailyRevenue
 
-# Register your models here.
+@admin.register(DailyCourseMetric)
+class DailyCourseMetricAdmin(admin.ModelAdmin):
+    list_display = ('date', 'course', 'enrollments', 'conversions', 'cancellations', 'certificates')
+    list_filter = ('date',)
+    date_hierarchy = 'date'
+
+@admin.register(DailyRevenue)
+class DailyRevenueAdmin(admin.ModelAdmin):
+    list_display = ('date', 'course', 'currency', 'payments', 'revenue', 'refunds', 'refunded')
+    list_filter = ('currency',)
+    date_hierarchy = 'date'
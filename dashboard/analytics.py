@@ -0,0 +1,181 @@
+# dashboard/analytics.py
+"""
+Daily analytics rollups for the admin dashboard.
+
+DailyCourseMetric and DailyRevenue hold one row per day and course (and
+currency, for money). A day is never patched in place: rebuild() recomputes
+whole days from the source tables, which keeps the rollups correct no
+matter which code path changed an enrollment or payment. Signals mark the
+(day, course) pairs touched by a save as stale, and the refresh task
+rebuilds those together with the last few days.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCourseMetric, DailyRevenue, StaleMetricDay
+
+CONVERTED_STATUSES = ('enrolled', 'completed')
+CANCELLED_STATUSES = ('cancelled', 'rejected', 'expired')
+
+
+def day_bounds(start, end):
+    """Aware datetimes covering the local days ``start`` to ``end`` inclusive."""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+    )
+
+
+def mark_stale(moment, course_id):
+    if moment is None or course_id is None:
+        return
+    mark_stale_days([(timezone.localdate(moment), course_id)])
+
+
+def mark_stale_days(pairs):
+    """Mark many (date, course_id) pairs stale with one INSERT."""
+    StaleMetricDay.objects.bulk_create(
+        [StaleMetricDay(date=day, course_id=course_id) for day, course_id in set(pairs)],
+        ignore_conflicts=True
+    )
+
+
+def compute(start, end, course_ids=None):
+    """Aggregate the source tables for local days ``start``..``end``."""
+    from courses.models import Enrollment
+    from certificates.models import Certificate
+    from payments.models import Payment, Refund
+
+    since, until = day_bounds(start, end)
+
+    def grouped(queryset, date_field, course_field, extra=(), **values):
+        queryset = queryset.filter(**{f'{date_field}__gte': since, f'{date_field}__lt': until})
+        if course_ids is not None:
+            queryset = queryset.filter(**{f'{course_field}__in': course_ids})
+        return queryset.annotate(day=TruncDate(date_field)).values(
+            'day', course_field, *extra
+        ).annotate(**values).order_by()
+
+    metrics = defaultdict(dict)
+    for row in grouped(
+        Enrollment.objects.all(), 'created_at', 'course_id',
+        enrollments=Count('id'),
+        conversions=Count('id', filter=Q(status__in=CONVERTED_STATUSES)),
+        cancellations=Count('id', filter=Q(status__in=CANCELLED_STATUSES)),
+    ):
+        key = (row.pop('day'), row.pop('course_id'))
+        metrics[key].update(row)
+
+    for row in grouped(
+        Certificate.objects.all(), 'issue_date', 'enrollment__course_id',
+        certificates=Count('id'),
+    ):
+        metrics[(row['day'], row['enrollment__course_id'])]['certificates'] = row['certificates']
+
+    revenue = defaultdict(dict)
+    for row in grouped(
+        Payment.objects.filter(status__in=('completed', 'refunded')),
+        'payment_date', 'enrollment__course_id', extra=('currency',),
+        payments=Count('id'), revenue=Sum('amount'),
+    ):
+        key = (row['day'], row['enrollment__course_id'], row['currency'])
+        revenue[key].update(payments=row['payments'], revenue=row['revenue'])
+
+    for row in grouped(
+        Refund.objects.filter(status='completed'),
+        'processed_date', 'payment__enrollment__course_id', extra=('payment__currency',),
+        refunds=Count('id'), refunded=Sum('amount'),
+    ):
+        key = (row['day'], row['payment__enrollment__course_id'], row['payment__currency'])
+        revenue[key].update(refunds=row['refunds'], refunded=row['refunded'])
+
+    return metrics, revenue
+
+
+def rebuild(start, end, course_ids=None):
+    """Replace the rollups of local days ``start``..``end``. Returns rows written."""
+    metrics, revenue = compute(start, end, course_ids)
+
+    scope = {'date__gte': start, 'date__lte': end}
+    if course_ids is not None:
+        scope['course_id__in'] = course_ids
+
+    with transaction.atomic():
+        DailyCourseMetric.objects.filter(**scope).delete()
+        DailyRevenue.objects.filter(**scope).delete()
+        DailyCourseMetric.objects.bulk_create([
+            DailyCourseMetric(date=day, course_id=course_id, **values)
+            for (day, course_id), values in metrics.items()
+        ])
+        DailyRevenue.objects.bulk_create([
+            DailyRevenue(date=day, course_id=course_id, currency=currency, **values)
+            for (day, course_id, currency), values in revenue.items()
+        ])
+    return len(metrics) + len(revenue)
+
+
+def refresh(batch_size=500):
+    """Rebuild stale (day, course) pairs and the trailing refresh window."""
+    today = timezone.localdate()
+    rebuild(today - timedelta(days=settings.ANALYTICS_REFRESH_DAYS - 1), today)
+
+    refreshed = 0
+    while True:
+        stale = list(StaleMetricDay.objects.order_by('date')[:batch_size])
+        if not stale:
+            return refreshed
+
+        by_day = defaultdict(set)
+        for entry in stale:
+            by_day[entry.date].add(entry.course_id)
+        # Clear the markers first: a save that lands while we rebuild
+        # marks its day again instead of being swallowed by this pass
+        with transaction.atomic():
+            StaleMetricDay.objects.filter(pk__in=[entry.pk for entry in stale]).delete()
+            for day, course_ids in by_day.items():
+                rebuild(day, day, course_ids)
+        refreshed += len(stale)
+
+
+def summary(start, end):
+    """Totals, per course and per day figures for the admin dashboard."""
+    metrics = DailyCourseMetric.objects.filter(date__gte=start, date__lte=end)
+    revenue = DailyRevenue.objects.filter(date__gte=start, date__lte=end)
+    counts = dict(
+        enrollments=Sum('enrollments'),
+        conversions=Sum('conversions'),
+        cancellations=Sum('cancellations'),
+        certificates=Sum('certificates'),
+    )
+    money = dict(payments=Sum('payments'), revenue=Sum('revenue'), refunds=Sum('refunds'), refunded=Sum('refunded'))
+
+    totals = {key: value or 0 for key, value in metrics.aggregate(**counts).items()}
+    totals['conversion_rate'] = conversion_rate(totals)
+
+    by_course = list(metrics.values('course_id', 'course__name').annotate(**counts).order_by('-enrollments'))
+    for row in by_course:
+        row['conversion_rate'] = conversion_rate(row)
+
+    return {
+        'totals': totals,
+        'by_course': by_course,
+        'by_day': list(metrics.values('date').annotate(**counts).order_by('date')),
+        'revenue_by_currency': list(revenue.values('currency').annotate(**money).order_by('currency')),
+        'revenue_by_course': list(
+            revenue.values('course__name', 'currency').annotate(**money).order_by('-revenue')
+        ),
+    }
+
+
+def conversion_rate(row):
+    if not row['enrollments']:
+        return Decimal('0')
+    return (Decimal(row['conversions'] or 0) * 100 / row['enrollments']).quantize(Decimal('0.1'))
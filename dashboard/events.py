@@ -0,0 +1,119 @@
+# dashboard/events.py
+"""
+Live dashboard events.
+
+State changes are published on a per-user channel and pushed to open
+dashboards by the live_events server-sent events view. Channels go
+through Redis pub/sub when LIVE_EVENTS_REDIS_URL is set, so every ASGI
+worker sees every event; otherwise an in-process broker is used, which
+only reaches connections served by the same process (development and
+tests).
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+
+def user_channel(user_id):
+    return f'live:user:{user_id}'
+
+
+class MemoryBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            # Publishers run in sync code, possibly on another thread
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+    async def listen(self, channel, timeout):
+        """Yield messages on ``channel``, or None after ``timeout`` seconds of quiet."""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker:
+    def __init__(self, url):
+        import redis
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.client.publish(channel, message)
+
+    async def listen(self, channel, timeout):
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                yield message['data'].decode() if message else None
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                url = settings.LIVE_EVENTS_REDIS_URL
+                _broker = RedisBroker(url) if url else MemoryBroker()
+    return _broker
+
+
+def publish(event_type, user_ids, **data):
+    """Send an event to each of ``user_ids`` once the transaction commits."""
+    message = json.dumps({'type': event_type, **data}, cls=DjangoJSONEncoder)
+    channels = {user_channel(user_id) for user_id in user_ids if user_id}
+
+    def send():
+        broker = get_broker()
+        for channel in channels:
+            try:
+                broker.publish(channel, message)
+            except Exception as e:
+                print(f"Error publishing live event: {e}")
+
+    transaction.on_commit(send)
+
+
+def format_event(message):
+    event_type = json.loads(message)['type']
+    return f'event: {event_type}\ndata: {message}\n\n'
+
+
+async def stream(user_id):
+    """The SSE body for one connection: events, with comment lines as keepalive."""
+    yield f'retry: {settings.LIVE_EVENTS_RETRY_MS}\n\n'
+    async for message in get_broker().listen(user_channel(user_id), settings.LIVE_EVENTS_KEEPALIVE_SECONDS):
+        yield format_event(message) if message else ': keepalive\n\n'
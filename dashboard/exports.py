@@ -0,0 +1,318 @@
+# dashboard/exports.py
+"""
+Streaming CSV and XLSX exports.
+
+Rows are read with values_list(...).iterator(), so the joins happen in
+the database and no model instances are built, and written out as they
+arrive. Neither format holds more than one chunk of rows in memory: CSV
+lines are yielded one by one, and XLSX is written as a zip stream with
+data descriptors so nothing has to be seeked back to.
+
+Text that a spreadsheet would read as a formula (starting with =, +, -, @,
+a tab or a carriage return) is written with a leading apostrophe, so an
+exported name or promo code can never run as one. Student contact details
+are only exported for staff.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, NamedTuple, Tuple
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .analytics import day_bounds
+
+CHUNK_SIZE = 2000
+
+
+class Dataset(NamedTuple):
+    get_queryset: Callable
+    date_field: str
+    course_field: str
+    statuses: Dict[str, dict]
+    columns: Tuple[Tuple[str, str], ...]
+    # Fields only exported for staff
+    private: Tuple[str, ...] = ()
+
+    def visible_columns(self, staff):
+        return [(header, field) for header, field in self.columns if staff or field not in self.private]
+
+    def rows(self, start=None, end=None, course_id=None, status=None, course_ids=None, staff=True):
+        queryset = self.get_queryset()
+        if course_ids is not None:
+            queryset = queryset.filter(**{f'{self.course_field}__in': course_ids})
+        if start:
+            since, _ = day_bounds(start, start)
+            queryset = queryset.filter(**{f'{self.date_field}__gte': since})
+        if end:
+            _, until = day_bounds(end, end)
+            queryset = queryset.filter(**{f'{self.date_field}__lt': until})
+        if course_id:
+            queryset = queryset.filter(**{self.course_field: course_id})
+        if status:
+            queryset = queryset.filter(**self.statuses[status])
+
+        fields = [field for _, field in self.visible_columns(staff)]
+        return queryset.order_by(self.date_field, 'pk').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+    def headers(self, staff=True):
+        return [header for header, _ in self.visible_columns(staff)]
+
+
+def enrollments():
+    from courses.models import Enrollment
+    return Enrollment.objects.all()
+
+
+def payments():
+    from payments.models import Payment
+    return Payment.objects.all()
+
+
+def refunds():
+    from payments.models import Refund
+    return Refund.objects.all()
+
+
+def certificates():
+    from certificates.models import Certificate
+    return Certificate.objects.all()
+
+
+ENROLLMENT_STATUSES = ('pending', 'enrolled', 'completed', 'cancelled', 'rejected', 'expired')
+PAYMENT_STATUSES = ('pending', 'completed', 'failed', 'refunded')
+REFUND_STATUSES = ('requested', 'processing', 'completed', 'rejected')
+
+DATASETS = {
+    'enrollments': Dataset(
+        enrollments, 'created_at', 'course_id',
+        {status: {'status': status} for status in ENROLLMENT_STATUSES},
+        (
+            ('Tracking number', 'tracking_number'),
+            ('Student email', 'student__email'),
+            ('First name', 'student__first_name'),
+            ('Last name', 'student__last_name'),
+            ('Mobile', 'student__mobile'),
+            ('Course', 'course__name'),
+            ('Session start', 'session__start_datetime'),
+            ('Status', 'status'),
+            ('Final price', 'final_price'),
+            ('Currency', 'course__currency'),
+            ('Promo code', 'promo_code'),
+            ('Created', 'created_at'),
+            ('Approved', 'approval_date'),
+            ('Completed', 'completion_date'),
+        ),
+        ('student__email', 'student__mobile'),
+    ),
+    'payments': Dataset(
+        payments, 'created_at', 'enrollment__course_id',
+        {status: {'status': status} for status in PAYMENT_STATUSES},
+        (
+            ('Payment ID', 'id'),
+            ('Tracking number', 'enrollment__tracking_number'),
+            ('Student email', 'enrollment__student__email'),
+            ('Course', 'enrollment__course__name'),
+            ('Amount', 'amount'),
+            ('Currency', 'currency'),
+            ('Method', 'payment_method'),
+            ('Transaction ID', 'transaction_id'),
+            ('Rahgiri code', 'rahgiri_code'),
+            ('Status', 'status'),
+            ('Paid', 'payment_date'),
+            ('Created', 'created_at'),
+        ),
+    ),
+    'refunds': Dataset(
+        refunds, 'created_at', 'payment__enrollment__course_id',
+        {status: {'status': status} for status in REFUND_STATUSES},
+        (
+            ('Refund ID', 'id'),
+            ('Payment ID', 'payment_id'),
+            ('Student email', 'payment__enrollment__student__email'),
+            ('Course', 'payment__enrollment__course__name'),
+            ('Amount', 'amount'),
+            ('Currency', 'payment__currency'),
+            ('Status', 'status'),
+            ('Reason', 'reason'),
+            ('Processed', 'processed_date'),
+            ('Created', 'created_at'),
+        ),
+    ),
+    'certificates': Dataset(
+        certificates, 'issue_date', 'enrollment__course_id',
+        {'valid': {'is_valid': True}, 'invalid': {'is_valid': False}},
+        (
+            ('Certificate number', 'certificate_number'),
+            ('Tracking number', 'enrollment__tracking_number'),
+            ('Student email', 'enrollment__student__email'),
+            ('First name', 'enrollment__student__first_name'),
+            ('Last name', 'enrollment__student__last_name'),
+            ('Course', 'enrollment__course__name'),
+            ('Issued', 'issue_date'),
+            ('Valid', 'is_valid'),
+        ),
+        ('enrollment__student__email',),
+    ),
+}
+
+
+def local(value):
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.localtime(value)
+    return value
+
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def defused(value):
+    """``value``, with text a spreadsheet would evaluate as a formula quoted"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """File-like object whose write() hands the value straight back"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([defused(local(value)) for value in row])
+
+
+class ZipStream(io.RawIOBase):
+    """Unseekable sink that collects what ZipFile writes until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+# Cell style 1 formats date-times, style 2 plain dates
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="1"><fill><patternFill patternType="none"/></fill></fills>
+<borders count="1"><border/></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+</cellXfs>
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>
+</styleSheet>"""
+
+SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_FOOTER = '</sheetData></worksheet>'
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xlsx_cell(value):
+    value = local(value)
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    if isinstance(value, datetime):
+        serial = (value.replace(tzinfo=None) - EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="1"><v>{serial}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="2"><v>{(value - EXCEL_EPOCH.date()).days}</v></c>'
+    text = escape(ILLEGAL_XML.sub('', defused(str(value))))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(values):
+    return '<row>' + ''.join(xlsx_cell(value) for value in values) + '</row>'
+
+
+def render_xlsx(headers, rows, sheet_name='Export'):
+    sink = ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES)
+        archive.writestr('_rels/.rels', ROOT_RELS)
+        archive.writestr('xl/workbook.xml', WORKBOOK.format(name=escape(sheet_name)))
+        archive.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', STYLES)
+        yield sink.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((SHEET_HEADER + xlsx_row(headers)).encode())
+            batch = []
+            for row in rows:
+                batch.append(xlsx_row(row))
+                if len(batch) == CHUNK_SIZE:
+                    sheet.write(''.join(batch).encode())
+                    batch = []
+                    yield sink.drain()
+            sheet.write((''.join(batch) + SHEET_FOOTER).encode())
+        yield sink.drain()
+    yield sink.drain()
+
+
+FORMATS = {
+    'csv': ('text/csv', render_csv),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', render_xlsx),
+}
+
+
+def export(name, fmt, staff=True, **filters):
+    """Return (content_type, iterator of str/bytes chunks) for one export."""
+    dataset = DATASETS[name]
+    content_type, render = FORMATS[fmt]
+    return content_type, render(dataset.headers(staff), dataset.rows(staff=staff, **filters))
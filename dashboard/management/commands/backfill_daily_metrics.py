@@ -0,0 +1,43 @@
+# dashboard/management/commands/backfill_daily_metrics.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from courses.models import Enrollment
+from dashboard.analytics import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily analytics rollups from history, a chunk of days at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD); defaults to the first enrollment')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--chunk-days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start']
+        if start is None:
+            first = Enrollment.objects.aggregate(first=Min('created_at'))['first']
+            if first is None:
+                self.stdout.write('Nothing to backfill')
+                return
+            start = timezone.localdate(first)
+        if start > end:
+            raise CommandError('--start must not be after --end')
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be at least 1')
+
+        written = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days'] - 1), end)
+            rows = rebuild(chunk_start, chunk_end)
+            written += rows
+            self.stdout.write(f'{chunk_start} - {chunk_end}: {rows} row(s)')
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {written} rollup row(s) from {start} to {end}'))
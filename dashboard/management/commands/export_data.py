@@ -0,0 +1,41 @@
+# dashboard/management/commands/export_data.py
+import uuid
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.exports import DATASETS, FORMATS, export
+
+
+class Command(BaseCommand):
+    help = 'Stream enrollments, payments, refunds or certificates to a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write; CSV goes to stdout when omitted')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD)')
+        parser.add_argument('--course', type=uuid.UUID, help='Course id')
+        parser.add_argument('--status')
+
+    def handle(self, *args, **options):
+        dataset, fmt = options['dataset'], options['format']
+        if options['status'] and options['status'] not in DATASETS[dataset].statuses:
+            raise CommandError(f"Unknown status for {dataset}: {options['status']}")
+        if fmt == 'xlsx' and not options['output']:
+            raise CommandError('--output is required for XLSX')
+
+        _, chunks = export(
+            dataset, fmt,
+            start=options['start'], end=options['end'],
+            course_id=options['course'], status=options['status']
+        )
+        if options['output']:
+            mode, encoding = ('wb', None) if fmt == 'xlsx' else ('w', 'utf-8')
+            with open(options['output'], mode, encoding=encoding, newline='' if encoding else None) as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -1,3 +1,52 @@
+# dashboard/models.py
 from django.db import models
+from courses.models import Course
 
-# Create your models here.
+class DailyCourseMetric(models.Model):
+    """Per course, per day activity; rebuilt by dashboard.analytics"""
+    date = models.DateField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_metrics')
+    
+    # Enrollments created that day, and what has become of them since
+    enrollments = models.PositiveIntegerField(default=0)
+    conversions = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    
+    certificates = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['date', 'course']
+        indexes = [
+            models.Index(fields=['date'], name='dashboard_metric_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.course} on {self.date}"
+
+class DailyRevenue(models.Model):
+    """Per course, per currency payments and refunds of a day"""
+    date = models.DateField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_revenue')
+    currency = models.CharField(max_length=3)
+    
+    payments = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refunds = models.PositiveIntegerField(default=0)
+    refunded = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['date', 'course', 'currency']
+        indexes = [
+            models.Index(fields=['date'], name='dashboard_revenue_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.course} on {self.date} ({self.currency})"
+
+class StaleMetricDay(models.Model):
+    """A (day, course) whose rollups must be recomputed by the next refresh"""
+    date = models.DateField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    
+    class Meta:
+        unique_together = ['date', 'course']
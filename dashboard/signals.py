@@ -0,0 +1,122 @@
+# dashboard/signals.py
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from courses.cache import invalidate_student
+from courses.models import Enrollment, Feedback
+from courses.signals import enrollments_changed, feedback_approved
+from certificates.models import Certificate
+from payments.models import Payment, Refund
+from payments.signals import payment_transitioned
+from . import events
+from .analytics import mark_stale
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_enrollment(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_student, instance.student_id))
+
+
+@receiver(post_save, sender=Feedback)
+@receiver(post_delete, sender=Feedback)
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def invalidate_enrollment_detail(sender, instance, **kwargs):
+    try:
+        student_id = instance.enrollment.student_id
+    except Enrollment.DoesNotExist:
+        # Cascading from the enrollment, which invalidates on its own
+        return
+    transaction.on_commit(partial(invalidate_student, student_id))
+
+
+@receiver(post_save, sender=Enrollment)
+def mark_enrollment_metrics(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_stale(instance.created_at, instance.course_id)
+
+
+@receiver(post_save, sender=Certificate)
+def mark_certificate_metrics(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_stale(instance.issue_date, instance.enrollment.course_id)
+
+
+@receiver(post_save, sender=Payment)
+def mark_payment_metrics(sender, instance, raw=False, **kwargs):
+    if not raw and instance.payment_date:
+        mark_stale(instance.payment_date, instance.enrollment.course_id)
+
+
+@receiver(post_save, sender=Refund)
+def mark_refund_metrics(sender, instance, raw=False, **kwargs):
+    if not raw and instance.processed_date:
+        mark_stale(instance.processed_date, instance.payment.enrollment.course_id)
+
+
+def enrollment_audience(enrollment):
+    course = enrollment.course
+    return [course.instructor_id, course.co_instructor_id, enrollment.student_id]
+
+
+@receiver(post_save, sender=Enrollment)
+def publish_enrollment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    events.publish(
+        'enrollment', enrollment_audience(instance),
+        enrollment=instance.pk, course=instance.course.name,
+        student=instance.student.get_full_name(), status=instance.status
+    )
+
+
+@receiver(post_save, sender=Payment)
+def publish_payment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    events.publish(
+        'payment', enrollment_audience(instance.enrollment),
+        payment=instance.pk, enrollment=instance.enrollment_id,
+        status=instance.status, amount=instance.amount, currency=instance.currency
+    )
+
+
+@receiver(post_save, sender=Feedback)
+def publish_feedback(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    course = instance.enrollment.course
+    events.publish(
+        'feedback', [course.instructor_id, course.co_instructor_id],
+        feedback=instance.pk, enrollment=instance.enrollment_id,
+        course=course.name, is_approved=instance.is_approved
+    )
+
+
+@receiver(payment_transitioned)
+def payment_transitioned_updates(sender, instance, enrollment_changed, **kwargs):
+    """Conditional-UPDATE transitions skip post_save, so do what it would have"""
+    mark_payment_metrics(sender, instance)
+    publish_payment(sender, instance)
+    if enrollment_changed:
+        enrollment = instance.enrollment
+        invalidate_enrollment(Enrollment, enrollment)
+        mark_enrollment_metrics(Enrollment, enrollment)
+        publish_enrollment(Enrollment, enrollment)
+
+
+@receiver(enrollments_changed)
+def publish_changed_enrollments(sender, enrollment_ids, **kwargs):
+    """Cancellations, rejections, expiries and bulk approvals are UPDATEs, which post_save misses"""
+    for enrollment in Enrollment.objects.filter(id__in=enrollment_ids).select_related('course', 'student'):
+        publish_enrollment(Enrollment, enrollment)
+
+
+@receiver(feedback_approved)
+def publish_approved_feedback(sender, feedback_ids, **kwargs):
+    for feedback in Feedback.objects.filter(id__in=feedback_ids).select_related('enrollment__course'):
+        publish_feedback(Feedback, feedback)
@@ -0,0 +1,9 @@
+# dashboard/tasks.py
+from celery import shared_task
+
+@shared_task
+def refresh_daily_metrics():
+    """Rebuild analytics rollups for stale days and the trailing window"""
+    from .analytics import refresh
+    
+    return refresh()
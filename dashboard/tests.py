@@ -1,3 +1,281 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import BytesIO, StringIO
+import asyncio
+import csv
+import json
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from courses.models import Course, CourseSession, Enrollment, Feedback
+from payments.models import Payment, Refund
+from . import analytics, events
+from .views import live_events
+from .models import DailyCourseMetric, DailyRevenue, StaleMetricDay
+
+
+class StudentDashboardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        self.student = User.objects.create_user(
+            email='student@example.com', username='student', password='x'
+        )
+        course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=instructor, price=100, duration_hours=8, max_capacity=10
+        )
+        self.upcoming = Enrollment.objects.create(
+            student=self.student, course=course, final_price=100,
+            session=CourseSession.objects.create(
+                course=course,
+                start_datetime=timezone.now() + timedelta(days=7),
+                end_datetime=timezone.now() + timedelta(days=8),
+            )
+        )
+        self.completed = Enrollment.objects.create(
+            student=self.student, course=course, final_price=100, status='completed',
+            session=CourseSession.objects.create(
+                course=course,
+                start_datetime=timezone.now() - timedelta(days=8),
+                end_datetime=timezone.now() - timedelta(days=7),
+            )
+        )
+        self.client.force_login(self.student)
+
+    def test_partitions_enrollments(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('student_dashboard'))
+        self.assertEqual(response.context['registered_enrollments'], [self.upcoming])
+        self.assertEqual(response.context['pending_feedback'], [self.completed])
+        self.assertEqual(response.context['completed_enrollments'], [])
+
+    def test_cached_until_feedback_changes(self):
+        url = reverse('student_dashboard')
+        self.client.get(url)
+        # Session and user lookups only; enrollments come from the cache
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Feedback.objects.create(
+                enrollment=self.completed, overall_rating=5, overall_experience='Good',
+                instructor_rating=5, content_rating=5, venue_rating=5,
+                key_takeaways='Plenty', would_recommend=True, is_approved=True
+            )
+        response = self.client.get(url)
+        self.assertEqual(response.context['pending_feedback'], [])
+        self.assertEqual(response.context['completed_enrollments'], [self.completed])
+
+
+class InstructorFixtureMixin:
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        self.course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=self.instructor, price=100, duration_hours=8, max_capacity=10
+        )
+        self.session = CourseSession.objects.create(
+            course=self.course,
+            start_datetime=timezone.now() + timedelta(days=7),
+            end_datetime=timezone.now() + timedelta(days=8),
+        )
+        self.client.force_login(self.instructor)
+
+    def enroll(self, count):
+        start = User.objects.count()
+        for n in range(start, start + count):
+            student = User.objects.create_user(
+                email=f'student{n}@example.com', username=f'student{n}', password='x'
+            )
+            Enrollment.objects.create(
+                student=student, course=self.course, session=self.session, final_price=100
+            )
+
+
+class InstructorDashboardTest(InstructorFixtureMixin, TestCase):
+    def test_first_paint_is_fixed_cost(self):
+        self.enroll(1)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('instructor_dashboard'))
+        self.assertEqual(response.context['courses'][0].pending_total, 1)
+
+        self.enroll(4)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('instructor_dashboard'))
+        self.assertEqual(response.context['pending_total'], 5)
+
+    @mock.patch('dashboard.views.QUEUE_PAGE_SIZE', 2)
+    def test_work_queue_pages(self):
+        self.enroll(3)
+        url = reverse('instructor_work_queue', args=['approvals'])
+        page = self.client.get(url).context['page']
+        self.assertEqual(len(page), 2)
+
+        page = self.client.get(url, {'cursor': page.next_cursor}).context['page']
+        self.assertEqual(len(page), 1)
+        self.assertFalse(page.has_next())
+
+        self.assertEqual(self.client.get(reverse('instructor_work_queue', args=['other'])).status_code, 404)
+
+
+class AnalyticsRollupTest(InstructorFixtureMixin, TestCase):
+    def test_refresh_and_backfill_agree(self):
+        self.enroll(3)
+        enrolled, cancelled = Enrollment.objects.all()[:2]
+        Enrollment.objects.filter(pk=enrolled.pk).update(status='enrolled')
+        Enrollment.objects.filter(pk=cancelled.pk).update(status='cancelled')
+        payment = Payment.objects.create(
+            enrollment=enrolled, amount=100, currency='EUR', payment_method='paypal',
+            status='completed', payment_date=timezone.now()
+        )
+        Refund.objects.create(
+            payment=payment, amount=40, reason='Moved', status='completed', processed_date=timezone.now()
+        )
+        self.assertTrue(StaleMetricDay.objects.exists())
+
+        analytics.refresh()
+        self.assertFalse(StaleMetricDay.objects.exists())
+        metric = DailyCourseMetric.objects.get()
+        self.assertEqual((metric.enrollments, metric.conversions, metric.cancellations), (3, 1, 1))
+        revenue = DailyRevenue.objects.get()
+        self.assertEqual((revenue.currency, revenue.revenue, revenue.refunded), ('EUR', 100, 40))
+
+        refreshed = list(DailyCourseMetric.objects.values('date', 'course', 'enrollments', 'conversions'))
+        call_command('backfill_daily_metrics', chunk_days=1, stdout=StringIO())
+        self.assertEqual(
+            list(DailyCourseMetric.objects.values('date', 'course', 'enrollments', 'conversions')), refreshed
+        )
+
+    def test_old_enrollment_changes_mark_their_day_stale(self):
+        self.enroll(2)
+        created = timezone.now() - timedelta(days=10)
+        Enrollment.objects.update(created_at=created)
+        StaleMetricDay.objects.all().delete()
+        cancelled, rejected = Enrollment.objects.all()
+
+        self.assertTrue(cancelled.release_seat('cancelled'))
+        Enrollment.bulk_decide([rejected.id], self.instructor, 'reject')
+        self.assertTrue(
+            StaleMetricDay.objects.filter(date=timezone.localdate(created), course=self.course).exists()
+        )
+
+        analytics.refresh()
+        metric = DailyCourseMetric.objects.get(date=timezone.localdate(created))
+        self.assertEqual(metric.cancellations, 2)
+
+    def test_admin_dashboard_reads_rollups(self):
+        self.enroll(2)
+        analytics.refresh()
+        admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='x', user_type='admin'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin_dashboard'), {'days': 7})
+        self.assertEqual(response.context['totals']['enrollments'], 2)
+        self.assertEqual(response.context['by_course'][0]['course__name'], 'Negotiation')
+
+
+class ExportTest(InstructorFixtureMixin, TestCase):
+    def test_instructor_csv_export(self):
+        self.enroll(3)
+        Enrollment.objects.filter(pk=Enrollment.objects.first().pk).update(status='enrolled')
+        response = self.client.get(reverse('export_data', args=['enrollments', 'csv']), {'status': 'pending'})
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][0], 'Tracking number')
+        self.assertEqual(len(rows), 3)
+
+        self.assertEqual(self.client.get(reverse('export_data', args=['payments', 'csv'])).status_code, 403)
+
+    def test_instructor_export_leaves_out_contact_details(self):
+        self.enroll(1)
+        response = self.client.get(reverse('export_data', args=['enrollments', 'csv']))
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertNotIn('Student email', rows[0])
+        self.assertNotIn('Mobile', rows[0])
+        self.assertNotIn('student1@example.com', rows[1])
+
+    def test_formulas_are_quoted(self):
+        self.enroll(1)
+        User.objects.filter(username='student1').update(first_name='=HYPERLINK("http://x")', last_name='\tplain')
+        response = self.client.get(reverse('export_data', args=['enrollments', 'csv']))
+        row = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))[1]
+        self.assertIn("'=HYPERLINK(\"http://x\")", row)
+        self.assertIn("'\tplain", row)
+
+        response = self.client.get(reverse('export_data', args=['enrollments', 'xlsx']))
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('<t xml:space="preserve">\'=HYPERLINK', sheet)
+
+    def test_xlsx_is_a_valid_workbook(self):
+        self.enroll(2)
+        admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='x', user_type='admin'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(reverse('export_data', args=['enrollments', 'xlsx']))
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+
+
+class LiveEventsTest(InstructorFixtureMixin, TestCase):
+    @mock.patch('dashboard.events.get_broker')
+    def test_enrollment_published_to_instructor_and_student(self, get_broker):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enroll(1)
+        channels = {call.args[0] for call in get_broker.return_value.publish.call_args_list}
+        student = User.objects.get(username='student1')
+        self.assertEqual(channels, {events.user_channel(self.instructor.pk), events.user_channel(student.pk)})
+
+    @mock.patch('dashboard.events.get_broker')
+    def test_bulk_decisions_are_published(self, get_broker):
+        self.enroll(3)
+        enrollments = list(Enrollment.objects.all())
+        feedback = Feedback.objects.create(
+            enrollment=enrollments[2], overall_rating=5, overall_experience='Good', instructor_rating=5,
+            content_rating=5, venue_rating=5, key_takeaways='Plenty', would_recommend=True
+        )
+        publish = get_broker.return_value.publish
+        publish.reset_mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.bulk_decide([enrollments[0].id], self.instructor, 'approve')
+            enrollments[1].release_seat('cancelled')
+            Feedback.bulk_approve([feedback.pk], self.instructor)
+
+        messages = [json.loads(call.args[1]) for call in publish.call_args_list]
+        self.assertIn(('enrollment', 'enrolled'), {(m['type'], m.get('status')) for m in messages})
+        self.assertIn(('enrollment', 'cancelled'), {(m['type'], m.get('status')) for m in messages})
+        self.assertIn(('feedback', True), {(m['type'], m.get('is_approved')) for m in messages})
+
+    async def test_stream_pushes_events(self):
+        request = RequestFactory().get(reverse('live_events'))
+
+        async def auser():
+            return self.instructor
+        request.auser = auser
+
+        response = await live_events(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        events.get_broker().publish(events.user_channel(self.instructor.pk), '{"type": "payment", "status": "completed"}')
+        chunk = await asyncio.wait_for(pending, 1)
+        self.assertTrue(chunk.startswith(b'event: payment\n'))
+        await stream.aclose()
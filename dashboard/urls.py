@@ -5,5 +5,8 @@ from . import views
 urlpatterns = [
     path('', views.student_dashboard, name='student_dashboard'),
     path('instructor/', views.instructor_dashboard, name='instructor_dashboard'),
+    path('instructor/queue/<str:queue>/', views.instructor_work_queue, name='instructor_work_queue'),
     path('admin/', views.admin_dashboard, name='admin_dashboard'),
+    path('events/', views.live_events, name='live_events'),
+    path('exports/<str:dataset>.<str:fmt>', views.export_data, name='export_data'),
 ]
\ No newline at end of file
@@ -1,90 +1,201 @@
 # dashboard/views.py
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
-from django.db.models import Q
+from django.db.models import Count, Q
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from datetime import date, timedelta
+import uuid
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.conf import settings
 
-from courses.models import Enrollment, Course
-from certificates.models import Certificate
+from courses.cache import student_dashboard_key
+from courses.models import Enrollment, Course, Feedback
+from courses.rollups import get_rollup, get_rollups
+from certificates.models import Certificate, CertificateBatch
+from ultima_training.pagination import KeysetPaginator
+from . import analytics, events, exports
 
 User = get_user_model()
 
+QUEUE_PAGE_SIZE = 25
+
+# Instructors may export these for their own courses; the rest is admin only
+INSTRUCTOR_EXPORTS = ('enrollments', 'certificates')
+
 @login_required
 def student_dashboard(request):
     user = request.user
+    now = timezone.now()
     
-    # Registered courses (pending and enrolled)
-    registered_enrollments = Enrollment.objects.filter(
-        student=user,
-        status__in=['pending', 'enrolled'],
-        session__start_datetime__gte=timezone.now()
-    ).select_related('course', 'session')
-    
-    # Pending feedback courses
-    pending_feedback = Enrollment.objects.filter(
-        student=user,
-        status='completed',
-        feedback__isnull=True
-    ).select_related('course', 'session')
+    # All of the student's enrollments in one query, cached until one of
+    # them (or its feedback or certificate) changes; see dashboard.signals
+    key = student_dashboard_key(user.pk)
+    enrollments = cache.get(key)
+    if enrollments is None:
+        enrollments = list(
+            Enrollment.objects.filter(student=user).select_related(
+                'course', 'session', 'feedback', 'certificate'
+            ).order_by('session__start_datetime')
+        )
+        cache.set(key, enrollments, settings.STUDENT_DASHBOARD_CACHE_TIMEOUT)
     
-    # Completed courses with certificates
-    completed_enrollments = Enrollment.objects.filter(
-        student=user,
-        status='completed',
-        feedback__isnull=False,
-        feedback__is_approved=True
-    ).select_related('course', 'session')
+    registered_enrollments = []
+    pending_feedback = []
+    completed_enrollments = []
+    for enrollment in enrollments:
+        feedback = getattr(enrollment, 'feedback', None)
+        if enrollment.status in ('pending', 'enrolled'):
+            # Registered courses (pending and enrolled)
+            if enrollment.session.start_datetime >= now:
+                registered_enrollments.append(enrollment)
+        elif enrollment.status == 'completed':
+            if feedback is None:
+                # Pending feedback courses
+                pending_feedback.append(enrollment)
+            elif feedback.is_approved:
+                # Completed courses with certificates
+                completed_enrollments.append(enrollment)
     
     context = {
         'registered_enrollments': registered_enrollments,
         'pending_feedback': pending_feedback,
         'completed_enrollments': completed_enrollments,
-        'now': timezone.now(),
+        'now': now,
     }
     
     return render(request, 'dashboard/student_dashboard.html', context)
 
+def instructor_course_ids(user):
+    return Course.objects.filter(
+        Q(instructor=user) | Q(co_instructor=user)
+    ).values('id')
+
 @login_required
 def instructor_dashboard(request):
     if request.user.user_type != 'instructor':
         messages.error(request, 'Access denied.')
         return redirect('student_dashboard')
     
-    courses = Course.objects.filter(
-        Q(instructor=request.user) | Q(co_instructor=request.user)
+    # Per-course work counts in one aggregate query; the queues themselves
+    # are paged in by instructor_work_queue after the first paint
+    courses = list(
+        Course.objects.filter(
+            Q(instructor=request.user) | Q(co_instructor=request.user)
+        ).annotate(
+            pending_total=Count('enrollments', filter=Q(enrollments__status='pending')),
+            enrolled_total=Count('enrollments', filter=Q(enrollments__status='enrolled')),
+            review_total=Count('enrollments', filter=Q(enrollments__feedback__is_approved=False)),
+        ).order_by('name')
     )
-    
-    pending_approvals = Enrollment.objects.filter(
-        course__in=courses,
-        status='pending'
-    ).select_related('student', 'course', 'session')
-    
-    pending_reviews = Enrollment.objects.filter(
-        course__in=courses,
-        feedback__is_approved=False,
-        feedback__isnull=False
-    ).select_related('feedback', 'course')
+    ratings = get_rollups('course', [course.pk for course in courses])
+    for course in courses:
+        course.rating = ratings.get(str(course.pk))
     
     context = {
         'courses': courses,
-        'pending_approvals': pending_approvals,
-        'pending_reviews': pending_reviews,
+        'pending_total': sum(course.pending_total for course in courses),
+        'review_total': sum(course.review_total for course in courses),
+        'rating': get_rollup('instructor', request.user.pk),
+        'certificate_batches': CertificateBatch.objects.filter(
+            requested_by=request.user
+        ).select_related('session__course')[:5],
     }
     return render(request, 'dashboard/instructor_dashboard.html', context)
 
+@login_required
+def instructor_work_queue(request, queue):
+    """One page of pending approvals or feedback reviews, as an HTML fragment"""
+    if request.user.user_type != 'instructor':
+        return HttpResponseForbidden()
+    
+    course_ids = instructor_course_ids(request.user)
+    if queue == 'approvals':
+        items = Enrollment.objects.filter(
+            course_id__in=course_ids,
+            status='pending'
+        ).select_related('student', 'course', 'session')
+    elif queue == 'reviews':
+        items = Feedback.objects.filter(
+            enrollment__course_id__in=course_ids,
+            is_approved=False
+        ).select_related('enrollment__student', 'enrollment__course')
+    else:
+        raise Http404
+    
+    page = KeysetPaginator(items, QUEUE_PAGE_SIZE, 'created_at').get_page(request.GET.get('cursor'))
+    return render(request, f'dashboard/includes/{queue}_queue.html', {'page': page, 'queue': queue})
+
 @login_required
 def admin_dashboard(request):
     if request.user.user_type != 'admin':
         messages.error(request, 'Access denied.')
         return redirect('student_dashboard')
     
-    user_count = User.objects.count()
-    enrollment_count = Enrollment.objects.count()
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        days = 30
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
     
-    context = {
-        'user_count': user_count,
-        'enrollment_count': enrollment_count,
-    }
-    return render(request, 'dashboard/admin_dashboard.html', context)
\ No newline at end of file
+    # Everything below reads the daily rollups, never the source tables
+    context = analytics.summary(start, end)
+    context.update({
+        'days': days,
+        'start': start,
+        'end': end,
+        'user_count': cache.get_or_set('dashboard:user_count', User.objects.count, settings.CATALOG_CACHE_TIMEOUT),
+    })
+    return render(request, 'dashboard/admin_dashboard.html', context)
+
+@login_required
+def export_data(request, dataset, fmt):
+    """Stream a CSV or XLSX export, filtered by ?start=&end=&course=&status="""
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        raise Http404
+    
+    filters = {}
+    if request.user.user_type == 'instructor' and dataset in INSTRUCTOR_EXPORTS:
+        filters['course_ids'] = instructor_course_ids(request.user)
+    elif request.user.user_type != 'admin':
+        return HttpResponseForbidden()
+    
+    try:
+        for name in ('start', 'end'):
+            if request.GET.get(name):
+                filters[name] = date.fromisoformat(request.GET[name])
+        if request.GET.get('course'):
+            filters['course_id'] = uuid.UUID(request.GET['course'])
+    except ValueError:
+        return HttpResponseBadRequest('Invalid filter')
+    
+    status = request.GET.get('status')
+    if status:
+        if status not in exports.DATASETS[dataset].statuses:
+            return HttpResponseBadRequest('Invalid status')
+        filters['status'] = status
+    
+    staff = request.user.user_type == 'admin'
+    content_type, chunks = exports.export(dataset, fmt, staff=staff, **filters)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    filename = f'{dataset}-{timezone.localdate():%Y%m%d}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+async def live_events(request):
+    """
+    Server-sent events for the signed-in user's dashboard. Holds the
+    connection open, so serve it from the ASGI application.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    response = StreamingHttpResponse(events.stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,25 @@
 from django.contrib import admin
+from .models import PayPalWebhookEvent, Refund
 
-# Register your models here.
+@admin.register(PayPalWebhookEvent)
+class PayPalWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'event_type', 'resource_id', 'status', 'received_at', 'latency')
+    list_filter = ('status', 'event_type')
+    search_fields = ('event_id', 'resource_id')
+    readonly_fields = ('received_at', 'processed_at')
+
+@admin.register(Refund)
+class RefundAdmin(admin.ModelAdmin):
+    list_display = ('id', 'payment', 'amount', 'status', 'provider_reference', 'processed_date', 'created_at')
+    list_filter = ('status', 'payment__payment_method')
+    search_fields = ('id', 'payment__enrollment__tracking_number', 'provider_reference')
+    list_select_related = ('payment',)
+    readonly_fields = ('provider_reference', 'processed_by', 'processed_date', 'created_at', 'updated_at')
+    actions = ['process_selected']
+    
+    @admin.action(description='Process selected refunds')
+    def process_selected(self, request, queryset):
+        from .tasks import process_refunds
+        ids = [str(refund_id) for refund_id in queryset.filter(status='requested').values_list('id', flat=True)]
+        process_refunds.delay(ids, request.user.pk)
+        self.message_user(request, f'{len(ids)} refund(s) queued for processing.')
@@ -0,0 +1,200 @@
+# payments/bank.py
+"""
+Client for the bank's Rahgiri verification API.
+
+Verification runs inside the web request that submits the code, so a slow
+or failing bank must never hold a worker for long:
+
+* one requests.Session per process keeps a small pool of kept-alive
+  connections, so calls skip the TCP/TLS handshake;
+* every call has a connect and a read timeout;
+* a circuit breaker fails fast for BANK_API_COOLDOWN seconds once
+  BANK_API_FAILURE_THRESHOLD calls in a row have failed, then lets a
+  single trial call through;
+* answers are cached for BANK_API_CACHE_TIMEOUT seconds by (code, amount),
+  so a student re-submitting the form does not call the bank again.
+
+BankUnavailable means the bank could not be asked; callers leave the
+payment pending for statement reconciliation (payments.reconciliation).
+averify() is the same call for async views. There is no async HTTP
+library among our dependencies, so it hands the blocking call to the
+client's own thread pool, sized like the connection pool; the event loop
+never waits on the bank.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+
+class BankError(Exception):
+    pass
+
+
+class BankUnavailable(BankError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._trial or time.monotonic() - self._opened_at >= self.cooldown:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """Whether a call may go out now; after the cooldown only one trial call does."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class BankClient:
+    def __init__(self, base_url, api_key='', connect_timeout=1.0, read_timeout=3.0,
+                 pool_size=10, failure_threshold=5, cooldown=30, cache_timeout=60):
+        self.url = base_url.rstrip('/') + '/verify'
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.cache_timeout = cache_timeout
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self._session = None
+        self._executor = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Built on first use, so every forked worker gets its own pool
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    # Retries would multiply the time a request can be held
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    if self.api_key:
+                        session.headers['Authorization'] = f'Bearer {self.api_key}'
+                    self._session = session
+        return self._session
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._session_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix='bank-api')
+        return self._executor
+
+    def cache_key(self, code, amount):
+        return f'bank:rahgiri:{code}:{Decimal(amount).quantize(Decimal("0.01"))}'
+
+    def verify(self, code, amount):
+        """True if the bank confirms a transfer of ``amount`` under ``code``."""
+        key = self.cache_key(code, amount)
+        valid = cache.get(key)
+        if valid is None:
+            valid = self.request(key, code, amount)
+        return valid
+
+    async def averify(self, code, amount):
+        key = self.cache_key(code, amount)
+        valid = await cache.aget(key)
+        if valid is None:
+            loop = asyncio.get_running_loop()
+            valid = await loop.run_in_executor(self.executor, self.request, key, code, amount)
+        return valid
+
+    def request(self, key, code, amount):
+        if not self.breaker.allow():
+            raise BankUnavailable('Circuit open; bank API calls are paused')
+        try:
+            response = self.session.post(
+                self.url,
+                json={'rahgiri_code': code, 'amount': str(amount)},
+                timeout=self.timeout,
+            )
+            if response.status_code >= 500:
+                raise BankUnavailable(f'Bank API returned {response.status_code}')
+            response.raise_for_status()
+            valid = bool(response.json()['valid'])
+        except BankUnavailable:
+            self.breaker.record_failure()
+            raise
+        except requests.HTTPError as e:
+            # The bank answered, it just didn't like the request
+            self.breaker.record_success()
+            raise BankError(str(e)) from e
+        except (requests.RequestException, ValueError, KeyError) as e:
+            self.breaker.record_failure()
+            raise BankUnavailable(str(e)) from e
+
+        self.breaker.record_success()
+        if self.cache_timeout:
+            cache.set(key, valid, self.cache_timeout)
+        return valid
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, or None when BANK_API_URL is not set."""
+    global _client
+    if _client is None and settings.BANK_API_URL:
+        with _client_lock:
+            if _client is None:
+                _client = BankClient(
+                    settings.BANK_API_URL,
+                    api_key=settings.BANK_API_KEY,
+                    connect_timeout=settings.BANK_API_CONNECT_TIMEOUT,
+                    read_timeout=settings.BANK_API_READ_TIMEOUT,
+                    pool_size=settings.BANK_API_POOL_SIZE,
+                    failure_threshold=settings.BANK_API_FAILURE_THRESHOLD,
+                    cooldown=settings.BANK_API_COOLDOWN,
+                    cache_timeout=settings.BANK_API_CACHE_TIMEOUT,
+                )
+    return _client
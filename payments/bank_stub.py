@@ -0,0 +1,80 @@
+# payments/bank_stub.py
+"""
+Local stand-in for the bank's Rahgiri verification API, for tests and
+benchmark_bank_client. Speaks HTTP/1.1 with keep-alive like the real one,
+so connection reuse can be observed through ``connections``.
+"""
+import json
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubBankHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add ~40ms to every kept-alive response
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with server.lock:
+            server.requests += 1
+        if server.delay:
+            time.sleep(server.delay)
+
+        if server.status >= 400:
+            payload = {'error': 'unavailable'}
+        else:
+            try:
+                transfer = (body.get('rahgiri_code'), Decimal(body.get('amount')))
+            except (InvalidOperation, TypeError):
+                transfer = None
+            payload = {'valid': transfer in server.transfers}
+        data = json.dumps(payload).encode()
+        self.send_response(server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubBankServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, transfers=(), delay=0.0, status=200):
+        """``transfers`` are the (code, amount) pairs the stub confirms."""
+        super().__init__(('127.0.0.1', 0), StubBankHandler)
+        self.transfers = {(code, Decimal(str(amount))) for code, amount in transfers}
+        self.delay = delay
+        self.status = status
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that's expected here
+        pass
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
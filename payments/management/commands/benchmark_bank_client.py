@@ -0,0 +1,88 @@
+# payments/management/commands/benchmark_bank_client.py
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from payments.bank import BankClient, BankError
+from payments.bank_stub import StubBankServer
+
+
+def naive_verify(url, code, amount):
+    # A fresh connection and no timeout per call, as a hand-rolled requests.post would do
+    response = requests.post(f'{url}/verify', json={'rahgiri_code': code, 'amount': str(amount)})
+    response.raise_for_status()
+    return response.json()['valid']
+
+
+class Command(BaseCommand):
+    help = 'Measure bank verification throughput and latency against a local stub bank'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=16, help='Threads, or concurrent tasks in async mode')
+        parser.add_argument('--delay', type=float, default=0.01, help='Seconds the stub bank takes to answer')
+        parser.add_argument('--read-timeout', type=float, default=3.0)
+        parser.add_argument('--status', type=int, default=200, help='Status the stub answers with, e.g. 503 for an outage')
+        parser.add_argument('--mode', choices=['naive', 'pooled', 'async', 'all'], default='all')
+
+    def handle(self, *args, **options):
+        modes = ['naive', 'pooled', 'async'] if options['mode'] == 'all' else [options['mode']]
+        for mode in modes:
+            with StubBankServer(delay=options['delay'], status=options['status']) as server:
+                self.run(mode, server, options)
+
+    def run(self, mode, server, options):
+        count, workers = options['requests'], options['workers']
+        # Unique codes, so every call goes to the bank rather than the cache
+        codes = [f'BENCH{number:010d}' for number in range(count)]
+        client = BankClient(
+            server.url, read_timeout=options['read_timeout'], pool_size=workers, cache_timeout=0
+        )
+        errors = 0
+
+        def timed(code):
+            nonlocal errors
+            started = time.perf_counter()
+            try:
+                if mode == 'naive':
+                    naive_verify(server.url, code, 100)
+                else:
+                    client.verify(code, 100)
+            except (BankError, requests.RequestException):
+                errors += 1
+            return time.perf_counter() - started
+
+        async def timed_async(code, semaphore):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await client.averify(code, 100)
+                except BankError:
+                    errors += 1
+                return time.perf_counter() - started
+
+        async def run_async():
+            semaphore = asyncio.Semaphore(workers)
+            return await asyncio.gather(*(timed_async(code, semaphore) for code in codes))
+
+        started = time.perf_counter()
+        if mode == 'async':
+            latencies = asyncio.run(run_async())
+        else:
+            with ThreadPoolExecutor(workers) as executor:
+                latencies = list(executor.map(timed, codes))
+        elapsed = time.perf_counter() - started
+        client.close()
+
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f'{mode}: {count} calls in {elapsed:.2f}s ({count / elapsed:,.0f}/s), '
+            f'median {statistics.median(latencies) * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms, '
+            f'{server.connections} connection(s), {server.requests} reached the bank, {errors} error(s)'
+        )
@@ -0,0 +1,23 @@
+# payments/management/commands/process_refunds.py
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.refunds import process_refunds
+
+
+class Command(BaseCommand):
+    help = 'Submit every eligible refund to its provider, a chunk at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Refunds per chunk; defaults to REFUND_BATCH_SIZE')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        counts = process_refunds(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{counts['completed']} completed, {counts['rejected']} rejected, "
+                f"{counts['requested']} left for the next run"
+            )
+        )
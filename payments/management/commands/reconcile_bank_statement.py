@@ -0,0 +1,48 @@
+# payments/management/commands/reconcile_bank_statement.py
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.reconciliation import CHUNK_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Confirm pending Rahgiri payments that appear on a bank statement CSV export'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Bank statement CSV')
+        parser.add_argument('--report', '-o', help='Write a per-line reconciliation report CSV here')
+        parser.add_argument('--dry-run', action='store_true', help='Match and report without confirming anything')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--code-column', default='rahgiri_code')
+        parser.add_argument('--amount-column', default='amount')
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        report = None
+        try:
+            with open(options['statement'], encoding=options['encoding'], newline='') as statement:
+                if options['report']:
+                    report = open(options['report'], 'w', encoding='utf-8', newline='')
+                results = reconcile(
+                    statement,
+                    report=report,
+                    dry_run=options['dry_run'],
+                    chunk_size=options['chunk_size'],
+                    code_column=options['code_column'],
+                    amount_column=options['amount_column'],
+                )
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if report:
+                report.close()
+
+        confirmed = results.pop('confirmed', 0)
+        for result, count in sorted(results.items()):
+            self.stdout.write(f'{result}: {count}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run: {results['matched']} payment(s) would be confirmed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Confirmed {confirmed} payment(s)'))
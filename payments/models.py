@@ -1,7 +1,9 @@
 # payments/models.py
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from courses.models import Enrollment
+from .signals import payment_transitioned
 import uuid
 
 User = get_user_model()
@@ -20,6 +22,13 @@ class Payment(models.Model):
         ('refunded', 'Refunded'),
     )
     
+    # Status -> the statuses it may be reached from
+    TRANSITIONS = {
+        'completed': ('pending',),
+        'failed': ('pending',),
+        'refunded': ('completed',),
+    }
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     enrollment = models.OneToOneField(Enrollment, on_delete=models.CASCADE, related_name='payment')
     
@@ -28,8 +37,8 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     
     # Payment provider fields
-    transaction_id = models.CharField(max_length=100, blank=True)
-    rahgiri_code = models.CharField(max_length=50, blank=True)  # For Iranian payments
+    transaction_id = models.CharField(max_length=100, blank=True, db_index=True)
+    rahgiri_code = models.CharField(max_length=50, blank=True, db_index=True)  # For Iranian payments
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     payment_date = models.DateTimeField(null=True, blank=True)
@@ -42,6 +51,73 @@ class Payment(models.Model):
     
     def __str__(self):
         return f"Payment {self.id} - {self.amount} {self.currency}"
+    
+    def transition(self, status, enrollment_status=None, **fields):
+        """
+        Move this payment to ``status`` with a single conditional UPDATE that
+        writes only ``status`` and ``fields``, and, if given, its enrollment
+        to ``enrollment_status`` in the same transaction.
+        Returns True if this call performed the transition, so concurrent
+        callers (a webhook retry and the student's own submit) can fire
+        side effects exactly once without locking the row.
+        
+        With ``enrollment_status``, True also means the enrollment changed.
+        An enrollment that expired meanwhile takes its seat back if the
+        session still has one, as in reconciliation.confirm(). When it has
+        none, or the enrollment was cancelled or rejected, nothing is written:
+        the payment stays pending for finance to refund, and False is returned.
+        """
+        fields['status'] = status
+        fields['updated_at'] = timezone.now()
+        with transaction.atomic():
+            updated = Payment.objects.filter(
+                pk=self.pk,
+                status__in=self.TRANSITIONS[status]
+            ).update(**fields)
+            if not updated:
+                return False
+            
+            enrollment_changed = False
+            if enrollment_status:
+                enrollment_changed = self._move_enrollment(enrollment_status, fields['updated_at'])
+                if not enrollment_changed:
+                    # Undo the payment UPDATE too
+                    transaction.set_rollback(True)
+                    return False
+            
+            for name, value in fields.items():
+                setattr(self, name, value)
+            
+            payment_transitioned.send(
+                sender=Payment, instance=self, enrollment_changed=enrollment_changed
+            )
+        return True
+    
+    def _move_enrollment(self, status, now):
+        from courses import promotions
+        
+        enrollment = Enrollment.objects.select_for_update(of=('self',)).select_related('session').get(
+            pk=self.enrollment_id
+        )
+        self.enrollment = enrollment
+        if enrollment.status == 'expired':
+            if not enrollment.session.reserve_seat():
+                return False
+            # The student paid the discounted price, so the code counts again
+            if enrollment.promo_code:
+                promotions.redeem(enrollment.promo_code)
+        elif enrollment.status != 'pending':
+            return False
+        
+        Enrollment.objects.filter(pk=enrollment.pk).update(status=status, updated_at=now)
+        enrollment.status = status
+        enrollment.updated_at = now
+        return True
+    
+    def complete(self, **fields):
+        """Mark a pending payment completed and enroll its student."""
+        fields.setdefault('payment_date', timezone.now())
+        return self.transition('completed', enrollment_status='enrolled', **fields)
 
 class Refund(models.Model):
     STATUS_CHOICES = (
@@ -62,6 +138,9 @@ class Refund(models.Model):
     bank_card_number = models.CharField(max_length=20, blank=True)
     cardholder_name = models.CharField(max_length=100, blank=True)
     
+    # PayPal refund id, or the bank batch file the refund was sent in
+    provider_reference = models.CharField(max_length=255, blank=True)
+    
     processed_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -76,3 +155,39 @@ class Refund(models.Model):
     
     def __str__(self):
         return f"Refund {self.id} - {self.amount}"
+
+class PayPalWebhookEvent(models.Model):
+    """A PayPal webhook delivery, stored as received and processed later in batches"""
+    STATUS_CHOICES = (
+        ('received', 'Received'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    )
+    
+    # PayPal's event id; redeliveries of the same event reuse it
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=100)
+    resource_id = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField()
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='received')
+    error = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'received_at'], name='payments_webhook_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.event_id}"
+    
+    @property
+    def latency(self):
+        """Time from receipt to processing"""
+        if self.processed_at:
+            return self.processed_at - self.received_at
+        return None
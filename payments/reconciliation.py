@@ -0,0 +1,194 @@
+# payments/reconciliation.py
+"""
+Bank statement reconciliation for Rahgiri (bank transfer) payments.
+
+Students submit the Rahgiri code their bank gave them and the payment
+stays pending until the code shows up on a bank statement export. The
+statement is read as a CSV stream, a chunk of lines at a time; each chunk
+is hash-joined in memory against the pending payments carrying those
+codes (one indexed query per chunk) and the matches are confirmed with
+two bulk UPDATEs per chunk. Every statement line gets a row in the report;
+a matched payment whose enrollment was cancelled, rejected or expired with
+no seat left is reported as enrollment_<status> and left pending.
+"""
+import csv
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+CHUNK_SIZE = 5000
+
+# Persian and Arabic-Indic digits as found in bank exports
+DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+
+REPORT_FIELDS = ['line', 'rahgiri_code', 'amount', 'result', 'payment_id', 'expected_amount']
+
+
+def normalize_code(value):
+    return (value or '').translate(DIGITS).strip().upper()
+
+
+def parse_amount(value):
+    cleaned = (value or '').translate(DIGITS).replace(',', '').replace('٬', '').strip()
+    try:
+        return Decimal(cleaned).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def read_statement(lines, code_column='rahgiri_code', amount_column='amount'):
+    """Yield (line number, code, amount) from a statement CSV, one line at a time."""
+    reader = csv.DictReader(lines)
+    missing = {code_column, amount_column} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"Statement is missing column(s): {', '.join(sorted(missing))}")
+    for number, row in enumerate(reader, start=2):
+        yield number, normalize_code(row[code_column]), parse_amount(row[amount_column])
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def match_chunk(lines, seen):
+    """
+    Join one chunk of statement lines against pending payments. Returns the
+    report rows and the (payment id, enrollment id) pairs to confirm;
+    ``seen`` collects the codes matched so far, so repeats are reported.
+    """
+    from .models import Payment
+
+    codes = {code for _, code, _ in lines if code}
+    pending = defaultdict(list)
+    for payment in Payment.objects.filter(
+        rahgiri_code__in=codes,
+        payment_method='bank_transfer',
+        status='pending'
+    ).values('id', 'rahgiri_code', 'amount', 'enrollment_id'):
+        pending[payment['rahgiri_code']].append(payment)
+
+    rows, matched = [], []
+    for number, code, amount in lines:
+        row = {'line': number, 'rahgiri_code': code, 'amount': amount}
+        candidates = pending.get(code, [])
+        if not code or amount is None:
+            row['result'] = 'unreadable'
+        elif code in seen:
+            row['result'] = 'duplicate_line'
+        elif not candidates:
+            row['result'] = 'unknown_code'
+        elif len(candidates) > 1:
+            row['result'] = 'ambiguous_code'
+        else:
+            payment = candidates[0]
+            row.update(payment_id=payment['id'], expected_amount=payment['amount'])
+            if payment['amount'] != amount:
+                row['result'] = 'amount_mismatch'
+            else:
+                row['result'] = 'matched'
+                matched.append((payment['id'], payment['enrollment_id']))
+                seen.add(code)
+        rows.append(row)
+    return rows, matched
+
+
+def confirm(matched):
+    """
+    Complete the matched payments and enroll their students, in one
+    transaction. An enrollment that expired while its transfer was on the
+    way takes its seat back if the session still has one. When it has none,
+    or the enrollment was cancelled or rejected, the payment stays pending
+    for finance to refund. Returns the confirmed payment ids and a dict of
+    {payment id: enrollment status} for those left pending.
+    """
+    from courses import promotions
+    from courses.cache import invalidate_student
+    from courses.models import Enrollment
+    from courses.signals import enrollments_changed
+    from dashboard.analytics import mark_stale_days
+    from .models import Payment
+    from .tasks import send_payment_confirmation_emails
+
+    enrollment_of = dict(matched)
+    now = timezone.now()
+    with transaction.atomic():
+        pending = list(
+            Payment.objects.select_for_update().filter(
+                id__in=list(enrollment_of), status='pending'
+            ).values_list('id', flat=True)
+        )
+        enrollments = Enrollment.objects.select_for_update(of=('self',)).select_related('session').in_bulk(
+            [enrollment_of[payment_id] for payment_id in pending]
+        )
+
+        confirmed, released, reclaimed = [], {}, []
+        for payment_id in pending:
+            enrollment = enrollments[enrollment_of[payment_id]]
+            if enrollment.status == 'expired' and enrollment.session.reserve_seat():
+                # The student paid the discounted price, so the code counts again
+                if enrollment.promo_code:
+                    promotions.redeem(enrollment.promo_code)
+                reclaimed.append(enrollment.id)
+            elif enrollment.status not in Enrollment.SEAT_HOLDING_STATUSES:
+                released[payment_id] = enrollment.status
+                continue
+            confirmed.append(payment_id)
+
+        Payment.objects.filter(id__in=confirmed).update(status='completed', payment_date=now, updated_at=now)
+        changed = [enrollments[enrollment_of[payment_id]] for payment_id in confirmed]
+        Enrollment.objects.filter(
+            Q(status='pending') | Q(id__in=reclaimed, status='expired'),
+            id__in=[enrollment.id for enrollment in changed]
+        ).update(status='enrolled', updated_at=now)
+
+        # Bulk UPDATEs skip the model signals, so refresh what they would have
+        today = timezone.localdate(now)
+        stale = set()
+        for enrollment in changed:
+            stale.update([(timezone.localdate(enrollment.created_at), enrollment.course_id), (today, enrollment.course_id)])
+        mark_stale_days(stale)
+        for student_id in {enrollment.student_id for enrollment in changed}:
+            transaction.on_commit(partial(invalidate_student, student_id))
+        if confirmed:
+            enrollments_changed.send(sender=Enrollment, enrollment_ids=[enrollment.id for enrollment in changed])
+            ids = [str(payment_id) for payment_id in confirmed]
+            transaction.on_commit(lambda: send_payment_confirmation_emails.delay(ids))
+    return confirmed, released
+
+
+def reconcile(lines, report=None, dry_run=False, chunk_size=CHUNK_SIZE, **columns):
+    """
+    Reconcile a statement given as an iterable of CSV lines. Writes one row
+    per statement line to the ``report`` file object when given and returns
+    a Counter of results plus the number of payments confirmed.
+    """
+    writer = None
+    if report is not None:
+        writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+
+    results = Counter()
+    seen = set()
+    for chunk in chunked(read_statement(lines, **columns), chunk_size):
+        rows, matched = match_chunk(chunk, seen)
+        if matched and not dry_run:
+            confirmed, released = confirm(matched)
+            results['confirmed'] += len(confirmed)
+            for row in rows:
+                if row['result'] == 'matched' and row['payment_id'] in released:
+                    row['result'] = f"enrollment_{released[row['payment_id']]}"
+        results.update(row['result'] for row in rows)
+        if writer:
+            writer.writerows(rows)
+    return results
@@ -0,0 +1,275 @@
+# payments/refunds.py
+"""
+Batched refund processing.
+
+process_refunds() claims eligible refunds (requested, on a completed
+payment) a chunk at a time, with skip_locked so several workers can share
+a run, and marks them processing. The chunk is handed to the provider for
+each payment method outside any transaction, then the outcomes are written
+back with one bulk UPDATE per table: refunds completed or rejected, their
+payments refunded, and any enrollment still holding a seat cancelled.
+Refunds a provider could not reach go back to requested for the next run,
+as do refunds left processing by a worker that died (recover_stale()).
+Finance gets one digest email per chunk.
+
+Providers take a list of refunds and return an Outcome per refund id:
+
+* PayPalRefundProvider refunds each capture through the REST API, a few
+  at a time over one pooled session, with PayPal-Request-Id set to the
+  refund id so a retried call can never refund twice;
+* BankTransferRefundProvider writes the chunk's card refunds to one CSV
+  batch file in storage for finance to upload to the bank;
+* StubRefundProvider stands in for both in tests.
+"""
+import csv
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from typing import NamedTuple
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+BATCH_FILE_FIELDS = ['refund_id', 'tracking_number', 'cardholder_name', 'bank_card_number', 'amount', 'currency']
+
+
+class Outcome(NamedTuple):
+    # 'completed', 'rejected', or 'requested' to try again on the next run
+    status: str
+    reference: str = ''
+    error: str = ''
+
+
+class PayPalRefundProvider:
+    def __init__(self, base_url=None, client_id=None, client_secret=None, concurrency=None, timeout=(3.0, 20.0)):
+        self.base_url = (base_url or settings.PAYPAL_API_URL).rstrip('/')
+        self.auth = (client_id or settings.PAYPAL_CLIENT_ID, client_secret or settings.PAYPAL_CLIENT_SECRET)
+        self.concurrency = concurrency or settings.REFUND_PAYPAL_CONCURRENCY
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.concurrency, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._token = None
+        self._token_lock = threading.Lock()
+
+    def token(self):
+        with self._token_lock:
+            if self._token is None or self._token[1] <= time.monotonic():
+                response = self.session.post(
+                    f'{self.base_url}/v1/oauth2/token',
+                    auth=self.auth,
+                    data={'grant_type': 'client_credentials'},
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                data = response.json()
+                # Renew a minute early rather than race the expiry
+                self._token = (data['access_token'], time.monotonic() + data['expires_in'] - 60)
+            return self._token[0]
+
+    def refund(self, refund):
+        payment = refund.payment
+        if not payment.transaction_id:
+            return Outcome('rejected', error='Payment has no PayPal capture id')
+        try:
+            response = self.session.post(
+                f'{self.base_url}/v2/payments/captures/{payment.transaction_id}/refund',
+                json={'amount': {'value': str(refund.amount), 'currency_code': payment.currency}},
+                headers={
+                    'Authorization': f'Bearer {self.token()}',
+                    'PayPal-Request-Id': str(refund.id),
+                },
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            return Outcome('requested', error=str(e))
+
+        if response.status_code == 401:
+            self._token = None
+        if response.status_code == 401 or response.status_code == 429 or response.status_code >= 500:
+            return Outcome('requested', error=f'PayPal returned {response.status_code}')
+        if response.status_code >= 400:
+            return Outcome('rejected', error=response.text[:500])
+
+        data = response.json()
+        if data.get('status') in ('CANCELLED', 'FAILED'):
+            return Outcome('rejected', data.get('id', ''), f"PayPal refund {data['status'].lower()}")
+        return Outcome('completed', data.get('id', ''))
+
+    def submit(self, refunds):
+        # PayPal has no batch refund call, so overlap the per-capture calls
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            return dict(zip([refund.id for refund in refunds], executor.map(self.refund, refunds)))
+
+
+class BankTransferRefundProvider:
+    def __init__(self, directory='refunds/bank'):
+        self.directory = directory
+
+    def submit(self, refunds):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=BATCH_FILE_FIELDS)
+        writer.writeheader()
+        for refund in refunds:
+            writer.writerow({
+                'refund_id': refund.id,
+                'tracking_number': refund.payment.enrollment.tracking_number,
+                'cardholder_name': refund.cardholder_name,
+                'bank_card_number': refund.bank_card_number,
+                'amount': refund.amount,
+                'currency': refund.payment.currency,
+            })
+        name = default_storage.save(
+            f'{self.directory}/{timezone.now():%Y%m%d-%H%M%S}.csv',
+            ContentFile(buffer.getvalue().encode('utf-8-sig'))
+        )
+        return {refund.id: Outcome('completed', name) for refund in refunds}
+
+
+class StubRefundProvider:
+    """Completes everything except the refund ids it is told to reject or defer"""
+
+    def __init__(self, rejected=(), deferred=()):
+        self.rejected = set(rejected)
+        self.deferred = set(deferred)
+        self.submitted = []
+
+    def submit(self, refunds):
+        self.submitted.append([refund.id for refund in refunds])
+        outcomes = {}
+        for refund in refunds:
+            if refund.id in self.rejected:
+                outcomes[refund.id] = Outcome('rejected', error='Declined by stub')
+            elif refund.id in self.deferred:
+                outcomes[refund.id] = Outcome('requested', error='Stub unavailable')
+            else:
+                outcomes[refund.id] = Outcome('completed', f'STUB-{refund.id}')
+        return outcomes
+
+
+def get_providers():
+    """Provider instances for the payment methods in REFUND_PROVIDERS."""
+    return {method: import_string(path)() for method, path in settings.REFUND_PROVIDERS.items()}
+
+
+def recover_stale(timeout=None):
+    """
+    Put refunds that have been processing for more than ``timeout`` minutes
+    back to requested; their worker died or hung between claim() and
+    record(). Retrying is safe for PayPal, where PayPal-Request-Id makes
+    the second call a no-op. Bank batch files carry the refund id, so a
+    refund written to two files can be spotted. Returns the number reset.
+    """
+    from .models import Refund
+
+    timeout = settings.REFUND_PROCESSING_TIMEOUT if timeout is None else timeout
+    now = timezone.now()
+    return Refund.objects.filter(
+        status='processing',
+        updated_at__lt=now - timedelta(minutes=timeout)
+    ).update(status='requested', updated_at=now)
+
+
+def claim(batch_size, methods, exclude, refund_ids=None):
+    """Mark the next chunk of eligible refunds processing and return them."""
+    from .models import Refund
+
+    with transaction.atomic():
+        queryset = Refund.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            status='requested',
+            payment__status='completed',
+            payment__payment_method__in=methods
+        ).exclude(id__in=exclude)
+        if refund_ids is not None:
+            queryset = queryset.filter(id__in=refund_ids)
+        ids = list(queryset.order_by('created_at').values_list('id', flat=True)[:batch_size])
+        Refund.objects.filter(id__in=ids).update(status='processing', updated_at=timezone.now())
+    return list(
+        Refund.objects.filter(id__in=ids).select_related('payment__enrollment')
+    )
+
+
+def record(refunds, outcomes, processed_by=None):
+    """Write the outcomes of one chunk back with one bulk UPDATE per table."""
+    from courses.cache import invalidate_student
+    from courses.models import Enrollment
+    from dashboard.analytics import mark_stale_days
+    from .models import Payment, Refund
+    from .tasks import send_refund_digest
+
+    now = timezone.now()
+    for refund in refunds:
+        outcome = outcomes.get(refund.id) or Outcome('requested', error='No outcome from provider')
+        refund.status = outcome.status
+        refund.provider_reference = outcome.reference or refund.provider_reference
+        refund.updated_at = now
+        if outcome.status != 'requested':
+            refund.processed_date = now
+            refund.processed_by = processed_by
+    completed = [refund for refund in refunds if refund.status == 'completed']
+
+    with transaction.atomic():
+        Refund.objects.bulk_update(
+            refunds, ['status', 'provider_reference', 'processed_date', 'processed_by', 'updated_at']
+        )
+        Payment.objects.filter(
+            id__in=[refund.payment_id for refund in completed],
+            status='completed'
+        ).update(status='refunded', updated_at=now)
+        Enrollment.bulk_release([refund.payment.enrollment_id for refund in completed], 'cancelled')
+
+        # Bulk UPDATEs skip the model signals, so refresh what they would have
+        today = timezone.localdate(now)
+        stale = set()
+        for refund in completed:
+            enrollment = refund.payment.enrollment
+            stale.update([(today, enrollment.course_id), (timezone.localdate(enrollment.created_at), enrollment.course_id)])
+        mark_stale_days(stale)
+        for student_id in {refund.payment.enrollment.student_id for refund in completed}:
+            transaction.on_commit(partial(invalidate_student, student_id))
+
+        errors = {str(refund_id): outcome.error for refund_id, outcome in outcomes.items() if outcome.error}
+        ids = [str(refund.id) for refund in refunds]
+        transaction.on_commit(lambda: send_refund_digest.delay(ids, errors))
+
+
+def process_refunds(batch_size=None, providers=None, refund_ids=None, processed_by=None):
+    """
+    Process eligible refunds until none are left; ``refund_ids`` limits the
+    run to those refunds. Returns a dict of counts per outcome status.
+    """
+    batch_size = batch_size or settings.REFUND_BATCH_SIZE
+    providers = get_providers() if providers is None else providers
+    recover_stale()
+    counts = {'completed': 0, 'rejected': 0, 'requested': 0}
+    attempted = set()
+    while True:
+        refunds = claim(batch_size, list(providers), attempted, refund_ids)
+        if not refunds:
+            return counts
+        attempted.update(refund.id for refund in refunds)
+
+        outcomes = {}
+        by_method = {}
+        for refund in refunds:
+            by_method.setdefault(refund.payment.payment_method, []).append(refund)
+        for method, group in by_method.items():
+            try:
+                outcomes.update(providers[method].submit(group))
+            except Exception as e:
+                print(f"Error submitting {method} refunds: {e}")
+                outcomes.update({refund.id: Outcome('requested', error=str(e)) for refund in group})
+
+        record(refunds, outcomes, processed_by)
+        for refund in refunds:
+            counts[refund.status] += 1
@@ -0,0 +1,7 @@
+# payments/signals.py
+from django.dispatch import Signal
+
+# Sent by Payment.transition() when it wins a status change. The change is
+# a conditional UPDATE, so post_save does not fire for it. Arguments:
+# instance, enrollment_changed.
+payment_transitioned = Signal()
@@ -1,6 +1,6 @@
 # payments/tasks.py
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
@@ -27,3 +27,142 @@ def send_payment_confirmation_email(payment_id):
         )
     except Exception as e:
         print(f"Error sending payment confirmation email: {e}")
+
+@shared_task
+def send_payment_confirmation_emails(payment_ids):
+    """Confirm a batch of payments to their students over one SMTP connection"""
+    from .models import Payment
+    
+    try:
+        payments = Payment.objects.filter(
+            id__in=payment_ids
+        ).select_related('enrollment__student', 'enrollment__course')
+        
+        messages = []
+        for payment in payments:
+            html_message = render_to_string('emails/payment_confirmation.html', {
+                'payment': payment,
+            })
+            message = EmailMultiAlternatives(
+                f'Payment Confirmation - {payment.enrollment.course.name}',
+                strip_tags(html_message),
+                settings.DEFAULT_FROM_EMAIL,
+                [payment.enrollment.student.email],
+            )
+            message.attach_alternative(html_message, 'text/html')
+            messages.append(message)
+        
+        return get_connection().send_messages(messages)
+    except Exception as e:
+        print(f"Error sending payment confirmation emails: {e}")
+
+@shared_task
+def process_paypal_events(batch_size=None):
+    """Apply stored PayPal webhook events in batches, oldest first"""
+    from django.db import transaction
+    from django.utils import timezone
+    from .models import Payment, PayPalWebhookEvent
+    
+    batch_size = batch_size or settings.PAYPAL_WEBHOOK_BATCH_SIZE
+    processed = 0
+    while True:
+        with transaction.atomic():
+            # skip_locked lets several workers drain the queue side by side
+            events = list(
+                PayPalWebhookEvent.objects.select_for_update(skip_locked=True).filter(
+                    status='received'
+                ).order_by('received_at')[:batch_size]
+            )
+            if not events:
+                return processed
+            
+            captures = {
+                event.resource_id for event in events
+                if event.event_type == 'PAYMENT.CAPTURE.COMPLETED' and event.resource_id
+            }
+            payments = {
+                payment.transaction_id: payment
+                for payment in Payment.objects.filter(
+                    transaction_id__in=captures,
+                    payment_method='paypal'
+                ).select_related('enrollment')
+            }
+            
+            confirmed = []
+            for event in events:
+                event.status = 'ignored'
+                payment = payments.get(event.resource_id)
+                if event.event_type != 'PAYMENT.CAPTURE.COMPLETED' or payment is None:
+                    continue
+                
+                try:
+                    with transaction.atomic():
+                        # Loses to whatever completed the payment first
+                        if payment.complete():
+                            event.status = 'processed'
+                            confirmed.append(payment.id)
+                        else:
+                            payment.refresh_from_db(fields=['status'])
+                            if payment.status == 'pending':
+                                # Captured, but the enrollment can't take it
+                                event.error = (
+                                    f'Enrollment is {payment.enrollment.status}; '
+                                    'payment left pending for a refund'
+                                )
+                except Exception as e:
+                    event.status = 'failed'
+                    event.error = str(e)
+            
+            now = timezone.now()
+            for event in events:
+                event.processed_at = now
+            PayPalWebhookEvent.objects.bulk_update(events, ['status', 'error', 'processed_at'])
+            
+            for payment_id in confirmed:
+                transaction.on_commit(lambda payment_id=payment_id: send_payment_confirmation_email.delay(payment_id))
+        
+        processed += len(events)
+
+@shared_task
+def process_refunds(refund_ids=None, processed_by_id=None):
+    """Run the refund pipeline over every eligible refund, or just ``refund_ids``"""
+    from accounts.models import User
+    from .refunds import process_refunds as run
+    
+    processed_by = User.objects.filter(pk=processed_by_id).first() if processed_by_id else None
+    return run(refund_ids=refund_ids, processed_by=processed_by)
+
+@shared_task
+def send_refund_digest(refund_ids, errors):
+    """One email to finance summarising a processed chunk of refunds"""
+    from .models import Refund
+    
+    if not settings.REFUND_DIGEST_RECIPIENTS:
+        return
+    try:
+        refunds = list(Refund.objects.filter(
+            id__in=refund_ids
+        ).select_related('payment__enrollment__student', 'payment__enrollment__course').order_by('status', 'created_at'))
+        for refund in refunds:
+            refund.error = errors.get(str(refund.id), '')
+        
+        counts = {}
+        for refund in refunds:
+            counts[refund.status] = counts.get(refund.status, 0) + 1
+        
+        subject = f'Refund batch processed - {counts.get("completed", 0)} completed, {counts.get("rejected", 0)} rejected'
+        html_message = render_to_string('emails/refund_digest.html', {
+            'refunds': refunds,
+            'counts': counts,
+        })
+        
+        send_mail(
+            subject,
+            strip_tags(html_message),
+            settings.DEFAULT_FROM_EMAIL,
+            settings.REFUND_DIGEST_RECIPIENTS,
+            html_message=html_message,
+        )
+    except Exception as e:
+        print(f"Error sending refund digest: {e}")
+
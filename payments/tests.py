@@ -1,3 +1,380 @@
-from django.test import TestCase
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from courses.models import Course, CourseSession, Enrollment
+from .bank import BankClient, BankUnavailable
+from .bank_stub import StubBankServer
+from .models import Payment, PayPalWebhookEvent, Refund
+from .reconciliation import reconcile
+from .refunds import BankTransferRefundProvider, StubRefundProvider, process_refunds
+from .tasks import process_paypal_events
+
+
+class PayPalWebhookTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        student = User.objects.create_user(email='student@example.com', username='student', password='x')
+        course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=instructor, price=100, duration_hours=8, max_capacity=10
+        )
+        session = CourseSession.objects.create(
+            course=course,
+            start_datetime=timezone.now() + timedelta(days=7),
+            end_datetime=timezone.now() + timedelta(days=8),
+        )
+        enrollment = Enrollment.objects.create(student=student, course=course, session=session, final_price=100)
+        self.payment = Payment.objects.create(
+            enrollment=enrollment, amount=100, payment_method='paypal', transaction_id='CAPTURE-1'
+        )
+
+    def deliver(self, event_id, resource_id='CAPTURE-1'):
+        body = {
+            'id': event_id,
+            'event_type': 'PAYMENT.CAPTURE.COMPLETED',
+            'resource': {'id': resource_id, 'amount': {'value': '100.00'}},
+        }
+        return self.client.post(reverse('paypal_webhook'), json.dumps(body), content_type='application/json')
+
+    @mock.patch('payments.tasks.process_paypal_events.delay')
+    def test_acknowledges_and_deduplicates(self, process):
+        self.assertEqual(self.deliver('WH-1').json()['status'], 'received')
+        self.assertEqual(self.deliver('WH-1').json()['status'], 'duplicate')
+        self.assertEqual(PayPalWebhookEvent.objects.count(), 1)
+        self.assertEqual(process.call_count, 1)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+
+    def test_transitions_are_conditional(self):
+        stale = Payment.objects.get(pk=self.payment.pk)
+        self.assertTrue(self.payment.complete())
+        self.assertFalse(stale.complete())
+        self.assertFalse(stale.transition('failed'))
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'completed')
+        self.assertEqual(stale.enrollment.status, 'enrolled')
+        self.assertTrue(stale.transition('refunded'))
+        self.assertFalse(self.payment.transition('refunded'))
+
+    @mock.patch('payments.tasks.send_payment_confirmation_email.delay')
+    @mock.patch('payments.tasks.process_paypal_events.delay')
+    def test_batch_applies_capture_once(self, process, send_email):
+        self.deliver('WH-1')
+        self.deliver('WH-2')
+        self.deliver('WH-3', resource_id='UNKNOWN')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_paypal_events(), 3)
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.payment.enrollment.status, 'enrolled')
+        self.assertEqual(
+            dict(PayPalWebhookEvent.objects.values_list('event_id', 'status')),
+            {'WH-1': 'processed', 'WH-2': 'ignored', 'WH-3': 'ignored'}
+        )
+        self.assertIsNotNone(PayPalWebhookEvent.objects.get(event_id='WH-1').latency)
+        send_email.assert_called_once_with(self.payment.id)
+
+    @mock.patch('payments.tasks.send_payment_confirmation_email.delay')
+    @mock.patch('payments.tasks.process_paypal_events.delay')
+    def test_capture_after_expiry(self, process, send_email):
+        enrollment = self.payment.enrollment
+        enrollment.release_seat('expired')
+        CourseSession.objects.filter(pk=enrollment.session_id).update(capacity=0)
+
+        # The session has filled up since: the payment waits for a refund
+        self.deliver('WH-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            process_paypal_events()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.enrollment.status), ('pending', 'expired'))
+        self.assertIn('expired', PayPalWebhookEvent.objects.get(event_id='WH-1').error)
+        send_email.assert_not_called()
+
+        # With a seat free again the enrollment takes it back
+        CourseSession.objects.filter(pk=enrollment.session_id).update(capacity=1)
+        self.deliver('WH-2')
+        with self.captureOnCommitCallbacks(execute=True):
+            process_paypal_events()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.enrollment.status), ('completed', 'enrolled'))
+        self.assertEqual(CourseSession.objects.get(pk=enrollment.session_id).seats_taken, 1)
+        send_email.assert_called_once_with(self.payment.id)
+
+
+class ReconciliationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=instructor, price=100, duration_hours=8, max_capacity=10
+        )
+        session = CourseSession.objects.create(
+            course=course,
+            start_datetime=timezone.now() + timedelta(days=7),
+            end_datetime=timezone.now() + timedelta(days=8),
+        )
+        self.payments = []
+        for number, code in enumerate(['RG00000001', 'RG00000002']):
+            student = User.objects.create_user(
+                email=f'student{number}@example.com', username=f'student{number}', password='x'
+            )
+            enrollment = Enrollment.objects.create(student=student, course=course, session=session, final_price=100)
+            self.payments.append(Payment.objects.create(
+                enrollment=enrollment, amount=100, payment_method='bank_transfer', rahgiri_code=code
+            ))
+        self.statement = [
+            'rahgiri_code,amount\n',
+            'rg00000001,"100.00"\n',
+            'RG00000001,100\n',
+            'RG00000002,90\n',
+            'RG99999999,100\n',
+        ]
+
+    @mock.patch('payments.tasks.send_payment_confirmation_emails.delay')
+    def test_confirms_matching_lines(self, send_emails):
+        report = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            results = reconcile(self.statement, report=report, chunk_size=2)
+
+        self.assertEqual(results['matched'], 1)
+        self.assertEqual(results['duplicate_line'], 1)
+        self.assertEqual(results['amount_mismatch'], 1)
+        self.assertEqual(results['unknown_code'], 1)
+        self.assertEqual(results['confirmed'], 1)
+        self.assertEqual(len(report.getvalue().splitlines()), 5)
+
+        confirmed, mismatched = self.payments
+        confirmed.refresh_from_db()
+        mismatched.refresh_from_db()
+        self.assertEqual(confirmed.status, 'completed')
+        self.assertEqual(confirmed.enrollment.status, 'enrolled')
+        self.assertEqual(mismatched.status, 'pending')
+        send_emails.assert_called_once_with([str(confirmed.id)])
+
+    @mock.patch('payments.tasks.send_payment_confirmation_emails.delay')
+    def test_submitted_code_survives_expiry(self, send_emails):
+        from courses.tasks import expire_pending_enrollments
+
+        Enrollment.objects.update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(expire_pending_enrollments(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile(self.statement)
+        payment = Payment.objects.get(pk=self.payments[0].pk)
+        self.assertEqual((payment.status, payment.enrollment.status), ('completed', 'enrolled'))
+
+    @mock.patch('payments.tasks.send_payment_confirmation_emails.delay')
+    def test_expired_enrollment_takes_seat_back_or_is_reported(self, send_emails):
+        first, second = [payment.enrollment for payment in self.payments]
+        first.release_seat('expired')
+        second.release_seat('expired')
+        statement = ['rahgiri_code,amount\n', 'RG00000001,100\n', 'RG00000002,100\n']
+
+        # Only one seat is left for the two of them
+        CourseSession.objects.filter(pk=first.session_id).update(capacity=1)
+        results = reconcile(statement, chunk_size=1)
+
+        self.assertEqual((results['matched'], results['enrollment_expired'], results['confirmed']), (1, 1, 1))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.payment.status), ('enrolled', 'completed'))
+        self.assertEqual((second.status, second.payment.status), ('expired', 'pending'))
+        self.assertEqual(CourseSession.objects.get(pk=first.session_id).seats_taken, 1)
+
+    @mock.patch('payments.tasks.send_payment_confirmation_emails.delay')
+    def test_dry_run_changes_nothing(self, send_emails):
+        results = reconcile(self.statement, dry_run=True)
+
+        self.assertEqual(results['matched'], 1)
+        self.assertEqual(results['confirmed'], 0)
+        self.assertFalse(Payment.objects.exclude(status='pending').exists())
+        send_emails.assert_not_called()
+
+    def test_code_submission_leaves_payment_pending(self):
+        payment = self.payments[0]
+        self.client.force_login(payment.enrollment.student)
+        response = self.client.post(
+            reverse('iranian_payment_complete', args=[payment.id]), {'rahgiri_code': 'rg 00000003'}
+        )
+
+        self.assertEqual(response.json()['status'], 'error')
+        response = self.client.post(
+            reverse('iranian_payment_complete', args=[payment.id]), {'rahgiri_code': '۰۰۰۰۰۰۰۰۰۳'}
+        )
+        self.assertEqual(response.json()['status'], 'success')
+        payment.refresh_from_db()
+        self.assertEqual(payment.rahgiri_code, '0000000003')
+        self.assertEqual(payment.status, 'pending')
+
+    @mock.patch('payments.tasks.send_payment_confirmation_email.delay')
+    def test_code_confirmed_by_bank_completes_payment(self, send_email):
+        payment = self.payments[1]
+        self.client.force_login(payment.enrollment.student)
+        with StubBankServer(transfers=[('RG00000005', 100)]) as server:
+            client = BankClient(server.url)
+            with mock.patch('payments.views.get_client', return_value=client):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        reverse('iranian_payment_complete', args=[payment.id]), {'rahgiri_code': 'RG00000005'}
+                    )
+            client.close()
+
+        self.assertEqual(response.json()['status'], 'success')
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.enrollment.status, 'enrolled')
+        send_email.assert_called_once_with(payment.id)
+
+
+class BankClientTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_reuses_connections_and_caches_answers(self):
+        with StubBankServer(transfers=[('RG00000001', 100)]) as server:
+            client = BankClient(server.url)
+            self.assertTrue(client.verify('RG00000001', 100))
+            self.assertTrue(client.verify('RG00000001', '100.00'))
+            self.assertFalse(client.verify('RG00000002', 100))
+            self.assertFalse(client.verify('RG00000001', 90))
+            client.close()
+
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(server.connections, 1)
+
+    def test_circuit_opens_after_failures(self):
+        with StubBankServer(status=503) as server:
+            client = BankClient(server.url, failure_threshold=2, cooldown=60)
+            for number in range(5):
+                with self.assertRaises(BankUnavailable):
+                    client.verify(f'RG0000000{number}', 100)
+            client.close()
+
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(client.breaker.state, 'open')
+
+    def test_half_open_trial_closes_circuit(self):
+        with StubBankServer(status=503) as server:
+            client = BankClient(server.url, failure_threshold=1, cooldown=0)
+            with self.assertRaises(BankUnavailable):
+                client.verify('RG00000001', 100)
+            server.status = 200
+            self.assertFalse(client.verify('RG00000001', 100))
+            client.close()
+
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_slow_bank_times_out(self):
+        with StubBankServer(delay=0.5) as server:
+            client = BankClient(server.url, read_timeout=0.05)
+            with self.assertRaises(BankUnavailable):
+                client.verify('RG00000001', 100)
+            client.close()
+
+    async def test_async_verify(self):
+        with StubBankServer(transfers=[('RG00000001', 100)]) as server:
+            client = BankClient(server.url)
+            self.assertTrue(await client.averify('RG00000001', 100))
+            self.assertFalse(await client.averify('RG00000002', 100))
+            client.close()
+
+
+class RefundPipelineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user(
+            email='instructor@example.com', username='instructor', password='x', user_type='instructor'
+        )
+        course = Course.objects.create(
+            name='Negotiation', short_description='Short', detailed_description='Long',
+            instructor=instructor, price=100, duration_hours=8, max_capacity=10
+        )
+        self.session = CourseSession.objects.create(
+            course=course,
+            start_datetime=timezone.now() + timedelta(days=7),
+            end_datetime=timezone.now() + timedelta(days=8),
+        )
+        self.refunds = []
+        for number in range(3):
+            student = User.objects.create_user(
+                email=f'student{number}@example.com', username=f'student{number}', password='x'
+            )
+            enrollment = Enrollment.objects.create(
+                student=student, course=course, session=self.session, final_price=100, status='enrolled'
+            )
+            payment = Payment.objects.create(
+                enrollment=enrollment, amount=100, payment_method='paypal',
+                transaction_id=f'CAPTURE-{number}', status='completed', payment_date=timezone.now()
+            )
+            self.refunds.append(Refund.objects.create(payment=payment, amount=100, reason='Cannot attend'))
+
+    @mock.patch('payments.tasks.send_refund_digest.delay')
+    def test_refunds_stuck_in_processing_are_retried(self, send_digest):
+        stuck, recent, _ = self.refunds
+        Refund.objects.filter(pk=stuck.pk).update(
+            status='processing', updated_at=timezone.now() - timedelta(hours=2)
+        )
+        Refund.objects.filter(pk=recent.pk).update(status='processing', updated_at=timezone.now())
+
+        provider = StubRefundProvider()
+        counts = process_refunds(providers={'paypal': provider})
+
+        self.assertEqual(counts['completed'], 2)
+        self.assertIn(stuck.id, provider.submitted[0])
+        # Still within the timeout, so its worker may yet record it
+        self.assertEqual(Refund.objects.get(pk=recent.pk).status, 'processing')
+
+    @mock.patch('payments.tasks.send_refund_digest.delay')
+    def test_chunks_are_submitted_and_recorded_in_bulk(self, send_digest):
+        completed, rejected, deferred = self.refunds
+        provider = StubRefundProvider(rejected=[rejected.id], deferred=[deferred.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = process_refunds(batch_size=2, providers={'paypal': provider})
+
+        self.assertEqual(counts, {'completed': 1, 'rejected': 1, 'requested': 1})
+        self.assertEqual([len(chunk) for chunk in provider.submitted], [2, 1])
+        self.assertEqual(send_digest.call_count, 2)
+
+        for refund in self.refunds:
+            refund.refresh_from_db()
+        self.assertEqual(completed.status, 'completed')
+        self.assertEqual(completed.provider_reference, f'STUB-{completed.id}')
+        self.assertEqual(completed.payment.status, 'refunded')
+        self.assertEqual(completed.payment.enrollment.status, 'cancelled')
+        self.assertEqual(rejected.status, 'rejected')
+        self.assertEqual(rejected.payment.status, 'completed')
+        self.assertEqual(deferred.status, 'requested')
+        self.assertIsNone(deferred.processed_date)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.seats_taken, 2)
+
+    @mock.patch('payments.tasks.send_refund_digest.delay')
+    @mock.patch('payments.refunds.default_storage.save', return_value='refunds/bank/batch.csv')
+    def test_bank_transfer_refunds_go_out_in_one_file(self, save, send_digest):
+        Payment.objects.update(payment_method='bank_transfer')
+        counts = process_refunds(providers={'bank_transfer': BankTransferRefundProvider()})
+
+        self.assertEqual(counts['completed'], 3)
+        save.assert_called_once()
+        self.assertEqual(save.call_args[0][1].read().decode('utf-8-sig').count('\n'), 4)
+        self.assertEqual(set(Refund.objects.values_list('provider_reference', flat=True)), {'refunds/bank/batch.csv'})
 
-# Create your tests here.
@@ -6,11 +6,20 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.utils import timezone
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 import json
+import logging
 
 from courses.models import Enrollment
-from .models import Payment
+from .models import Payment, PayPalWebhookEvent
 from .forms import IranianPaymentForm
+from .bank import BankError, get_client
+from .reconciliation import normalize_code
+
+logger = logging.getLogger(__name__)
+
+PAYPAL_KICK_KEY = 'payments:paypal:kick'
 
 @login_required
 def payment_process(request, enrollment_id):
@@ -59,29 +68,49 @@ def iranian_payment_complete(request, payment_id):
     if form.is_valid():
         rahgiri_code = form.cleaned_data['rahgiri_code']
         
-        if validate_rahgiri_code(rahgiri_code, payment.amount):
-            payment.rahgiri_code = rahgiri_code
-            payment.status = 'completed'
-            payment.payment_date = timezone.now()
-            payment.save()
-            
-            # Update enrollment status
-            payment.enrollment.status = 'enrolled'
-            payment.enrollment.save()
-            
-            from .tasks import send_payment_confirmation_email
-            send_payment_confirmation_email.delay(payment.id)
-            
+        code = normalize_code(rahgiri_code)
+        verified = validate_rahgiri_code(code, payment.amount)
+        if verified is False:
             return JsonResponse({
-                'status': 'success',
-                'message': 'Payment completed successfully!',
-                'redirect_url': '/dashboard/'
+                'status': 'error',
+                'message': 'Invalid Rahgiri code. Please check and try again.'
             })
-        else:
+        
+        if Payment.objects.filter(rahgiri_code=code).exclude(id=payment.id).exists():
             return JsonResponse({
                 'status': 'error',
-                'message': 'Invalid Rahgiri code. Please check and try again.'
+                'message': 'This Rahgiri code has already been used for another payment.'
+            })
+        
+        # Only the code column; a concurrent confirmation must not be overwritten
+        payment.rahgiri_code = code
+        payment.save(update_fields=['rahgiri_code', 'updated_at'])
+        
+        if verified:
+            if payment.complete():
+                from .tasks import send_payment_confirmation_email
+                transaction.on_commit(lambda: send_payment_confirmation_email.delay(payment.id))
+            else:
+                payment.refresh_from_db(fields=['status'])
+                if payment.status == 'pending':
+                    # The enrollment expired with its seat since taken, or was cancelled
+                    return JsonResponse({
+                        'status': 'error',
+                        'message': 'Your registration is no longer open, so the payment could not be applied. It will be refunded.'
+                    })
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Payment confirmed! Your registration is complete.',
+                'redirect_url': '/dashboard/'
             })
+        
+        # Left pending until the code is matched against a bank statement
+        # (payments.reconciliation)
+        return JsonResponse({
+            'status': 'success',
+            'message': 'Thank you! Your registration will be confirmed as soon as the transfer appears on our bank statement.',
+            'redirect_url': '/dashboard/'
+        })
     
     return JsonResponse({
         'status': 'error',
@@ -90,44 +119,53 @@ def iranian_payment_complete(request, payment_id):
 
 def validate_rahgiri_code(rahgiri_code, amount):
     """
-    Implement your Rahgiri code validation logic here
-    This should connect to the Iranian banking system API
+    False if the code is malformed or the bank rejects it, True if the bank
+    confirms the transfer, None if the bank can't be asked right now
     """
-    return len(rahgiri_code) >= 10
+    code = normalize_code(rahgiri_code)
+    if len(code) < 10 or not code.isalnum():
+        return False
+    
+    client = get_client()
+    if client is None:
+        return None
+    try:
+        return client.verify(code, amount)
+    except BankError as e:
+        logger.warning('Error verifying Rahgiri code: %s', e)
+        return None
 
 @csrf_exempt
 def paypal_webhook(request):
-    """Handle PayPal webhook notifications"""
+    """
+    Store a PayPal webhook event and acknowledge it straight away. The
+    events are applied by payments.tasks.process_paypal_events; a
+    redelivered event id is acknowledged without being stored twice.
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
         data = json.loads(request.body)
-        event_type = data.get('event_type')
-        
-        if event_type == 'PAYMENT.CAPTURE.COMPLETED':
-            payment_id = data['resource']['id']
-            amount = float(data['resource']['amount']['value'])
-            
-            try:
-                payment = Payment.objects.get(
-                    transaction_id=payment_id,
-                    payment_method='paypal'
-                )
-                payment.status = 'completed'
-                payment.payment_date = timezone.now()
-                payment.save()
-                
-                payment.enrollment.status = 'enrolled'
-                payment.enrollment.save()
-                
-                from .tasks import send_payment_confirmation_email
-                send_payment_confirmation_email.delay(payment.id)
-                
-            except Payment.DoesNotExist:
-                pass
-        
-        return JsonResponse({'status': 'success'})
+        event_id = data['id']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Invalid event'}, status=400)
+    
+    resource = data.get('resource') or {}
+    try:
+        with transaction.atomic():
+            PayPalWebhookEvent.objects.create(
+                event_id=event_id,
+                event_type=data.get('event_type', ''),
+                resource_id=str(resource.get('id', ''))[:100],
+                payload=data
+            )
+    except IntegrityError:
+        return JsonResponse({'status': 'duplicate'})
+    
+    # One kick per second is enough; the beat schedule sweeps up the rest
+    if cache.add(PAYPAL_KICK_KEY, 1, timeout=1):
+        from .tasks import process_paypal_events
+        process_paypal_events.delay()
     
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400)
\ No newline at end of file
+    return JsonResponse({'status': 'received'})
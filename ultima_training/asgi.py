@@ -3,6 +3,11 @@ ASGI config for ultima_training project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the live dashboard events (dashboard.views.live_events) from this
+application, e.g. ``uvicorn ultima_training.asgi:application``: each open
+event stream is a coroutine here, whereas under WSGI it would hold a
+worker thread for as long as the dashboard stays open.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,107 @@
+# ultima_training/pagination.py
+"""
+Keyset (cursor) pagination shared by the public listing views.
+
+Unlike django.core.paginator.Paginator this never runs COUNT(*) and never
+uses OFFSET: each page seeks past the (sort_key, id) of the row it starts
+after, so page N costs the same index range scan as page 1.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``sort_key`` (e.g. ``'-created_at'``) with the
+    primary key as tie-breaker. Pass the ``cursor`` query parameter of the
+    current request to ``get_page``; invalid cursors fall back to page one.
+    """
+
+    def __init__(self, queryset, per_page, sort_key):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = sort_key.startswith('-')
+        self.field_name = sort_key.lstrip('-')
+        self.field = queryset.model._meta.get_field(self.field_name)
+        self.pk_field = queryset.model._meta.pk
+
+    def get_page(self, cursor=None):
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._page(self.queryset, forward=True, has_before=False)
+
+        (value, pk), forward = position
+        queryset = self._seek(self.queryset, value, pk, forward)
+        return self._page(queryset, forward=forward, has_before=True)
+
+    def _page(self, queryset, forward, has_before):
+        rows = list(queryset.order_by(*self._ordering(forward))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+
+        has_next, has_previous = (has_more, has_before) if forward else (has_before, has_more)
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], forward=True) if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], forward=False) if has_previous else None,
+        )
+
+    def _ordering(self, forward):
+        descending = self.descending == forward
+        prefix = '-' if descending else ''
+        return [f'{prefix}{self.field_name}', f'{prefix}pk']
+
+    def _seek(self, queryset, value, pk, forward):
+        lookup = 'lt' if self.descending == forward else 'gt'
+        return queryset.filter(
+            Q(**{f'{self.field_name}__{lookup}': value}) |
+            Q(**{self.field_name: value, f'pk__{lookup}': pk})
+        )
+
+    def encode_cursor(self, obj, forward):
+        # value_to_string keeps full microsecond precision for datetimes
+        payload = [self.field.value_to_string(obj), self.pk_field.value_to_string(obj), int(forward)]
+        data = json.dumps(payload, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            value, pk, forward = json.loads(data)
+            value = self.field.to_python(value)
+            pk = self.pk_field.to_python(pk)
+        except (ValueError, TypeError, ValidationError):
+            return None
+        return (value, pk), bool(forward)
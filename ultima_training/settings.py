@@ -97,9 +97,105 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache
+# Set CACHE_URL (e.g. redis://localhost:6379/1) in production so every worker shares it
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=3600, cast=int)
+CATALOG_BROWSER_MAX_AGE = config('CATALOG_BROWSER_MAX_AGE', default=0, cast=int)
+STUDENT_DASHBOARD_CACHE_TIMEOUT = config('STUDENT_DASHBOARD_CACHE_TIMEOUT', default=600, cast=int)
+
 # Celery Configuration
 CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
+CELERY_BEAT_SCHEDULE = {
+    'expire-pending-enrollments': {
+        'task': 'courses.tasks.expire_pending_enrollments',
+        'schedule': 300.0,
+    },
+    'refresh-daily-metrics': {
+        'task': 'dashboard.tasks.refresh_daily_metrics',
+        'schedule': 300.0,
+    },
+    'process-paypal-events': {
+        'task': 'payments.tasks.process_paypal_events',
+        'schedule': 30.0,
+    },
+}
+
+# Days, counting today, that every analytics refresh rebuilds in full
+ANALYTICS_REFRESH_DAYS = config('ANALYTICS_REFRESH_DAYS', default=2, cast=int)
+
+# Course search (courses.search): most ranked results returned, and a
+# backend class path to override the one picked for the database vendor
+COURSE_SEARCH_LIMIT = config('COURSE_SEARCH_LIMIT', default=200, cast=int)
+COURSE_SEARCH_BACKEND = config('COURSE_SEARCH_BACKEND', default='')
+
+# Enrollments
+# Minutes an unpaid pending enrollment holds its seat before it expires
+ENROLLMENT_HOLD_MINUTES = config('ENROLLMENT_HOLD_MINUTES', default=60, cast=int)
+# Registration waiting room (courses.admission); leave the URL empty to use
+# the in-process store, which only works with a single worker process
+ADMISSION_REDIS_URL = config('ADMISSION_REDIS_URL', default='')
+ADMISSION_MAX_ACTIVE = config('ADMISSION_MAX_ACTIVE', default=50, cast=int)
+ADMISSION_TOKEN_TTL = config('ADMISSION_TOKEN_TTL', default=600, cast=int)
+ADMISSION_POLL_SECONDS = config('ADMISSION_POLL_SECONDS', default=5, cast=int)
+# Live dashboard events (dashboard.events); leave the URL empty to use the
+# in-process broker, which only reaches clients of the same worker process
+LIVE_EVENTS_REDIS_URL = config('LIVE_EVENTS_REDIS_URL', default='')
+LIVE_EVENTS_KEEPALIVE_SECONDS = config('LIVE_EVENTS_KEEPALIVE_SECONDS', default=15, cast=int)
+LIVE_EVENTS_RETRY_MS = config('LIVE_EVENTS_RETRY_MS', default=5000, cast=int)
+# PayPal webhook events applied per transaction by payments.tasks.process_paypal_events
+PAYPAL_WEBHOOK_BATCH_SIZE = config('PAYPAL_WEBHOOK_BATCH_SIZE', default=100, cast=int)
+# Refund processing (payments.refunds): refunds per chunk, concurrent PayPal
+# calls, provider per payment method and who gets the per-chunk digest
+REFUND_BATCH_SIZE = config('REFUND_BATCH_SIZE', default=200, cast=int)
+REFUND_PAYPAL_CONCURRENCY = config('REFUND_PAYPAL_CONCURRENCY', default=8, cast=int)
+# Minutes a claimed refund may stay processing before a run retries it
+REFUND_PROCESSING_TIMEOUT = config('REFUND_PROCESSING_TIMEOUT', default=60, cast=int)
+REFUND_PROVIDERS = {
+    'paypal': 'payments.refunds.PayPalRefundProvider',
+    'bank_transfer': 'payments.refunds.BankTransferRefundProvider',
+}
+REFUND_DIGEST_RECIPIENTS = config('REFUND_DIGEST_RECIPIENTS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+# Bulk certificate jobs (certificates.bulk): certificates per chunk, render
+# processes (0 for one per CPU) and concurrent storage writes
+CERTIFICATE_CHUNK_SIZE = config('CERTIFICATE_CHUNK_SIZE', default=50, cast=int)
+CERTIFICATE_RENDER_PROCESSES = config('CERTIFICATE_RENDER_PROCESSES', default=0, cast=int)
+CERTIFICATE_STORAGE_THREADS = config('CERTIFICATE_STORAGE_THREADS', default=8, cast=int)
+# Site the certificate QR codes link to (certificates.verification)
+CERTIFICATE_VERIFY_BASE_URL = config('CERTIFICATE_VERIFY_BASE_URL', default='http://localhost:8000')
+# Certificate downloads (certificates.downloads): 'nginx' for X-Accel-Redirect
+# to the internal location aliased to MEDIA_ROOT, 'sendfile' for X-Sendfile,
+# empty to stream from Django; presigned object storage links last EXPIRY seconds
+CERTIFICATE_DOWNLOAD_OFFLOAD = config('CERTIFICATE_DOWNLOAD_OFFLOAD', default='')
+CERTIFICATE_DOWNLOAD_ACCEL_PREFIX = config('CERTIFICATE_DOWNLOAD_ACCEL_PREFIX', default='/protected-media/')
+CERTIFICATE_DOWNLOAD_URL_EXPIRY = config('CERTIFICATE_DOWNLOAD_URL_EXPIRY', default=60, cast=int)
+# Rahgiri verification API (payments.bank); leave the URL empty to confirm
+# bank transfers through statement reconciliation only
+BANK_API_URL = config('BANK_API_URL', default='')
+BANK_API_KEY = config('BANK_API_KEY', default='')
+BANK_API_CONNECT_TIMEOUT = config('BANK_API_CONNECT_TIMEOUT', default=1.0, cast=float)
+BANK_API_READ_TIMEOUT = config('BANK_API_READ_TIMEOUT', default=3.0, cast=float)
+BANK_API_POOL_SIZE = config('BANK_API_POOL_SIZE', default=10, cast=int)
+BANK_API_FAILURE_THRESHOLD = config('BANK_API_FAILURE_THRESHOLD', default=5, cast=int)
+BANK_API_COOLDOWN = config('BANK_API_COOLDOWN', default=30, cast=int)
+BANK_API_CACHE_TIMEOUT = config('BANK_API_CACHE_TIMEOUT', default=60, cast=int)
+# Tracking/certificate numbers reserved per database round trip (courses.identifiers)
+IDENTIFIER_BLOCK_SIZE = config('IDENTIFIER_BLOCK_SIZE', default=100, cast=int)
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -112,6 +208,7 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='ghku uvrd ulpl mcqt
 # Payment Configuration
 PAYPAL_CLIENT_ID = config('PAYPAL_CLIENT_ID', default='')
 PAYPAL_CLIENT_SECRET = config('PAYPAL_CLIENT_SECRET', default='')
+PAYPAL_API_URL = config('PAYPAL_API_URL', default='https://api-m.sandbox.paypal.com')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
 
@@ -20,6 +20,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from certificates.views import verify_signed_certificate
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
@@ -28,6 +30,8 @@ urlpatterns = [
     path('courses/', include('courses.urls')),
     path('payments/', include('payments.urls')),
     path('certificates/', include('certificates.urls')),
+    # Printed in certificate QR codes, so short and upper case (certificates.verification)
+    path('C/<str:certificate_number>/<str:signature>', verify_signed_certificate, name='verify_signed_certificate'),
     path('', include('branding.urls')),
 ]
 